@@ -1,37 +1,69 @@
+import time as systime
+BOOT_STARTED = systime.perf_counter()  # Avant les imports: mesure aussi le coût de discord.py
+
 import discord
 from discord.ext import commands, tasks
 import requests
-from datetime import datetime, time
-import pytz
+import aiohttp
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
 import asyncio
 import os
-from openai import OpenAI
-from flask import Flask
-from threading import Thread
+import sys
+import json
+import base64
+import hashlib
+import hmac
+import re
+import sqlite3
+import atexit
+import socket
+import bisect
+import zlib
+import email.utils
+import urllib.parse
+import importlib
+import math
+from array import array
+from collections import OrderedDict, deque
+from aiohttp import web
+import threading
 import traceback
+import tracemalloc
+import functools
+import logging
+import contextvars
+import random
+from contextlib import contextmanager
+from abc import ABC, abstractmethod
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
 
 # ============================================================
-#                    SERVEUR WEB (Keep Alive)
+#     ⏳ IMPORTS DIFFÉRÉS (dépendances lourdes)
 # ============================================================
-app = Flask('')
+# openai (~0,7 s d'import) et numpy ne sont chargés qu'au premier usage.
+# Profil complet des imports: python -X importtime -c "import bot"
+class LazyModule:
+    """Module importé au premier accès d'attribut (importlib: thread-safe)"""
 
-@app.route('/')
-def home():
-    return "Horizon Elite 2026 : Système Opérationnel ✅"
+    def __init__(self, name):
+        self._name = name
+        self._module = None
 
-@app.route('/health')
-def health():
-    return {"status": "ok", "time": datetime.now().isoformat()}
+    @property
+    def loaded(self):
+        return self._module is not None
 
-def run_web():
-    port = int(os.environ.get("PORT", 8080))
-    app.run(host='0.0.0.0', port=port)
+    def load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
 
-def keep_alive():
-    t = Thread(target=run_web)
-    t.daemon = True
-    t.start()
-    print("[WEB] Serveur keep-alive démarré")
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+np = LazyModule("numpy")
+LAZY_MODULES = {"numpy": np, "openai": LazyModule("openai")}
 
 # ============================================================
 #                    CONFIGURATION
@@ -67,21 +99,625 @@ EBOOK_CONFIG = {
     "offer": "À partir de 99€ + 20$ de crypto en cashback directement sur ton wallet 🎁",
 }
 
-TIMEZONE = pytz.timezone("Europe/Paris")
+TIMEZONE = ZoneInfo("Europe/Paris")
+
+# Scan marché: top N coins analysés en NumPy au lieu du top 50
+MARKET_SCAN_ENABLED = os.getenv("MARKET_SCAN_ENABLED", "1") == "1"
+MARKET_SCAN_SIZE = int(os.getenv("MARKET_SCAN_SIZE", "500"))
 
 # ============================================================
 #              FLAGS ET CACHES GLOBAUX
 # ============================================================
 startup_done = False
-sent_news_ids = set()
-sent_alert_ids = set()
-last_news_sent_time = None
 NEWS_MIN_DELAY_MINUTES = 60
 
-last_btc_price = None
-last_eth_price = None
-last_fear_greed = None
-last_btc_dominance = None
+# ============================================================
+#     💾 ÉTAT PERSISTANT (SQLite WAL)
+# ============================================================
+STATE_DIR = os.getenv("STATE_DIR", "data")
+STATE_DB_PATH = os.getenv("STATE_DB_PATH", os.path.join(STATE_DIR, "bot_state.db"))
+STATE_FLUSH_SECONDS = float(os.getenv("STATE_FLUSH_SECONDS", "5"))
+
+class StateStore:
+    """Clé/valeur JSON par namespace sur SQLite en mode WAL.
+
+    Tout l'état est chargé en mémoire au démarrage: les lectures ne touchent
+    jamais le disque. Les écritures sont mises en file et flushées par lot
+    (une transaction) par un thread dédié, hors de la boucle Discord.
+    """
+
+    def __init__(self, path, flush_seconds=STATE_FLUSH_SECONDS):
+        self.path = path
+        self.flush_seconds = flush_seconds
+        self._cache = {}    # namespace -> {key: value}
+        self._pending = {}  # (namespace, key) -> JSON (None = suppression)
+        self._lock = threading.Lock()     # File d'écritures (chemin critique, très court)
+        self._db_lock = threading.Lock()  # Connexion SQLite (thread de flush)
+        self._stop = threading.Event()
+        self._thread = None
+        self._flush_hooks = []  # Autres écritures différées, flushées par le même thread
+        self._claims_pruned_at = 0.0
+        self._conn = None
+
+    def open(self):
+        """Ouvre la base et charge tout l'état (appelé par init_runtime, pas à l'import)"""
+        if self._conn is not None:
+            return
+        path = self.path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, updated_at REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key)) WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS counters ("
+            " namespace TEXT NOT NULL, key TEXT NOT NULL, period TEXT NOT NULL, count INTEGER NOT NULL,"
+            " PRIMARY KEY (namespace, key)) WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS claims ("
+            " scope TEXT NOT NULL, key TEXT NOT NULL, owner TEXT NOT NULL, ts REAL NOT NULL,"
+            " PRIMARY KEY (scope, key)) WITHOUT ROWID"
+        )
+        for namespace, key, value in self._conn.execute("SELECT namespace, key, value FROM kv"):
+            try:
+                self._cache.setdefault(namespace, {})[key] = json.loads(value)
+            except ValueError:
+                print(f"[STATE] Valeur illisible ignorée: {namespace}/{key}")
+        print(f"[STATE] {sum(len(v) for v in self._cache.values())} entrées chargées ({path})")
+
+    def get(self, namespace, key, default=None):
+        return self._cache.get(namespace, {}).get(key, default)
+
+    def items(self, namespace):
+        return dict(self._cache.get(namespace, {}))
+
+    def reload(self, *namespaces):
+        """Relit des namespaces depuis la base (écrits par une autre réplica).
+
+        Nos écritures en attente sont flushées d'abord, puis réappliquées si
+        d'autres sont arrivées entre-temps: elles restent les plus récentes.
+        """
+        self.flush()
+        fresh = {namespace: {} for namespace in namespaces}
+        with self._db_lock:
+            rows = self._conn.execute(
+                f"SELECT namespace, key, value FROM kv WHERE namespace IN ({','.join('?' * len(namespaces))})",
+                namespaces
+            ).fetchall()
+        for namespace, key, value in rows:
+            try:
+                fresh[namespace][key] = json.loads(value)
+            except ValueError:
+                print(f"[STATE] Valeur illisible ignorée: {namespace}/{key}")
+        with self._lock:
+            for (namespace, key), value in self._pending.items():
+                if namespace in fresh:
+                    if value is None:
+                        fresh[namespace].pop(key, None)
+                    else:
+                        fresh[namespace][key] = json.loads(value)
+        self._cache.update(fresh)
+
+    def increment(self, namespace, key, period="", limit=None, start=1):
+        """Incrément atomique en SQL, partagé entre réplicas (hors cache).
+
+        Le compteur repart à `start` quand `period` change (ex: le jour). Avec
+        `limit`, rien n'est écrit une fois la limite atteinte: renvoie None.
+        """
+        with self._db_lock:
+            row = self._conn.execute(
+                "INSERT INTO counters (namespace, key, period, count) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT(namespace, key) DO UPDATE SET"
+                " count = CASE WHEN period = excluded.period THEN count + 1 ELSE excluded.count END,"
+                " period = excluded.period"
+                " WHERE period != excluded.period OR ?5 IS NULL OR count < ?5"
+                " RETURNING count",
+                (namespace, key, period, start, limit)
+            ).fetchone()
+        return row[0] if row else None
+
+    def decrement(self, namespace, key, period=""):
+        """Rend une unité prise par increment() (même période seulement)"""
+        with self._db_lock:
+            self._conn.execute(
+                "UPDATE counters SET count = count - 1 WHERE namespace = ? AND key = ? AND period = ? AND count > 0",
+                (namespace, key, period)
+            )
+
+    def counter(self, namespace, key, period=""):
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT count FROM counters WHERE namespace = ? AND key = ? AND period = ?",
+                (namespace, key, period)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def claim(self, scope, key, owner, ttl=86400):
+        """Réserve `key` pour une seule réplica (INSERT OR IGNORE).
+
+        Idempotent: True pour la réplica qui a réservé la première, à chaque
+        appel; False pour les autres. Les réservations de plus de `ttl`
+        secondes sont purgées au plus une fois par heure.
+        """
+        now = systime.time()
+        with self._db_lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO claims (scope, key, owner, ts) VALUES (?, ?, ?, ?)",
+                (scope, key, owner, now)
+            )
+            row = self._conn.execute("SELECT owner FROM claims WHERE scope = ? AND key = ?", (scope, key)).fetchone()
+            if now - self._claims_pruned_at > 3600:
+                self._conn.execute("DELETE FROM claims WHERE ts < ?", (now - ttl,))
+                self._claims_pruned_at = now
+        return row is not None and row[0] == owner
+
+    def counts(self):
+        return {namespace: len(values) for namespace, values in list(self._cache.items())}
+
+    def set(self, namespace, key, value):
+        self._cache.setdefault(namespace, {})[key] = value
+        encoded = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._pending[(namespace, key)] = encoded
+
+    def delete(self, namespace, key):
+        if self._cache.get(namespace, {}).pop(key, None) is None:
+            return
+        with self._lock:
+            self._pending[(namespace, key)] = None
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        now = systime.time()
+        upserts = [(ns, key, value, now) for (ns, key), value in pending.items() if value is not None]
+        deletes = [(ns, key) for (ns, key), value in pending.items() if value is None]
+        try:
+            with self._db_lock:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(
+                    "INSERT INTO kv (namespace, key, value, updated_at) VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT(namespace, key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at",
+                    upserts
+                )
+                self._conn.executemany("DELETE FROM kv WHERE namespace = ? AND key = ?", deletes)
+                self._conn.execute("COMMIT")
+        except Exception as e:
+            print(f"[STATE] Erreur flush: {e}")
+            with self._db_lock:
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+            # Les écritures plus récentes gagnent, les autres seront retentées
+            with self._lock:
+                for item, value in pending.items():
+                    self._pending.setdefault(item, value)
+            return 0
+        return len(pending)
+
+    def add_flush_hook(self, hook):
+        self._flush_hooks.append(hook)
+
+    def _run_hooks(self):
+        for hook in self._flush_hooks:
+            try:
+                hook()
+            except Exception as e:
+                print(f"[STATE] Erreur flush {getattr(hook, '__qualname__', hook)}: {e}")
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_seconds):
+            self.flush()
+            self._run_hooks()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._flush_loop, name="state-flush", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def close(self):
+        self._stop.set()
+        self.flush()
+        self._run_hooks()
+
+state_store = StateStore(STATE_DB_PATH)
+
+# ============================================================
+#     🧾 REGISTRE LLM (usage et latence par site d'appel)
+# ============================================================
+LLM_LEDGER_RETENTION_DAYS = int(os.getenv("LLM_LEDGER_RETENTION_DAYS", "30"))
+# Prix indicatifs en $ par million de tokens (grok-3 par défaut)
+LLM_PRICE_INPUT_PER_M = float(os.getenv("LLM_PRICE_INPUT_PER_M", "3"))
+LLM_PRICE_OUTPUT_PER_M = float(os.getenv("LLM_PRICE_OUTPUT_PER_M", "15"))
+
+# Fonctionnalité d'origine (commande en cours), sinon le site d'appel
+current_feature = contextvars.ContextVar("current_feature", default=None)
+
+def llm_cost(prompt_tokens, completion_tokens):
+    return (prompt_tokens * LLM_PRICE_INPUT_PER_M + completion_tokens * LLM_PRICE_OUTPUT_PER_M) / 1e6
+
+class LlmLedger:
+    """Une ligne par appel Grok (entiers uniquement, jamais le texte) + agrégats journaliers.
+
+    Les appels sont mis en file et écrits par le thread de flush du StateStore.
+    Les lignes brutes sont purgées après `retention_days`; les agrégats
+    llm_daily (jour x fonctionnalité x site d'appel x modèle) sont conservés.
+    """
+
+    def __init__(self, path, retention_days=LLM_LEDGER_RETENTION_DAYS):
+        self.path = path
+        self.retention_days = retention_days
+        self._pending = []
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._pruned_day = None
+        self._conn = None
+
+    def open(self):
+        if self._conn is not None:
+            return
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS llm_calls ("
+            " ts INTEGER NOT NULL, feature TEXT NOT NULL, call_site TEXT NOT NULL, model TEXT NOT NULL,"
+            " prompt_tokens INTEGER NOT NULL, completion_tokens INTEGER NOT NULL, latency_ms INTEGER NOT NULL, ok INTEGER NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS llm_calls_ts ON llm_calls (ts);"
+            "CREATE TABLE IF NOT EXISTS llm_daily ("
+            " day TEXT NOT NULL, feature TEXT NOT NULL, call_site TEXT NOT NULL, model TEXT NOT NULL,"
+            " calls INTEGER NOT NULL, errors INTEGER NOT NULL, prompt_tokens INTEGER NOT NULL, completion_tokens INTEGER NOT NULL,"
+            " latency_ms_total INTEGER NOT NULL, latency_ms_max INTEGER NOT NULL,"
+            " PRIMARY KEY (day, feature, call_site, model)) WITHOUT ROWID;"
+        )
+
+    def record(self, call_site, model, latency, usage=None, ok=True):
+        row = (
+            int(systime.time()),
+            current_feature.get() or call_site,
+            call_site,
+            model or "?",
+            (usage.prompt_tokens or 0) if usage else 0,
+            (usage.completion_tokens or 0) if usage else 0,
+            int(latency * 1000),
+            1 if ok else 0,
+        )
+        with self._lock:
+            self._pending.append(row)
+
+    def flush(self):
+        with self._lock:
+            rows, self._pending = self._pending, []
+        if not rows:
+            return 0
+        rollups = {}
+        for ts, feature, call_site, model, prompt, completion, latency_ms, ok in rows:
+            day = datetime.fromtimestamp(ts, TIMEZONE).strftime("%Y-%m-%d")
+            agg = rollups.setdefault((day, feature, call_site, model), [0, 0, 0, 0, 0, 0])
+            agg[0] += 1
+            agg[1] += 0 if ok else 1
+            agg[2] += prompt
+            agg[3] += completion
+            agg[4] += latency_ms
+            agg[5] = max(agg[5], latency_ms)
+        today = datetime.now(TIMEZONE).strftime("%Y-%m-%d")
+        with self._db_lock:
+            try:
+                self._conn.execute("BEGIN")
+                self._conn.executemany("INSERT INTO llm_calls VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                self._conn.executemany(
+                    "INSERT INTO llm_daily VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                    " ON CONFLICT(day, feature, call_site, model) DO UPDATE SET"
+                    " calls = calls + excluded.calls, errors = errors + excluded.errors,"
+                    " prompt_tokens = prompt_tokens + excluded.prompt_tokens,"
+                    " completion_tokens = completion_tokens + excluded.completion_tokens,"
+                    " latency_ms_total = latency_ms_total + excluded.latency_ms_total,"
+                    " latency_ms_max = MAX(latency_ms_max, excluded.latency_ms_max)",
+                    [key + tuple(agg) for key, agg in rollups.items()]
+                )
+                if self._pruned_day != today:
+                    cutoff = int(systime.time()) - self.retention_days * 86400
+                    self._conn.execute("DELETE FROM llm_calls WHERE ts < ?", (cutoff,))
+                    self._pruned_day = today
+                self._conn.execute("COMMIT")
+            except Exception as e:
+                print(f"[LLM] Erreur flush registre: {e}")
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+                with self._lock:
+                    self._pending[:0] = rows
+                return 0
+        return len(rows)
+
+    def query(self, sql, params=()):
+        with self._db_lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def by_feature(self, since_day):
+        return self.query(
+            "SELECT feature, SUM(calls), SUM(errors), SUM(prompt_tokens), SUM(completion_tokens),"
+            " SUM(latency_ms_total), MAX(latency_ms_max) FROM llm_daily WHERE day >= ?"
+            " GROUP BY feature ORDER BY SUM(prompt_tokens) * ? + SUM(completion_tokens) * ? DESC",
+            (since_day, LLM_PRICE_INPUT_PER_M, LLM_PRICE_OUTPUT_PER_M)
+        )
+
+    def by_day(self, since_day):
+        return self.query(
+            "SELECT day, SUM(calls), SUM(errors), SUM(prompt_tokens), SUM(completion_tokens), SUM(latency_ms_total)"
+            " FROM llm_daily WHERE day >= ? GROUP BY day ORDER BY day DESC",
+            (since_day,)
+        )
+
+    def by_model(self, since_day):
+        return self.query(
+            "SELECT model, SUM(calls), SUM(prompt_tokens), SUM(completion_tokens) FROM llm_daily"
+            " WHERE day >= ? GROUP BY model ORDER BY SUM(calls) DESC",
+            (since_day,)
+        )
+
+llm_ledger = LlmLedger(STATE_DB_PATH)
+
+# ============================================================
+#     🗂️ DÉDUPLICATION (IDs déjà envoyés)
+# ============================================================
+DEDUP_MAX_ITEMS = int(os.getenv("DEDUP_MAX_ITEMS", "2000"))  # Couvre plusieurs flux (~15 news / appel)
+DEDUP_TTL_HOURS = int(os.getenv("DEDUP_TTL_HOURS", "72"))
+
+class DedupStore:
+    """Historique borné des IDs déjà envoyés, ordonné par insertion.
+
+    OrderedDict {id: timestamp} : insertion et lookup en O(1), les plus anciens
+    sont évincés en premier (capacité) et expirent après `ttl` secondes.
+    Avec `state`, chaque ajout/éviction est répliqué dans le StateStore.
+    """
+
+    def __init__(self, name, max_items=DEDUP_MAX_ITEMS, ttl=DEDUP_TTL_HOURS * 3600, state=None):
+        self.name = name
+        self.max_items = max_items
+        self.ttl = ttl
+        self.state = state
+        self.namespace = f"dedup:{name}"
+        self._items = OrderedDict()
+
+    def __contains__(self, item_id):
+        ts = self._items.get(item_id)
+        return ts is not None and ts >= systime.time() - self.ttl
+
+    def __len__(self):
+        return len(self._items)
+
+    def add(self, item_id):
+        if not item_id:
+            return
+        now = systime.time()
+        self._items[item_id] = now
+        self._items.move_to_end(item_id)
+        if self.state:
+            self.state.set(self.namespace, item_id, now)
+        self._expire(now)
+        while len(self._items) > self.max_items:
+            self._evict()
+
+    def _evict(self):
+        item_id, _ = self._items.popitem(last=False)
+        if self.state:
+            self.state.delete(self.namespace, item_id)
+
+    def _expire(self, now):
+        cutoff = now - self.ttl
+        while self._items:
+            oldest_ts = next(iter(self._items.values()))
+            if oldest_ts >= cutoff:
+                break
+            self._evict()
+
+    def load(self):
+        for item_id, ts in sorted(self.state.items(self.namespace).items(), key=lambda x: x[1]):
+            self._items[item_id] = ts
+        self._expire(systime.time())
+        if self._items:
+            print(f"[DEDUP] {self.name}: {len(self._items)} IDs restaurés")
+
+    def reload(self):
+        """Remplace le contenu par celui du StateStore (après un failover)"""
+        items = OrderedDict(sorted(self.state.items(self.namespace).items(), key=lambda x: x[1]))
+        self._items = items
+        self._expire(systime.time())
+
+sent_news_ids = DedupStore("news", state=state_store)
+sent_alert_ids = DedupStore("alerts", state=state_store)
+last_news_sent_time = None  # Restauré par init_runtime
+
+# ============================================================
+#     📈 HISTORIQUE MARCHÉ (ring buffers en mémoire)
+# ============================================================
+TIMESERIES_CAPACITY = 3000      # 24h+ à 1 point / 30s
+TIMESERIES_BUCKET_SECONDS = 30  # Les ticks plus rapprochés écrasent le dernier point
+# Écart toléré entre un point et l'instant qu'il représente (poll 15 min + marge),
+# plafonné au quart de la fenêtre: au-delà, la variation n'est pas calculée
+TIMESERIES_MAX_GAP_SECONDS = int(os.getenv("TIMESERIES_MAX_GAP_SECONDS", "1200"))
+
+class RingBuffer:
+    """Série temporelle de taille fixe sur deux array('d') (timestamps, valeurs).
+
+    Les timestamps sont croissants : la recherche d'un instant est une dichotomie
+    O(log n), les agrégats sur une fenêtre sont en O(fenêtre).
+    """
+
+    def __init__(self, capacity=TIMESERIES_CAPACITY):
+        self.capacity = capacity
+        self._ts = array("d", bytes(8 * capacity))
+        self._values = array("d", bytes(8 * capacity))
+        self._start = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def _physical(self, i):
+        return (self._start + i) % self.capacity
+
+    def ts_at(self, i):
+        return self._ts[self._physical(i)]
+
+    def value_at(self, i):
+        return self._values[self._physical(i)]
+
+    def append(self, value, ts, bucket_seconds=0):
+        if self._size and ts - self.ts_at(self._size - 1) < bucket_seconds:
+            self._values[self._physical(self._size - 1)] = value
+            return
+        if self._size < self.capacity:
+            idx = self._physical(self._size)
+            self._size += 1
+        else:
+            idx = self._start
+            self._start = (self._start + 1) % self.capacity
+        self._ts[idx] = ts
+        self._values[idx] = value
+
+    def latest(self):
+        if not self._size:
+            return None
+        return self.ts_at(self._size - 1), self.value_at(self._size - 1)
+
+    def index_before(self, ts):
+        """Index logique du dernier point <= ts, -1 si aucun"""
+        lo, hi = 0, self._size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.ts_at(mid) <= ts:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo - 1
+
+    def window_values(self, seconds, now):
+        start = max(self.index_before(now - seconds) + 1, 0)
+        return [self.value_at(i) for i in range(start, self._size)]
+
+    def to_dict(self):
+        return {
+            "ts": [self.ts_at(i) for i in range(self._size)],
+            "values": [self.value_at(i) for i in range(self._size)],
+        }
+
+    @classmethod
+    def from_dict(cls, payload, capacity=TIMESERIES_CAPACITY):
+        buf = cls(capacity)
+        for ts, value in zip(payload.get("ts", []), payload.get("values", [])):
+            buf.append(value, ts)
+        return buf
+
+class TimeSeriesStore:
+    """Historique par métrique (btc_price, eth_price, fear_greed, btc_dominance...)"""
+
+    def __init__(self, state=None, capacity=TIMESERIES_CAPACITY):
+        self.state = state
+        self.capacity = capacity
+        self.series = {}
+
+    def record(self, metric, value, ts=None, bucket_seconds=TIMESERIES_BUCKET_SECONDS):
+        if value is None:
+            return
+        buf = self.series.get(metric)
+        if buf is None:
+            buf = self.series[metric] = RingBuffer(self.capacity)
+        buf.append(float(value), ts if ts is not None else systime.time(), bucket_seconds)
+
+    def latest(self, metric):
+        buf = self.series.get(metric)
+        point = buf.latest() if buf else None
+        return point[1] if point else None
+
+    def age(self, metric, now=None):
+        """Âge en secondes du dernier point, None si la série est vide"""
+        buf = self.series.get(metric)
+        point = buf.latest() if buf else None
+        if not point:
+            return None
+        return (now if now is not None else systime.time()) - point[0]
+
+    def change_pct(self, metric, seconds, now=None, max_gap=TIMESERIES_MAX_GAP_SECONDS):
+        """Variation en % sur la fenêtre.
+
+        None si l'historique est trop court, ou si le point de départ ou le
+        dernier point sont trop éloignés de leur instant (redémarrage, trou de
+        polling): sinon une "variation 1h" comparerait à un point vieux de 8h.
+        """
+        buf = self.series.get(metric)
+        if not buf:
+            return None
+        now = now if now is not None else systime.time()
+        tolerance = min(max_gap, seconds / 4)
+        latest_ts, latest_value = buf.latest()
+        if now - latest_ts > tolerance:
+            return None
+        idx = buf.index_before(now - seconds)
+        if idx < 0 or now - seconds - buf.ts_at(idx) > tolerance:
+            return None
+        base = buf.value_at(idx)
+        if not base:
+            return None
+        return (latest_value - base) / base * 100
+
+    def high_low(self, metric, seconds, now=None):
+        buf = self.series.get(metric)
+        values = buf.window_values(seconds, now if now is not None else systime.time()) if buf else []
+        if not values:
+            return None
+        return max(values), min(values)
+
+    def volatility(self, metric, seconds, now=None):
+        """Écart-type des rendements (%) entre points consécutifs de la fenêtre"""
+        buf = self.series.get(metric)
+        values = buf.window_values(seconds, now if now is not None else systime.time()) if buf else []
+        returns = [(b - a) / a * 100 for a, b in zip(values, values[1:]) if a]
+        if len(returns) < 2:
+            return None
+        mean = sum(returns) / len(returns)
+        return math.sqrt(sum((r - mean) ** 2 for r in returns) / (len(returns) - 1))
+
+    def load(self):
+        for metric, data in self.state.items("timeseries").items():
+            self.series[metric] = RingBuffer.from_dict(data, self.capacity)
+        if self.series:
+            print(f"[TIMESERIES] {len(self.series)} séries restaurées")
+
+    def save(self):
+        """Snapshot des séries dans le StateStore (appelé à chaque poll, pas à chaque tick)"""
+        if not self.state:
+            return
+        for metric, buf in self.series.items():
+            self.state.set("timeseries", metric, buf.to_dict())
+
+timeseries = TimeSeriesStore(state=state_store)
+
+def format_rolling_stats(symbol):
+    """Résumé 1h/4h/24h + range et volatilité 24h pour les prompts VIP"""
+    metric = f"{symbol.lower()}_price"
+    changes = []
+    for label, seconds in (("1h", 3600), ("4h", 4 * 3600), ("24h", 24 * 3600)):
+        change = timeseries.change_pct(metric, seconds)
+        if change is not None:
+            changes.append(f"{label} {change:+.2f}%")
+    if not changes:
+        return ""
+    text = f"{symbol} variations: {' | '.join(changes)}"
+    high_low = timeseries.high_low(metric, 24 * 3600)
+    if high_low:
+        text += f" | Range 24h: ${high_low[1]:,.0f} - ${high_low[0]:,.0f}"
+    vol = timeseries.volatility(metric, 24 * 3600)
+    if vol is not None:
+        text += f" | Volatilité: {vol:.2f}%"
+    return text
 
 # Mots-clés URGENTS (strict)
 URGENT_KEYWORDS = [
@@ -124,30 +760,561 @@ def get_tradingview_link(symbol):
         return TRADINGVIEW_CHARTS[symbol_upper]
     return f"https://www.tradingview.com/chart/?symbol=BINANCE:{symbol_upper}USDT"
 
-# Logs de configuration
-print("=" * 60)
-print("🚀 HORIZON ELITE BOT V4 - CONFIGURATION")
-print("=" * 60)
-print(f"[CONFIG] DISCORD_TOKEN: {'✅' if DISCORD_TOKEN else '❌'}")
-print(f"[CONFIG] XAI_API_KEY: {'✅' if XAI_API_KEY else '❌'}")
-print(f"[CONFIG] LUNARCRUSH_API_KEY: {'✅' if LUNARCRUSH_API_KEY else '❌ (optionnel)'}")
-print("=" * 60)
-
 # ============================================================
 #                    DISCORD BOT SETUP
 # ============================================================
 intents = discord.Intents.default()
 intents.message_content = True
 intents.guilds = True
-bot = commands.Bot(command_prefix="!", intents=intents)
+# Plusieurs réplicas (même STATE_DIR): chaque commande est réservée dans la base
+# partagée (claim_command), une seule réplica y répond.
+# SHARD_ID/SHARD_COUNT répartissent en plus les serveurs Discord, mais un serveur
+# n'est servi que par un shard: pour un bot mono-serveur, le sharding n'apporte
+# AUCUN failover (si la réplica de ce shard tombe, plus rien ne répond ni ne
+# publie). La redondance vient de plusieurs réplicas sans sharding.
+SHARD_ID = os.getenv("SHARD_ID")
+SHARD_COUNT = os.getenv("SHARD_COUNT")
+if SHARD_ID is not None and SHARD_COUNT is not None:
+    bot = commands.Bot(command_prefix="!", intents=intents, shard_id=int(SHARD_ID), shard_count=int(SHARD_COUNT))
+else:
+    bot = commands.Bot(command_prefix="!", intents=intents)
 
 client_xai = None
-if XAI_API_KEY:
+client_xai_error = None
+
+def get_xai_client():
+    """Client xAI créé au premier appel Grok (l'import d'openai n'est payé qu'ici)"""
+    global client_xai, client_xai_error
+    if client_xai is None and XAI_API_KEY and client_xai_error is None:
+        try:
+            OpenAI = LAZY_MODULES["openai"].OpenAI
+            client_xai = OpenAI(api_key=XAI_API_KEY, base_url="https://api.x.ai/v1")
+            print("[GROK] Client xAI initialisé ✅")
+        except Exception as e:
+            client_xai_error = e
+            print(f"[GROK] Erreur: {e}")
+    return client_xai
+
+# ============================================================
+#     🧭 TRACES (spans run_global_update)
+# ============================================================
+# Une trace par mise à jour: span racine run_global_update, enfants par étape,
+# fetch fournisseur, appel Grok et envoi Discord. Le span courant suit les
+# await via contextvars; hors trace échantillonnée, span() ne fait rien.
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "1") == "1"
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+TRACE_FORMAT = os.getenv("TRACE_FORMAT", "json")  # json | otlp
+TRACE_PATH = os.getenv("TRACE_PATH", os.path.join(STATE_DIR, "traces.otlp.jsonl" if TRACE_FORMAT == "otlp" else "traces.jsonl"))
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", str(20 * 1024 * 1024)))
+
+current_span = contextvars.ContextVar("current_span", default=None)
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, trace, name, parent_id, attributes):
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = systime.time_ns()
+        self.end_ns = None
+        self.attributes = attributes
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def incr(self, key, amount=1):
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    @property
+    def duration_ms(self):
+        return ((self.end_ns or systime.time_ns()) - self.start_ns) / 1e6
+
+    def to_dict(self):
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start_ns / 1e9,
+            "duration_ms": round(self.duration_ms, 2),
+            "status": "error" if self.error else "ok",
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+class Trace:
+    def __init__(self, name):
+        self.trace_id = os.urandom(16).hex()
+        self.name = name
+        self.spans = []
+
+def otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def trace_to_otlp(trace):
+    """ExportTraceServiceRequest au format OTLP/JSON (une ligne par trace)"""
+    spans = [{
+        "traceId": trace.trace_id,
+        "spanId": sp.span_id,
+        "parentSpanId": sp.parent_id or "",
+        "name": sp.name,
+        "kind": 1,
+        "startTimeUnixNano": str(sp.start_ns),
+        "endTimeUnixNano": str(sp.end_ns),
+        "attributes": [{"key": k, "value": otlp_value(v)} for k, v in sp.attributes.items() if v is not None],
+        "status": {"code": 2, "message": sp.error} if sp.error else {"code": 1},
+    } for sp in trace.spans]
+    return {"resourceSpans": [{
+        "resource": {"attributes": [
+            {"key": "service.name", "value": {"stringValue": "horizon-elite-bot"}},
+            {"key": "service.instance.id", "value": {"stringValue": INSTANCE_ID}},
+        ]},
+        "scopeSpans": [{"scope": {"name": "horizon.bot"}, "spans": spans}],
+    }]}
+
+def export_trace(trace):
+    root = trace.spans[0]
+    if TRACE_FORMAT == "otlp":
+        record = trace_to_otlp(trace)
+    else:
+        record = {"trace_id": trace.trace_id, "name": trace.name, "start": root.start_ns / 1e9,
+                  "duration_ms": round(root.duration_ms, 2), "spans": [sp.to_dict() for sp in trace.spans]}
+    line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
     try:
-        client_xai = OpenAI(api_key=XAI_API_KEY, base_url="https://api.x.ai/v1")
-        print("[GROK] Client xAI initialisé ✅")
-    except Exception as e:
-        print(f"[GROK] Erreur: {e}")
+        os.makedirs(os.path.dirname(TRACE_PATH) or ".", exist_ok=True)
+        if os.path.exists(TRACE_PATH) and os.path.getsize(TRACE_PATH) > TRACE_MAX_BYTES:
+            os.replace(TRACE_PATH, TRACE_PATH + ".1")
+        with open(TRACE_PATH, "a", encoding="utf-8") as f:
+            f.write(line)
+    except OSError as e:
+        print(f"[TRACE] Erreur export: {e}")
+
+def trace_summary(trace):
+    """Temps cumulé par type de span (http / llm / discord) sous la racine"""
+    totals = {}
+    for sp in trace.spans[1:]:
+        kind = sp.attributes.get("kind")
+        if kind in ("http", "llm", "discord"):
+            totals[kind] = totals.get(kind, 0) + sp.duration_ms
+    return ", ".join(f"{k} {v / 1000:.1f}s" for k, v in sorted(totals.items(), key=lambda kv: -kv[1]))
+
+@contextmanager
+def span(name, root=False, **attributes):
+    """Span enfant du span courant; root=True ouvre une nouvelle trace (échantillonnée)"""
+    parent = current_span.get()
+    if root:
+        if not TRACE_ENABLED or random.random() >= TRACE_SAMPLE_RATE:
+            yield None
+            return
+        trace, parent_id = Trace(name), None
+    elif parent is None:
+        yield None
+        return
+    else:
+        trace, parent_id = parent.trace, parent.span_id
+    sp = Span(trace, name, parent_id, attributes)
+    trace.spans.append(sp)
+    token = current_span.set(sp)
+    try:
+        yield sp
+    except BaseException as e:
+        sp.error = f"{type(e).__name__}: {e}"[:300]
+        raise
+    finally:
+        sp.end_ns = systime.time_ns()
+        current_span.reset(token)
+        if root:
+            export_trace(trace)
+            print(f"[TRACE] {name} {sp.duration_ms / 1000:.1f}s ({len(trace.spans)} spans) — {trace_summary(trace)}")
+
+# ============================================================
+#     🎞️ RECORD / REPLAY HTTP (cassettes)
+# ============================================================
+# HTTP_MODE=record: appels réels, réponses enregistrées dans HTTP_CASSETTE_DIR
+# (un fichier JSON par fournisseur). HTTP_MODE=replay: aucune requête réseau,
+# les réponses sont rejouées depuis les cassettes, avec latence et erreurs
+# injectées. Exemple d'enregistrement complet:
+#     HTTP_MODE=record python -c "import bot; bot.fetch_all_market_data(); bot.get_gold_price()"
+HTTP_MODE = os.getenv("HTTP_MODE", "live")  # live | record | replay
+HTTP_CASSETTE_DIR = os.getenv("HTTP_CASSETTE_DIR", "cassettes")
+HTTP_CASSETTE_MAX_PER_URL = int(os.getenv("HTTP_CASSETTE_MAX_PER_URL", "5"))
+# Latence rejouée: "recorded" (celle de l'enregistrement) ou un nombre de ms, ex. "200" ou "200:50" (moyenne:écart-type)
+HTTP_REPLAY_LATENCY = os.getenv("HTTP_REPLAY_LATENCY", "0")
+HTTP_REPLAY_ERROR_RATE = float(os.getenv("HTTP_REPLAY_ERROR_RATE", "0"))
+HTTP_REPLAY_ERROR = os.getenv("HTTP_REPLAY_ERROR", "timeout")  # timeout | connection | code HTTP (ex. 429)
+HTTP_REPLAY_SEED = os.getenv("HTTP_REPLAY_SEED")
+
+SECRET_QUERY_PARAMS = {"api_key", "apikey", "key", "token", "access_token"}
+
+def cassette_key(url):
+    """URL sans les secrets de la query string (jamais écrits dans les cassettes)"""
+    parsed = urllib.parse.urlsplit(url)
+    query = [(k, "REDACTED" if k.lower() in SECRET_QUERY_PARAMS else v)
+             for k, v in urllib.parse.parse_qsl(parsed.query, keep_blank_values=True)]
+    return urllib.parse.urlunsplit(parsed._replace(query=urllib.parse.urlencode(query, safe=",/")))
+
+class CassetteStore:
+    def __init__(self, directory, mode=HTTP_MODE, latency=HTTP_REPLAY_LATENCY,
+                 error_rate=HTTP_REPLAY_ERROR_RATE, error=HTTP_REPLAY_ERROR, seed=HTTP_REPLAY_SEED):
+        self.directory = directory
+        self.mode = mode
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error = error
+        self.rng = random.Random(seed)
+        self._cassettes = {}  # provider -> {url: [enregistrements]}
+        self._cursor = {}     # (provider, url) -> prochain enregistrement rejoué
+        self._lock = threading.Lock()
+        self._validate()
+
+    def _validate(self):
+        """Config vérifiée une fois au démarrage, plutôt qu'en ValueError dans http_get"""
+        if self.mode not in ("live", "record", "replay"):
+            raise ValueError(f"HTTP_MODE invalide: {self.mode!r} (live | record | replay)")
+        if self.error not in ("timeout", "connection") and not (self.error.isdigit() and 100 <= int(self.error) <= 599):
+            raise ValueError(f"HTTP_REPLAY_ERROR invalide: {self.error!r} (timeout | connection | code HTTP)")
+        if self.latency != "recorded":
+            try:
+                mean, _, stdev = self.latency.partition(":")
+                float(mean or 0), float(stdev or 0)
+            except ValueError:
+                raise ValueError(f"HTTP_REPLAY_LATENCY invalide: {self.latency!r} (recorded | ms | moyenne:écart-type)") from None
+
+    def path(self, provider):
+        return os.path.join(self.directory, f"{provider}.json")
+
+    def load(self, provider):
+        if provider not in self._cassettes:
+            try:
+                with open(self.path(provider), encoding="utf-8") as f:
+                    self._cassettes[provider] = json.load(f)
+            except FileNotFoundError:
+                self._cassettes[provider] = {}
+        return self._cassettes[provider]
+
+    def record(self, provider, url, response, elapsed):
+        try:
+            entry = {"body": response.content.decode("utf-8")}
+        except UnicodeDecodeError:
+            entry = {"body_b64": base64.b64encode(response.content).decode("ascii")}
+        entry.update({
+            "status": response.status_code,
+            "content_type": response.headers.get("Content-Type", ""),
+            "elapsed_ms": round(elapsed * 1000, 1),
+            "recorded_at": datetime.now(TIMEZONE).isoformat(),
+        })
+        with self._lock:
+            cassette = self.load(provider)
+            entries = cassette.setdefault(cassette_key(url), [])
+            entries.append(entry)
+            del entries[:-HTTP_CASSETTE_MAX_PER_URL]
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = self.path(provider) + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(cassette, f, ensure_ascii=False, indent=1)
+            os.replace(tmp, self.path(provider))
+
+    def replay_delay(self, entry):
+        if self.latency == "recorded":
+            return entry.get("elapsed_ms", 0) / 1000
+        mean, _, stdev = self.latency.partition(":")
+        delay = float(mean or 0)
+        if stdev:
+            delay = self.rng.gauss(delay, float(stdev))
+        return max(delay, 0) / 1000
+
+    def replay(self, provider, url):
+        key = cassette_key(url)
+        with self._lock:
+            entries = self.load(provider).get(key)
+            if not entries:
+                raise requests.exceptions.ConnectionError(f"[REPLAY] Aucune cassette pour {provider}: {key}")
+            # Rotation déterministe entre les enregistrements d'une même URL
+            index = self._cursor.get((provider, key), 0)
+            self._cursor[(provider, key)] = index + 1
+            entry = entries[index % len(entries)]
+            fail = self.error_rate and self.rng.random() < self.error_rate
+            delay = self.replay_delay(entry)
+        if delay:
+            systime.sleep(delay)  # Bloquant, comme le vrai requests.get
+        if fail:
+            if self.error == "timeout":
+                raise requests.exceptions.ReadTimeout(f"[REPLAY] Timeout injecté ({provider})")
+            if self.error == "connection":
+                raise requests.exceptions.ConnectionError(f"[REPLAY] Erreur injectée ({provider})")
+            entry = {"status": int(self.error), "body": "", "content_type": "text/plain"}
+        response = requests.Response()
+        response.status_code = entry["status"]
+        response._content = base64.b64decode(entry["body_b64"]) if "body_b64" in entry else entry["body"].encode("utf-8")
+        response.headers["Content-Type"] = entry.get("content_type", "")
+        response.encoding = "utf-8"
+        response.url = url
+        return response
+
+cassettes = CassetteStore(HTTP_CASSETTE_DIR)
+
+def http_transport(provider, url, **kwargs):
+    if HTTP_MODE == "replay":
+        return cassettes.replay(provider, url)
+    start = systime.perf_counter()
+    r = requests.get(url, **kwargs)
+    if HTTP_MODE == "record":
+        cassettes.record(provider, url, r, systime.perf_counter() - start)
+    return r
+
+# ============================================================
+#     📊 MÉTRIQUES (Prometheus)
+# ============================================================
+# Registre par défaut de prometheus_client, exposé sur /metrics par le serveur web.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 40)
+
+PROVIDER_LATENCY = Histogram("horizon_provider_request_seconds", "Latence des appels API data", ["provider"], buckets=LATENCY_BUCKETS)
+PROVIDER_ERRORS = Counter("horizon_provider_errors_total", "Erreurs des appels API data", ["provider", "reason"])
+LLM_LATENCY = Histogram("horizon_llm_request_seconds", "Latence des appels Grok", ["call_site"], buckets=LATENCY_BUCKETS + (60, 120))
+LLM_TOKENS = Counter("horizon_llm_tokens_total", "Tokens Grok consommés", ["call_site", "kind"])
+LLM_ERRORS = Counter("horizon_llm_errors_total", "Erreurs des appels Grok", ["call_site", "reason"])
+DISCORD_SEND_LATENCY = Histogram("horizon_discord_send_seconds", "Latence des envois Discord (retries 429 inclus)", ["channel"], buckets=LATENCY_BUCKETS)
+DISCORD_SEND_ERRORS = Counter("horizon_discord_send_errors_total", "Envois Discord en échec", ["channel", "reason"])
+DISCORD_RATE_LIMITS = Counter("horizon_discord_rate_limited_total", "Réponses 429 de Discord", ["channel"])
+TASK_DURATION = Histogram("horizon_task_loop_seconds", "Durée d'une itération de tasks.loop", ["task"], buckets=LATENCY_BUCKETS + (60, 120, 300))
+TASK_LAST_SUCCESS = Gauge("horizon_task_loop_last_success_timestamp", "Fin de la dernière itération réussie (epoch)", ["task"])
+TASK_FAILURES = Counter("horizon_task_loop_failures_total", "Itérations de tasks.loop en exception", ["task"])
+UPDATE_STAGE_LATENCY = Histogram("horizon_global_update_stage_seconds", "Durée de chaque étape de run_global_update", ["stage"], buckets=LATENCY_BUCKETS + (60, 120))
+
+@contextmanager
+def update_stage(name):
+    """Étape de run_global_update: histogramme + span enfant"""
+    with UPDATE_STAGE_LATENCY.labels(name).time(), span(name, kind="stage") as sp:
+        yield sp
+
+def http_get(provider, url, **kwargs):
+    """requests.get instrumenté: latence et erreurs par fournisseur"""
+    start = systime.perf_counter()
+    with span(f"http {provider}", kind="http", provider=provider, url=url.split("?")[0]) as sp:
+        try:
+            r = http_transport(provider, url, **kwargs)
+        except Exception as e:
+            PROVIDER_ERRORS.labels(provider, type(e).__name__).inc()
+            raise
+        finally:
+            PROVIDER_LATENCY.labels(provider).observe(systime.perf_counter() - start)
+        if r.status_code >= 400:
+            PROVIDER_ERRORS.labels(provider, str(r.status_code)).inc()
+        if sp:
+            sp.set(status=r.status_code, bytes=len(r.content))
+    return r
+
+def llm_complete(call_site, **kwargs):
+    """chat.completions.create instrumenté: latence, tokens et erreurs par site d'appel"""
+    start = systime.perf_counter()
+    with span(f"llm {call_site}", kind="llm", call_site=call_site, model=kwargs.get("model"),
+              max_tokens=kwargs.get("max_tokens")) as sp:
+        try:
+            response = get_xai_client().chat.completions.create(**kwargs)
+        except Exception as e:
+            LLM_ERRORS.labels(call_site, type(e).__name__).inc()
+            llm_ledger.record(call_site, kwargs.get("model"), systime.perf_counter() - start, ok=False)
+            raise
+        finally:
+            LLM_LATENCY.labels(call_site).observe(systime.perf_counter() - start)
+        usage = getattr(response, "usage", None)
+        llm_ledger.record(call_site, kwargs.get("model"), systime.perf_counter() - start, usage)
+        if usage:
+            LLM_TOKENS.labels(call_site, "prompt").inc(usage.prompt_tokens or 0)
+            LLM_TOKENS.labels(call_site, "completion").inc(usage.completion_tokens or 0)
+            if sp:
+                sp.set(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+    return response
+
+def channel_label(channel_id):
+    for name, cid in CHANNELS.items():
+        if cid and cid == channel_id:
+            return name
+    return "other"
+
+async def timed_send(channel, channel_name, leader_only=True, **kwargs):
+    """channel.send instrumenté: latence, erreurs et 429 par canal.
+
+    Les broadcasts (leader_only) revérifient le bail juste avant l'envoi.
+    """
+    if leader_only and not holds_leadership():
+        raise LeadershipLost(f"#{channel_name}: {INSTANCE_ID} n'est plus leader")
+    start = systime.perf_counter()
+    with span("discord.send", kind="discord", channel=channel_name, retries=0,
+              content_chars=len(kwargs.get("content") or ""), embed="embed" in kwargs) as sp:
+        try:
+            return await channel.send(**kwargs)
+        except discord.HTTPException as e:
+            # Les 429 sont comptés dans DISCORD_RATE_LIMITS par RateLimitLogHandler
+            # (discord.py logge chaque réponse 429, relancée ou non)
+            DISCORD_SEND_ERRORS.labels(channel_name, str(e.status)).inc()
+            if sp:
+                sp.set(status=e.status)
+            raise
+        except Exception as e:
+            DISCORD_SEND_ERRORS.labels(channel_name, type(e).__name__).inc()
+            raise
+        finally:
+            DISCORD_SEND_LATENCY.labels(channel_name).observe(systime.perf_counter() - start)
+
+class RateLimitLogHandler(logging.Handler):
+    """Seul compteur des 429 Discord: discord.py logge chaque réponse 429 (retry interne ou non)"""
+
+    CHANNEL_RE = re.compile(r"/channels/(\d+)")
+
+    def emit(self, record):
+        message = record.getMessage()
+        if "429" not in message:
+            return
+        match = self.CHANNEL_RE.search(message)
+        DISCORD_RATE_LIMITS.labels(channel_label(int(match.group(1))) if match else "other").inc()
+        # Loggé depuis la tâche qui envoie: le span courant est celui du discord.send
+        sp = current_span.get()
+        if sp and "retries" in sp.attributes:
+            sp.incr("retries")
+
+rate_limit_log_handler = RateLimitLogHandler(logging.WARNING)  # Branché par init_runtime
+
+current_loop_iteration = contextvars.ContextVar("current_loop_iteration", default=None)
+
+def record_loop_failure():
+    """À appeler là où un corps de boucle rattrape son exception.
+
+    Les corps ne relancent pas (une exception arrêterait la tâche): l'itération
+    courante est marquée en échec et comptée une fois par track_loop.
+    """
+    iteration = current_loop_iteration.get()
+    if iteration is not None:
+        iteration["failed"] = True
+
+def track_loop(func):
+    """À placer sous @tasks.loop: durée, échecs et dernier succès de chaque itération"""
+    name = func.__name__
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        start = systime.perf_counter()
+        iteration = {"failed": False}
+        token = current_loop_iteration.set(iteration)
+        try:
+            result = await func(*args, **kwargs)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            iteration["failed"] = True
+            raise
+        finally:
+            current_loop_iteration.reset(token)
+            TASK_DURATION.labels(name).observe(systime.perf_counter() - start)
+            if iteration["failed"]:
+                TASK_FAILURES.labels(name).inc()
+        if not iteration["failed"]:
+            TASK_LAST_SUCCESS.labels(name).set_to_current_time()
+        return result
+    return wrapper
+
+# --- Détecteur de blocage de la boucle asyncio ---
+# Une coroutine "battement" dort LOOP_LAG_INTERVAL et mesure son retard de
+# réveil (= temps pendant lequel la boucle n'a rien pu planifier). Un thread
+# de surveillance voit le battement manquer pendant le blocage et capture à
+# ce moment la pile du thread de la boucle: c'est le code fautif.
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.1"))
+LOOP_STALL_THRESHOLD = float(os.getenv("LOOP_STALL_THRESHOLD_MS", "500")) / 1000
+LOOP_STALL_HISTORY = 20
+
+LOOP_LAG = Histogram("horizon_event_loop_lag_seconds", "Retard de planification de la boucle Discord",
+                     buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+LOOP_STALLS = Counter("horizon_event_loop_stalls_total", "Blocages de la boucle au-delà du seuil")
+LOOP_STALL_SECONDS = Histogram("horizon_event_loop_stall_seconds", "Durée des blocages de la boucle",
+                               buckets=(0.5, 1, 2, 5, 10, 20, 30, 60))
+
+class LoopStallMonitor:
+    def __init__(self, interval=LOOP_LAG_INTERVAL, threshold=LOOP_STALL_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self.loop_thread_id = None
+        self.last_beat = None
+        self.beats = 0
+        self.last_lag = 0.0
+        self.captured = None  # (battement, pile) capturé pendant le blocage en cours
+        self.stalls = deque(maxlen=LOOP_STALL_HISTORY)
+        self.stall_count = 0
+        self.task = None
+
+    def start(self):
+        """À appeler depuis la boucle surveillée"""
+        if self.task and not self.task.done():
+            return
+        self.loop_thread_id = threading.get_ident()
+        self.last_beat = systime.perf_counter()
+        self.task = asyncio.get_running_loop().create_task(self._heartbeat())
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+        print(f"[LOOP] Surveillance boucle: seuil {self.threshold * 1000:.0f} ms")
+
+    async def _heartbeat(self):
+        while True:
+            before = systime.perf_counter()
+            await asyncio.sleep(self.interval)
+            now = systime.perf_counter()
+            lag = max(now - before - self.interval, 0.0)
+            self.last_lag = lag
+            LOOP_LAG.observe(lag)
+            if lag >= self.threshold:
+                self._record(lag)
+            self.beats += 1
+            self.last_beat = now
+
+    def _watch(self):
+        while True:
+            systime.sleep(self.interval)
+            beat = self.beats
+            blocked = systime.perf_counter() - self.last_beat - self.interval
+            if blocked < self.threshold or (self.captured and self.captured[0] == beat):
+                continue
+            frame = sys._current_frames().get(self.loop_thread_id)
+            if frame is not None:
+                self.captured = (beat, self.callback_stack(frame))
+
+    @staticmethod
+    def callback_stack(frame):
+        """Pile du callback en cours, sans les frames internes de la boucle asyncio"""
+        stack = traceback.format_stack(frame)
+        for i in range(len(stack) - 1, -1, -1):
+            if f"asyncio{os.sep}events.py" in stack[i]:
+                stack = stack[i + 1:]
+                break
+        return stack[-12:]
+
+    def _record(self, lag):
+        stack = self.captured[1] if self.captured and self.captured[0] == self.beats else []
+        self.stall_count += 1
+        LOOP_STALLS.inc()
+        LOOP_STALL_SECONDS.observe(lag)
+        # Frame la plus profonde de bot.py (la pile descend souvent dans requests/ssl)
+        ours = [f for f in stack if __file__ in f] or stack
+        where = ours[-1].strip().splitlines()[0] if ours else "?"
+        self.stalls.append({"at": systime.time(), "duration_s": round(lag, 3), "where": where, "stack": stack})
+        print(f"[LOOP] ⚠️ Boucle bloquée {lag:.2f}s — {where}")
+        if stack:
+            print("".join(stack).rstrip())
+
+    def report(self):
+        last = self.stalls[-1] if self.stalls else None
+        return {
+            "lag_ms": round(self.last_lag * 1000, 1),
+            "stalls": self.stall_count,
+            "last_stall": {k: v for k, v in last.items() if k != "stack"} if last else None,
+        }
+
+loop_monitor = LoopStallMonitor()
 
 # ============================================================
 #                    FONCTIONS API DATA
@@ -155,7 +1322,8 @@ if XAI_API_KEY:
 def get_btc_price():
     """Récupère BTC/ETH avec variations"""
     try:
-        r = requests.get(
+        r = http_get(
+            "coingecko_price",
             "https://api.coingecko.com/api/v3/simple/price?ids=bitcoin,ethereum&vs_currencies=usd&include_24hr_change=true",
             timeout=10
         )
@@ -173,7 +1341,7 @@ def get_btc_price():
 def get_global_data():
     """Récupère les données globales"""
     try:
-        r = requests.get("https://api.coingecko.com/api/v3/global", timeout=10)
+        r = http_get("coingecko_global", "https://api.coingecko.com/api/v3/global", timeout=10)
         data = r.json()['data']
         return {
             "total_market_cap": data['total_market_cap']['usd'],
@@ -188,7 +1356,7 @@ def get_global_data():
 def get_fear_greed():
     """Récupère le Fear & Greed"""
     try:
-        r = requests.get("https://api.alternative.me/fng/?limit=7", timeout=10)
+        r = http_get("fear_greed", "https://api.alternative.me/fng/?limit=7", timeout=10)
         data = r.json()['data']
         current = data[0]
         return {
@@ -203,7 +1371,7 @@ def get_fear_greed():
 def get_crypto_news_with_links():
     """Récupère les news"""
     try:
-        r = requests.get("https://min-api.cryptocompare.com/data/v2/news/?lang=EN&sortOrder=latest", timeout=10)
+        r = http_get("cryptocompare_news", "https://min-api.cryptocompare.com/data/v2/news/?lang=EN&sortOrder=latest", timeout=10)
         news_list = r.json().get("Data", [])[:15]
         return [{
             "id": str(n.get("id", "")),
@@ -218,7 +1386,8 @@ def get_crypto_news_with_links():
 def get_top_movers():
     """Récupère les top movers avec prix"""
     try:
-        r = requests.get(
+        r = http_get(
+            "coingecko_markets",
             "https://api.coingecko.com/api/v3/coins/markets?vs_currency=usd&order=market_cap_desc&per_page=50&sparkline=false&price_change_percentage=1h,24h,7d",
             timeout=15
         )
@@ -227,10 +1396,33 @@ def get_top_movers():
     except:
         return []
 
+def get_market_scan(size=None):
+    """Scan complet du marché: top N market cap, paginé par 250"""
+    size = size or MARKET_SCAN_SIZE
+    coins = []
+    for page in range(1, math.ceil(size / 250) + 1):
+        try:
+            r = http_get(
+                "coingecko_scan",
+                f"https://api.coingecko.com/api/v3/coins/markets?vs_currency=usd&order=market_cap_desc&per_page=250&page={page}&sparkline=false&price_change_percentage=1h,24h,7d",
+                timeout=20
+            )
+            data = r.json()
+        except Exception as e:
+            print(f"[SCAN] Erreur page {page}: {e}")
+            break
+        if not isinstance(data, list):
+            break
+        coins.extend(data)
+        if len(data) < 250:
+            break
+    print(f"[SCAN] {len(coins)} coins récupérés")
+    return coins[:size]
+
 def get_trending_coins():
     """Récupère les trending"""
     try:
-        r = requests.get("https://api.coingecko.com/api/v3/search/trending", timeout=10)
+        r = http_get("coingecko_trending", "https://api.coingecko.com/api/v3/search/trending", timeout=10)
         return r.json().get("coins", [])[:7]
     except:
         return []
@@ -238,7 +1430,7 @@ def get_trending_coins():
 def get_defi_yields():
     """Récupère les yields DeFi"""
     try:
-        r = requests.get("https://yields.llama.fi/pools", timeout=15)
+        r = http_get("defillama_yields", "https://yields.llama.fi/pools", timeout=15)
         data = r.json()["data"]
         good = [p for p in data if p.get("apy") and 5 < p["apy"] < 100 and p.get("tvlUsd", 0) > 10000000]
         return sorted(good, key=lambda x: x["tvlUsd"], reverse=True)[:5]
@@ -261,7 +1453,8 @@ def get_coinglass_data():
     
     try:
         # Liquidations globales (endpoint public)
-        r = requests.get(
+        r = http_get(
+            "coinglass_liquidations",
             "https://open-api.coinglass.com/public/v2/liquidation_history?time_type=h24&symbol=all",
             timeout=10
         )
@@ -276,7 +1469,8 @@ def get_coinglass_data():
     
     try:
         # Funding rates (endpoint public)
-        r = requests.get(
+        r = http_get(
+            "coinglass_funding",
             "https://open-api.coinglass.com/public/v2/funding",
             timeout=10
         )
@@ -292,7 +1486,8 @@ def get_coinglass_data():
     
     try:
         # Open Interest BTC
-        r = requests.get(
+        r = http_get(
+            "coinglass_open_interest",
             "https://open-api.coinglass.com/public/v2/open_interest?symbol=BTC",
             timeout=10
         )
@@ -318,7 +1513,8 @@ def get_lunarcrush_data():
         headers = {"Authorization": f"Bearer {LUNARCRUSH_API_KEY}"}
         
         # Top coins par activité sociale
-        r = requests.get(
+        r = http_get(
+            "lunarcrush_coins",
             "https://lunarcrush.com/api4/public/coins/list/v2",
             headers=headers,
             timeout=15
@@ -358,7 +1554,8 @@ def get_lunarcrush_top_influencers():
     
     try:
         headers = {"Authorization": f"Bearer {LUNARCRUSH_API_KEY}"}
-        r = requests.get(
+        r = http_get(
+            "lunarcrush_influencers",
             "https://lunarcrush.com/api4/public/influencers/list/v1?limit=10",
             headers=headers,
             timeout=15
@@ -382,6 +1579,21 @@ def get_lunarcrush_top_influencers():
 # ============================================================
 #                    FETCH ALL DATA
 # ============================================================
+market_snapshot = {"data": None, "fetched_at": 0}  # Dernier fetch complet
+
+def save_market_snapshot():
+    """Persiste le snapshot (sans le MarketScan, reconstruit à la demande)"""
+    data = {k: v for k, v in market_snapshot["data"].items() if k != "scan"}
+    state_store.set("meta", "market_snapshot", {"data": data, "fetched_at": market_snapshot["fetched_at"]})
+
+def load_market_snapshot():
+    saved = state_store.get("meta", "market_snapshot")
+    if not saved:
+        return
+    market_snapshot.update(saved)
+    age_min = (systime.time() - saved["fetched_at"]) / 60
+    print(f"[DATA] Snapshot restauré ({age_min:.0f} min)")
+
 def fetch_all_market_data():
     """Récupère TOUTES les données"""
     print("[DATA] Récupération des données...")
@@ -390,7 +1602,7 @@ def fetch_all_market_data():
     global_data = get_global_data()
     fg = get_fear_greed()
     news = get_crypto_news_with_links()
-    movers = get_top_movers()
+    movers = get_market_scan() if MARKET_SCAN_ENABLED else get_top_movers()
     trending = get_trending_coins()
     defi = get_defi_yields()
     coinglass = get_coinglass_data()  # 🆕
@@ -401,30 +1613,42 @@ def fetch_all_market_data():
         return None
     
     print("[DATA] ✅ Données complètes récupérées")
-    return {
+    data = {
         "prices": prices,
         "global": global_data,
         "fear_greed": fg,
         "news": news,
         "movers": movers,
+        "scan": MarketScan(movers),
         "trending": trending,
         "defi": defi,
         "coinglass": coinglass,  # 🆕
         "lunarcrush": lunarcrush,  # 🆕
         "timestamp": datetime.now(TIMEZONE).strftime("%d/%m/%Y %H:%M")
     }
+    market_snapshot["data"] = data
+    market_snapshot["fetched_at"] = systime.time()
+    save_market_snapshot()
+    push_hub.publish("snapshot", {
+        "updated_at": datetime.fromtimestamp(market_snapshot["fetched_at"], TIMEZONE).isoformat(),
+        "prices": prices,
+        "global": global_data,
+        "fear_greed": fg,
+    })
+    return data
 
 # ============================================================
 #                    MOTEUR GROK-3
 # ============================================================
-def ask_grok(prompt, max_tokens=800):
-    if not client_xai:
+def ask_grok(prompt, max_tokens=800, call_site="ask_grok"):
+    if not get_xai_client():
         return "⚠️ Service IA non configuré."
     
     current_date = datetime.now(TIMEZONE).strftime("%d %B %Y à %H:%M")
     
     try:
-        response = client_xai.chat.completions.create(
+        response = llm_complete(
+            call_site,
             model="grok-3",
             messages=[
                 {"role": "system", "content": f"Tu es l'analyste Horizon Elite, le {current_date}. Style: Expert, FRANÇAIS, concis, emojis. UTILISE UNIQUEMENT les données fournies, N'INVENTE JAMAIS de prix. NFA-DYOR à la fin."},
@@ -438,11 +1662,12 @@ def ask_grok(prompt, max_tokens=800):
         print(f"[GROK] Erreur: {e}")
         return None
 
-def ask_grok_mini(prompt):
-    if not client_xai:
+def ask_grok_mini(prompt, call_site="ask_grok_mini"):
+    if not get_xai_client():
         return None
     try:
-        response = client_xai.chat.completions.create(
+        response = llm_complete(
+            call_site,
             model="grok-3",
             messages=[
                 {"role": "system", "content": "Analyste crypto. Français, 2-3 lignes max."},
@@ -472,7 +1697,7 @@ SOCIAL_POST_THEMES = [
 def generate_social_posts(theme="auto", data=None):
     """Génère des posts pour Twitter, Instagram et LinkedIn"""
     
-    if not client_xai:
+    if not get_xai_client():
         return None
     
     ebook_link = EBOOK_CONFIG["link"]
@@ -534,7 +1759,8 @@ IMPORTANT:
 """
 
     try:
-        response = client_xai.chat.completions.create(
+        response = llm_complete(
+            "social_posts",
             model="grok-3",
             messages=[
                 {"role": "system", "content": "Tu es un expert copywriter spécialisé crypto. Tu crées des posts engageants, authentiques et professionnels. Jamais de promesses irréalistes."},
@@ -551,7 +1777,7 @@ IMPORTANT:
 def generate_image_prompts(theme="auto", data=None):
     """Génère des prompts d'images pour Midjourney/DALL-E/Leonardo AI"""
     
-    if not client_xai:
+    if not get_xai_client():
         return None
     
     # Contexte marché
@@ -617,7 +1843,8 @@ STYLES SUGGÉRÉS SELON LE THÈME:
 """
 
     try:
-        response = client_xai.chat.completions.create(
+        response = llm_complete(
+            "image_prompts",
             model="grok-3",
             messages=[
                 {"role": "system", "content": "Tu es un expert en prompts pour génération d'images IA. Tu crées des prompts détaillés, professionnels et optimisés pour Midjourney/DALL-E/Leonardo AI."},
@@ -631,6 +1858,23 @@ STYLES SUGGÉRÉS SELON LE THÈME:
         print(f"[IMAGE] Erreur génération prompts: {e}")
         return None
 
+SOCIAL_POST_MARKERS = ("===TWITTER===", "===INSTAGRAM===", "===LINKEDIN===")
+IMAGE_PROMPT_MARKERS = ("===PROMPT_TWITTER===", "===PROMPT_INSTAGRAM===", "===PROMPT_LINKEDIN===")
+
+def parse_social_sections(text, markers):
+    """Découpe la réponse Grok en sections: texte après chaque marqueur, jusqu'au marqueur suivant"""
+    sections = []
+    for i, marker in enumerate(markers):
+        if marker not in text:
+            sections.append("")
+            continue
+        section = text.split(marker)[1]
+        next_marker = markers[i + 1] if i + 1 < len(markers) else None
+        if next_marker and next_marker in section:
+            section = section.split(next_marker)[0]
+        sections.append(section.strip())
+    return sections
+
 async def send_social_posts(ctx, theme="auto", include_images=True):
     """Envoie les posts générés dans le canal admin"""
     
@@ -644,26 +1888,7 @@ async def send_social_posts(ctx, theme="auto", include_images=True):
         return False
     
     # Parse les posts
-    twitter_post = ""
-    instagram_post = ""
-    linkedin_post = ""
-    
-    if "===TWITTER===" in posts:
-        parts = posts.split("===TWITTER===")
-        if len(parts) > 1:
-            twitter_section = parts[1].split("===INSTAGRAM===")[0] if "===INSTAGRAM===" in parts[1] else parts[1]
-            twitter_post = twitter_section.strip()
-    
-    if "===INSTAGRAM===" in posts:
-        parts = posts.split("===INSTAGRAM===")
-        if len(parts) > 1:
-            insta_section = parts[1].split("===LINKEDIN===")[0] if "===LINKEDIN===" in parts[1] else parts[1]
-            instagram_post = insta_section.strip()
-    
-    if "===LINKEDIN===" in posts:
-        parts = posts.split("===LINKEDIN===")
-        if len(parts) > 1:
-            linkedin_post = parts[1].strip()
+    twitter_post, instagram_post, linkedin_post = parse_social_sections(posts, SOCIAL_POST_MARKERS)
     
     # Génère les prompts d'images si demandé
     twitter_img_prompt = ""
@@ -674,20 +1899,7 @@ async def send_social_posts(ctx, theme="auto", include_images=True):
         image_prompts = generate_image_prompts(theme=theme, data=data)
         
         if image_prompts:
-            if "===PROMPT_TWITTER===" in image_prompts:
-                parts = image_prompts.split("===PROMPT_TWITTER===")
-                if len(parts) > 1:
-                    twitter_img_prompt = parts[1].split("===PROMPT_INSTAGRAM===")[0].strip() if "===PROMPT_INSTAGRAM===" in parts[1] else parts[1].strip()
-            
-            if "===PROMPT_INSTAGRAM===" in image_prompts:
-                parts = image_prompts.split("===PROMPT_INSTAGRAM===")
-                if len(parts) > 1:
-                    instagram_img_prompt = parts[1].split("===PROMPT_LINKEDIN===")[0].strip() if "===PROMPT_LINKEDIN===" in parts[1] else parts[1].strip()
-            
-            if "===PROMPT_LINKEDIN===" in image_prompts:
-                parts = image_prompts.split("===PROMPT_LINKEDIN===")
-                if len(parts) > 1:
-                    linkedin_img_prompt = parts[1].strip()
+            twitter_img_prompt, instagram_img_prompt, linkedin_img_prompt = parse_social_sections(image_prompts, IMAGE_PROMPT_MARKERS)
     
     # Header
     await ctx.send("📱 **POSTS RÉSEAUX SOCIAUX GÉNÉRÉS**\n*Copie-colle directement sur tes réseaux !*\n" + "─" * 40)
@@ -796,7 +2008,7 @@ async def send_to_channel(channel_name, embed):
     if not channel:
         return False
     try:
-        await channel.send(embed=embed)
+        await timed_send(channel, channel_name, embed=embed)
         print(f"[SEND] ✅ #{channel_name}")
         return True
     except Exception as e:
@@ -814,37 +2026,114 @@ def format_number(num):
     else:
         return f"${num:,.0f}"
 
-def get_movers_details(movers, limit=8):
-    """Prépare les détails des movers avec vrais prix"""
-    sorted_movers = sorted(movers, key=lambda x: abs(x.get("price_change_percentage_24h", 0) or 0), reverse=True)[:limit]
-    details = []
-    for c in sorted_movers:
-        price = c.get('current_price', 0)
-        change = c.get('price_change_percentage_24h', 0) or 0
-        mcap = c.get('market_cap', 0)
-        details.append({
-            "symbol": c['symbol'].upper(),
-            "name": c.get('name', ''),
-            "price": price,
-            "change_24h": change,
-            "mcap": mcap,
-            "chart_link": get_tradingview_link(c['symbol'])
-        })
-    return details
+def zscore(values):
+    if not values.size:
+        return values.copy()
+    std = values.std()
+    if not std:
+        return np.zeros_like(values)
+    return (values - values.mean()) / std
 
-# ============================================================
-#                    MESSAGES SOLO (SIMPLES)
-# ============================================================
-async def send_solo_prix(data):
-    prices = data['prices']
-    btc_emoji = "🟢" if prices['btc_change'] > 0 else "🔴"
-    eth_emoji = "🟢" if prices['eth_change'] > 0 else "🔴"
-    
-    embed = discord.Embed(title="📈 PRIX CRYPTO", color=0xf7931a, timestamp=datetime.now(TIMEZONE))
-    embed.add_field(name=f"{btc_emoji} BITCOIN", value=f"**${prices['btc_price']:,.2f}**\n24h: {prices['btc_change']:+.2f}%", inline=True)
-    embed.add_field(name=f"{eth_emoji} ETHEREUM", value=f"**${prices['eth_price']:,.2f}**\n24h: {prices['eth_change']:+.2f}%", inline=True)
-    embed.add_field(name="📊 Charts", value=f"[BTC]({get_tradingview_link('BTC')}) | [ETH]({get_tradingview_link('ETH')})", inline=False)
-    embed.set_footer(text="SOLO • CoinGecko")
+class MarketScan:
+    """Colonnes NumPy du marché (prix, variations, volume, market cap).
+
+    Z-scores, ratio volume/market cap et classements sont calculés en une passe
+    vectorisée; les top-k utilisent argpartition (O(n)) puis trient les k retenus.
+    """
+
+    def __init__(self, coins):
+        self.coins = coins or []
+        n = len(self.coins)
+
+        def column(key):
+            return np.fromiter(((c.get(key) or 0) for c in self.coins), dtype=np.float64, count=n)
+
+        self.price = column("current_price")
+        self.change_1h = column("price_change_percentage_1h_in_currency")
+        self.change_24h = column("price_change_percentage_24h")
+        self.change_7d = column("price_change_percentage_7d_in_currency")
+        self.volume = column("total_volume")
+        self.mcap = column("market_cap")
+
+        self.z_change_24h = zscore(self.change_24h)
+        self.z_change_1h = zscore(self.change_1h)
+        self.volume_ratio = np.divide(self.volume, self.mcap, out=np.zeros(n), where=self.mcap > 0)
+        self.z_volume_ratio = zscore(np.log1p(self.volume_ratio))
+
+    def __len__(self):
+        return len(self.coins)
+
+    def top_k(self, scores, k):
+        """Indices des k plus grands scores, triés décroissants"""
+        if k <= 0 or not len(scores):
+            return np.array([], dtype=np.int64)
+        k = min(k, len(scores))
+        idx = np.argpartition(-scores, k - 1)[:k]
+        return idx[np.argsort(-scores[idx], kind="stable")]
+
+    def top_movers(self, k):
+        return self.top_k(np.abs(self.change_24h), k)
+
+    def volume_anomalies(self, k, z_min=2.0):
+        """Coins dont le volume est anormalement élevé vs leur market cap"""
+        idx = self.top_k(self.z_volume_ratio, k)
+        return idx[self.z_volume_ratio[idx] >= z_min]
+
+    def details(self, indices):
+        details = []
+        for i in indices:
+            c = self.coins[i]
+            details.append({
+                "symbol": c['symbol'].upper(),
+                "name": c.get('name', ''),
+                "price": float(self.price[i]),
+                "change_1h": float(self.change_1h[i]),
+                "change_24h": float(self.change_24h[i]),
+                "change_7d": float(self.change_7d[i]),
+                "mcap": float(self.mcap[i]),
+                "volume_ratio": float(self.volume_ratio[i]),
+                "z_change_24h": float(self.z_change_24h[i]),
+                "z_volume_ratio": float(self.z_volume_ratio[i]),
+                "chart_link": get_tradingview_link(c['symbol'])
+            })
+        return details
+
+def market_scan_of(data):
+    """MarketScan du snapshot (construit une seule fois par fetch)"""
+    scan = data.get('scan')
+    if scan is None:
+        scan = data['scan'] = MarketScan(data.get('movers', []))
+    return scan
+
+def get_movers_details(movers, limit=8):
+    """Prépare les détails des movers avec vrais prix (liste CoinGecko ou MarketScan)"""
+    scan = movers if isinstance(movers, MarketScan) else MarketScan(movers)
+    return scan.details(scan.top_movers(limit))
+
+def format_volume_anomalies(data, limit=5):
+    """Anomalies volume/market cap pour les prompts VIP"""
+    scan = market_scan_of(data)
+    anomalies = scan.details(scan.volume_anomalies(limit))
+    if not anomalies:
+        return ""
+    return f"\n\nANOMALIES VOLUME ({len(scan)} coins scannés):\n" + "\n".join([
+        f"• {a['symbol']}: Vol/MCap {a['volume_ratio']:.2f} (z={a['z_volume_ratio']:+.1f}) | 24h: {a['change_24h']:+.1f}%"
+        for a in anomalies
+    ])
+
+# ============================================================
+#                    MESSAGES SOLO (SIMPLES)
+# ============================================================
+async def send_solo_prix(data):
+    prices = data['prices']
+    btc_emoji = "🟢" if prices['btc_change'] > 0 else "🔴"
+    eth_emoji = "🟢" if prices['eth_change'] > 0 else "🔴"
+    
+    embed = discord.Embed(title="📈 PRIX CRYPTO", color=0xf7931a, timestamp=datetime.now(TIMEZONE))
+    embed.add_field(name=f"{btc_emoji} BITCOIN", value=f"**${prices['btc_price']:,.2f}**\n24h: {prices['btc_change']:+.2f}%", inline=True)
+    embed.add_field(name=f"{eth_emoji} ETHEREUM", value=f"**${prices['eth_price']:,.2f}**\n24h: {prices['eth_change']:+.2f}%", inline=True)
+    embed.add_field(name="📊 Charts", value=f"[BTC]({get_tradingview_link('BTC')}) | [ETH]({get_tradingview_link('ETH')})", inline=False)
+    embed.set_footer(text="SOLO • CoinGecko")
     await send_to_channel("solo_prix", embed)
 
 async def send_solo_fear_greed(data):
@@ -866,7 +2155,8 @@ async def send_solo_fear_greed(data):
     await send_to_channel("solo_fg", embed)
 
 async def send_solo_alertes(data):
-    movers = get_movers_details(data.get('movers', []), 5)
+    scan = market_scan_of(data)
+    movers = get_movers_details(scan, 5)
     if not movers:
         return
     
@@ -878,6 +2168,14 @@ async def send_solo_alertes(data):
             value=f"${coin['price']:,.4f}\n{coin['change_24h']:+.2f}%\n[Chart]({coin['chart_link']})", 
             inline=True
         )
+    
+    anomalies = scan.details(scan.volume_anomalies(3))
+    if anomalies:
+        embed.add_field(
+            name="🔎 Volume anormal",
+            value=" | ".join([f"**{a['symbol']}** Vol/MCap {a['volume_ratio']:.2f}" for a in anomalies]),
+            inline=False
+        )
     embed.set_footer(text="SOLO • CoinGecko")
     await send_to_channel("solo_alertes", embed)
 
@@ -901,7 +2199,7 @@ Historique 7j: {fg['history']}{liq_text}
 
 Analyse en 4 lignes: signification, tendance, comportement smart money, point d'attention."""
     
-    analysis = ask_grok(prompt, 500)
+    analysis = ask_grok(prompt, 500, call_site="send_vip_fear_greed")
     
     if fg['value'] < 25: emoji, color = "🔴", 0xff0000
     elif fg['value'] < 45: emoji, color = "🟠", 0xff8c00
@@ -929,7 +2227,7 @@ async def send_vip_setup(data):
     prices = data['prices']
     global_data = data['global']
     coinglass = data.get('coinglass', {})
-    movers = get_movers_details(data.get('movers', []), 5)
+    movers = get_movers_details(market_scan_of(data), 5)
     
     # Préparer les vrais prix
     movers_text = "\n".join([f"• {m['symbol']}: ${m['price']:,.4f} ({m['change_24h']:+.1f}%)" for m in movers[:5]])
@@ -943,18 +2241,22 @@ async def send_vip_setup(data):
         if eth_funding:
             funding_text += f" | ETH: {float(eth_funding)*100:.4f}%"
     
+    rolling_text = "\n".join(filter(None, [format_rolling_stats("BTC"), format_rolling_stats("ETH")]))
+    if rolling_text:
+        rolling_text = f"\n\nHISTORIQUE:\n{rolling_text}"
+    
     prompt = f"""DONNÉES RÉELLES:
 BTC: ${prices['btc_price']:,.2f} ({prices['btc_change']:+.2f}%)
 ETH: ${prices['eth_price']:,.2f} ({prices['eth_change']:+.2f}%)
 BTC.D: {global_data['btc_dominance']:.1f}%
-Market Cap 24h: {global_data['market_cap_change_24h']:+.2f}%{funding_text}
+Market Cap 24h: {global_data['market_cap_change_24h']:+.2f}%{funding_text}{rolling_text}
 
 TOP MOVERS:
 {movers_text}
 
 Setup technique concis: contexte, BTC S/R, ETH S/R, biais."""
     
-    analysis = ask_grok(prompt, 600)
+    analysis = ask_grok(prompt, 600, call_site="send_vip_setup")
     
     embed = discord.Embed(title="🎯 SETUP DU JOUR", color=0xf7931a, timestamp=datetime.now(TIMEZONE))
     
@@ -986,7 +2288,7 @@ async def send_vip_marche(data):
     global_data = data['global']
     prices = data['prices']
     coinglass = data.get('coinglass', {})
-    movers = get_movers_details(data.get('movers', []), 6)
+    movers = get_movers_details(market_scan_of(data), 6)
     
     movers_text = "\n".join([f"• {m['symbol']}: ${m['price']:,.4f} ({m['change_24h']:+.1f}%, MCap: {format_number(m['mcap'])})" for m in movers])
     
@@ -1003,7 +2305,7 @@ TOP MOVERS:
 
 Analyse: état du marché, flux capitaux, opportunités, risques."""
     
-    analysis = ask_grok(prompt, 600)
+    analysis = ask_grok(prompt, 600, call_site="send_vip_marche")
     
     market_emoji = "🟢" if global_data['market_cap_change_24h'] > 0 else "🔴"
     
@@ -1023,7 +2325,7 @@ Analyse: état du marché, flux capitaux, opportunités, risques."""
     await send_to_channel("marche", embed)
 
 async def send_vip_watchlist(data):
-    movers = get_movers_details(data.get('movers', []), 8)
+    movers = get_movers_details(market_scan_of(data), 8)
     trending = data.get('trending', [])
     lunarcrush = data.get('lunarcrush', [])
     
@@ -1040,18 +2342,20 @@ async def send_vip_watchlist(data):
             for s in top_social
         ])
     
+    anomalies_text = format_volume_anomalies(data)
+    
     prompt = f"""DONNÉES RÉELLES (NE PAS INVENTER DE PRIX):
 TOP MOVERS:
 {movers_text}
 
-TRENDING: {trending_text}{social_text}
+TRENDING: {trending_text}{social_text}{anomalies_text}
 
 Sélectionne 3 altcoins à SURVEILLER parmi cette liste avec:
 - Prix RÉEL (copie depuis les données)
 - Pourquoi surveiller
 - Niveau de risque"""
     
-    analysis = ask_grok(prompt, 700)
+    analysis = ask_grok(prompt, 700, call_site="send_vip_watchlist")
     
     embed = discord.Embed(title="👁️ WATCHLIST", color=0x9b59b6, timestamp=datetime.now(TIMEZONE))
     
@@ -1101,7 +2405,7 @@ Headlines: {news_titles}{social_text}{liq_text}
 
 Analyse: score sentiment /100, ton des news, signaux contrarian, conclusion."""
     
-    analysis = ask_grok(prompt, 500)
+    analysis = ask_grok(prompt, 500, call_site="send_vip_sentiment")
     
     embed = discord.Embed(title="🎭 ANALYSE SENTIMENT", color=0xe74c3c, timestamp=datetime.now(TIMEZONE))
     embed.add_field(name="Fear & Greed", value=f"**{fg['value']}/100**", inline=True)
@@ -1119,11 +2423,153 @@ Analyse: score sentiment /100, ton des news, signaux contrarian, conclusion."""
     embed.set_footer(text="🔒 VIP • NFA-DYOR")
     await send_to_channel("sentiment", embed)
 
+# ============================================================
+#     🧩 CLUSTERING NEWS (même info, plusieurs médias)
+# ============================================================
+NEWS_CLUSTER_WINDOW_HOURS = int(os.getenv("NEWS_CLUSTER_WINDOW_HOURS", "12"))
+NEWS_CLUSTER_THRESHOLD = float(os.getenv("NEWS_CLUSTER_THRESHOLD", "0.4"))  # Jaccard estimé
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 32  # 32 bandes x 2 lignes: rappel élevé, vérification par Jaccard ensuite
+MINHASH_PRIME = (1 << 31) - 1
+
+NEWS_STOPWORDS = {
+    "the", "a", "an", "and", "or", "of", "to", "in", "on", "for", "with", "as", "at", "by",
+    "is", "are", "was", "were", "be", "been", "it", "its", "this", "that", "from", "after",
+    "has", "have", "had", "will", "would", "could", "says", "said", "new", "over", "into",
+}
+
+@functools.lru_cache(maxsize=None)
+def minhash_coefficients():
+    """(a, b) des permutations, tirés une fois (graine fixe: signatures stables entre redémarrages)"""
+    rng = np.random.default_rng(2026)
+    return (rng.integers(1, MINHASH_PRIME, MINHASH_PERMUTATIONS, dtype=np.uint64),
+            rng.integers(0, MINHASH_PRIME, MINHASH_PERMUTATIONS, dtype=np.uint64))
+
+def news_tokens(article):
+    text = f"{article.get('title', '')} {article.get('body', '')}".lower()
+    return {w for w in re.findall(r"[a-z0-9$]{3,}", text) if w not in NEWS_STOPWORDS}
+
+def minhash_signature(tokens):
+    """Signature MinHash (64 permutations) calculée en une opération NumPy"""
+    if not tokens:
+        return None
+    hashes = np.fromiter((zlib.crc32(t.encode()) for t in tokens), dtype=np.uint64, count=len(tokens))
+    minhash_a, minhash_b = minhash_coefficients()
+    return ((minhash_a[:, None] * hashes[None, :] + minhash_b[:, None]) % MINHASH_PRIME).min(axis=1)
+
+def article_key(article):
+    """Id de l'article, sinon son URL, sinon un hash du titre (jamais "" partagé)"""
+    if article.get("id"):
+        return str(article["id"])
+    if article.get("url"):
+        return article["url"]
+    return "title:" + hashlib.sha1(article.get("title", "").encode("utf-8")).hexdigest()[:16]
+
+class NewsClusterer:
+    """Regroupe les quasi-doublons sur une fenêtre glissante (MinHash + LSH).
+
+    Chaque cluster garde son premier article comme représentant: les articles
+    suivants reprennent l'id du représentant, donc sent_news_ids / sent_alert_ids
+    les ignorent naturellement une fois le représentant publié.
+    """
+
+    def __init__(self, window_seconds=NEWS_CLUSTER_WINDOW_HOURS * 3600, threshold=NEWS_CLUSTER_THRESHOLD):
+        self.window_seconds = window_seconds
+        self.threshold = threshold
+        self.clusters = OrderedDict()  # rep_id -> {"signature", "article", "members", "ts"}
+        self.buckets = {}              # (bande, hash) -> {rep_id}
+        self.article_cluster = {}      # article_id -> rep_id
+
+    def __len__(self):
+        return len(self.clusters)
+
+    def _bands(self, signature):
+        rows = MINHASH_PERMUTATIONS // LSH_BANDS
+        return [(b, signature[b * rows:(b + 1) * rows].tobytes()) for b in range(LSH_BANDS)]
+
+    def _expire(self, now):
+        cutoff = now - self.window_seconds
+        while self.clusters:
+            rep_id, cluster = next(iter(self.clusters.items()))
+            if cluster["ts"] >= cutoff:
+                break
+            self.clusters.popitem(last=False)
+            if cluster["signature"] is not None:
+                for band in self._bands(cluster["signature"]):
+                    self.buckets.get(band, set()).discard(rep_id)
+            for member in cluster["members"]:
+                self.article_cluster.pop(article_key(member), None)
+
+    def assign(self, article, now=None):
+        """Renvoie l'id du représentant du cluster de l'article"""
+        now = now if now is not None else systime.time()
+        # Expiration d'abord: un id en cache pointe toujours vers un cluster vivant
+        self._expire(now)
+        article_id = article_key(article)
+        if article_id in self.article_cluster:
+            return self.article_cluster[article_id]
+
+        signature = minhash_signature(news_tokens(article))
+        best_id, best_score = None, 0.0
+        if signature is not None:
+            candidates = set()
+            for band in self._bands(signature):
+                candidates |= self.buckets.get(band, set())
+            for rep_id in candidates:
+                score = float(np.mean(self.clusters[rep_id]["signature"] == signature))
+                if score > best_score:
+                    best_id, best_score = rep_id, score
+
+        if best_id is not None and best_score >= self.threshold:
+            cluster = self.clusters[best_id]
+            cluster["members"].append(article)
+            cluster["ts"] = now
+            self.clusters.move_to_end(best_id)
+            self.article_cluster[article_id] = best_id
+            return best_id
+
+        self.clusters[article_id] = {"signature": signature, "article": article, "members": [article], "ts": now}
+        if signature is not None:
+            for band in self._bands(signature):
+                self.buckets.setdefault(band, set()).add(article_id)
+        self.article_cluster[article_id] = article_id
+        return article_id
+
+    def group(self, news):
+        """Un représentant par cluster (ordre d'arrivée), autres sources dans `related`"""
+        now = systime.time()
+        rep_ids = []
+        for article in news:
+            rep_id = self.assign(article, now)
+            if rep_id not in rep_ids:
+                rep_ids.append(rep_id)
+        grouped = []
+        for rep_id in rep_ids:
+            cluster = self.clusters.get(rep_id)
+            if cluster is None:
+                continue
+            rep = dict(cluster["article"])
+            rep["id"] = rep_id  # Clé de repli si le flux n'a pas d'id (dédup sent_news_ids)
+            rep["related"] = [
+                {"title": m.get("title", ""), "url": m.get("url", ""), "source": m.get("source", "")}
+                for m in cluster["members"][1:]
+            ]
+            grouped.append(rep)
+        return grouped
+
+news_clusterer = NewsClusterer()
+
+def format_related_sources(article, limit=4):
+    related = [r for r in article.get("related", []) if r.get("url")]
+    if not related:
+        return ""
+    return " | ".join([f"[{r['source'] or 'Source'}]({r['url']})" for r in related[:limit]])
+
 # ============================================================
 #     📰 ACTUS CRYPTO
 # ============================================================
 async def send_actus_crypto(data, max_news=3, force=False):
-    global sent_news_ids, last_news_sent_time
+    global last_news_sent_time
     
     news = data.get('news', [])
     if not news:
@@ -1143,7 +2589,7 @@ async def send_actus_crypto(data, max_news=3, force=False):
             return 0
     
     news_sent = 0
-    for article in news:
+    for article in news_clusterer.group(news):
         if news_sent >= max_news:
             break
         
@@ -1155,7 +2601,7 @@ async def send_actus_crypto(data, max_news=3, force=False):
         url = article.get("url", "")
         source = article.get("source", "")
         
-        summary = ask_grok_mini(f"News: {title}. Résumé français 2 lignes: fait, impact (🟢/🔴/🟡).")
+        summary = ask_grok_mini(f"News: {title}. Résumé français 2 lignes: fait, impact (🟢/🔴/🟡).", call_site="send_actus_crypto")
         
         title_lower = title.lower()
         if any(w in title_lower for w in ["hack", "crash", "ban", "fraud"]):
@@ -1172,13 +2618,17 @@ async def send_actus_crypto(data, max_news=3, force=False):
             embed.add_field(name="🧠 Résumé", value=summary[:500], inline=False)
         if url:
             embed.add_field(name="🔗 Article", value=f"[Lire →]({url})", inline=False)
+        related = format_related_sources(article)
+        if related:
+            embed.add_field(name="📚 Aussi couvert par", value=related, inline=False)
         embed.set_footer(text=f"📡 {source}")
         
         try:
-            await channel.send(embed=embed)
+            await timed_send(channel, "actus_crypto", embed=embed)
             sent_news_ids.add(news_id)
             news_sent += 1
             last_news_sent_time = datetime.now(TIMEZONE)
+            state_store.set("meta", "last_news_sent_time", last_news_sent_time.isoformat())
             print(f"[ACTUS] ✅ {title[:40]}...")
             if not force:
                 break
@@ -1186,9 +2636,6 @@ async def send_actus_crypto(data, max_news=3, force=False):
         except Exception as e:
             print(f"[ACTUS] Erreur: {e}")
     
-    if len(sent_news_ids) > 150:
-        sent_news_ids = set(list(sent_news_ids)[-100:])
-    
     return news_sent
 
 # ============================================================
@@ -1198,7 +2645,7 @@ async def send_vip_opportunities(data):
     prices = data['prices']
     global_data = data['global']
     fg = data['fear_greed']
-    movers = get_movers_details(data.get('movers', []), 10)
+    movers = get_movers_details(market_scan_of(data), 10)
     lunarcrush = data.get('lunarcrush', [])
     coinglass = data.get('coinglass', {})
     defi = data.get('defi', [])
@@ -1219,14 +2666,19 @@ async def send_vip_opportunities(data):
     if defi:
         defi_text = "\n\nDEFI YIELDS:\n" + "\n".join([f"• {d['project']}: {d['apy']:.1f}% APY (TVL: ${d['tvlUsd']/1e6:.0f}M)" for d in defi[:3]])
     
+    rolling_text = format_rolling_stats("BTC")
+    if rolling_text:
+        rolling_text = f"\n{rolling_text}"
+    anomalies_text = format_volume_anomalies(data)
+    
     prompt = f"""📊 DONNÉES MARCHÉ RÉELLES - {datetime.now(TIMEZONE).strftime('%d/%m/%Y %H:%M')}:
 
 BTC: ${prices['btc_price']:,.2f} ({prices['btc_change']:+.2f}%)
 ETH: ${prices['eth_price']:,.2f} ({prices['eth_change']:+.2f}%)
-F&G: {fg['value']}/100 | BTC.D: {global_data['btc_dominance']:.1f}%
+F&G: {fg['value']}/100 | BTC.D: {global_data['btc_dominance']:.1f}%{rolling_text}
 
 TOP MOVERS (PRIX RÉELS):
-{movers_text}{social_text}{liq_text}{defi_text}
+{movers_text}{social_text}{liq_text}{defi_text}{anomalies_text}
 
 ⚠️ UTILISE UNIQUEMENT LES PRIX CI-DESSUS, N'INVENTE RIEN.
 
@@ -1235,7 +2687,7 @@ Analyse concise:
 - 1-2 cryptos à surveiller avec PRIX RÉEL
 - Score /10"""
     
-    analysis = ask_grok(prompt, 700)
+    analysis = ask_grok(prompt, 700, call_site="send_vip_opportunities")
     
     if fg['value'] < 30:
         color, status = 0xff6600, "⚠️ PRUDENCE"
@@ -1295,9 +2747,14 @@ Analyse concise:
 # ============================================================
 #     🚨 ALERTES FLASH NEWS
 # ============================================================
+URGENT_KEYWORDS_LOWER = tuple(kw.lower() for kw in URGENT_KEYWORDS)
+
+def is_urgent_article(article):
+    """Mot-clé urgent dans le titre de l'article ou d'une source du même cluster"""
+    cluster_titles = " ".join([article.get("title", "")] + [r["title"] for r in article.get("related", [])]).lower()
+    return any(kw in cluster_titles for kw in URGENT_KEYWORDS_LOWER)
+
 async def check_and_send_urgent_news(news_list):
-    global sent_alert_ids
-    
     channel_id = CHANNELS.get("flash_news", 0)
     if channel_id == 0:
         return
@@ -1305,20 +2762,19 @@ async def check_and_send_urgent_news(news_list):
     if not channel:
         return
     
-    for article in news_list[:10]:
+    for article in news_clusterer.group(news_list[:10]):
         news_id = article.get("id", "")
         if news_id in sent_alert_ids:
             continue
         
         title = article.get("title", "")
-        is_urgent = any(kw.lower() in title.lower() for kw in URGENT_KEYWORDS)
-        if not is_urgent:
+        if not is_urgent_article(article):
             continue
         
         url = article.get("url", "")
         source = article.get("source", "")
         
-        analysis = ask_grok_mini(f"🚨 URGENT: {title}. Impact marché en 2 lignes.")
+        analysis = ask_grok_mini(f"🚨 URGENT: {title}. Impact marché en 2 lignes.", call_site="check_and_send_urgent_news")
         
         title_lower = title.lower()
         if any(w in title_lower for w in ["hack", "exploit", "crash", "liquidat"]):
@@ -1335,23 +2791,45 @@ async def check_and_send_urgent_news(news_list):
             embed.add_field(name="🧠 Impact", value=analysis, inline=False)
         if url:
             embed.add_field(name="🔗 Source", value=f"[{source} →]({url})", inline=False)
+        related = format_related_sources(article)
+        if related:
+            embed.add_field(name="📚 Aussi couvert par", value=related, inline=False)
         embed.set_footer(text="⚡ ALERTE TEMPS RÉEL")
         
         try:
             if color == 0xff0000:
-                await channel.send(content="||@here|| 🚨", embed=embed)
+                await timed_send(channel, "flash_news", content="||@here|| 🚨", embed=embed)
             else:
-                await channel.send(embed=embed)
+                await timed_send(channel, "flash_news", embed=embed)
             sent_alert_ids.add(news_id)
+            push_hub.publish("alert", {
+                "kind": "news", "level": alert_type, "title": title, "url": url,
+                "source": source, "analysis": analysis,
+            })
             print(f"[FLASH] 🚨 {title[:50]}...")
         except Exception as e:
             print(f"[FLASH] Erreur: {e}")
-    
-    if len(sent_alert_ids) > 100:
-        sent_alert_ids = set(list(sent_alert_ids)[-50:])
 
 async def check_and_send_price_alerts(prices, global_data, fg):
-    global last_btc_price, last_eth_price, last_fear_greed, last_btc_dominance
+    prev_fear_greed = timeseries.latest("fear_greed")
+    prev_btc_dominance = timeseries.latest("btc_dominance")
+    
+    now = systime.time()
+    timeseries.record("btc_price", prices['btc_price'], now)
+    timeseries.record("eth_price", prices['eth_price'], now)
+    timeseries.record("fear_greed", fg['value'], now, bucket_seconds=0)
+    timeseries.record("btc_dominance", global_data['btc_dominance'], now, bucket_seconds=0)
+    timeseries.record("market_cap_change_24h", global_data['market_cap_change_24h'], now, bucket_seconds=0)
+    timeseries.save()
+    
+    # Sans flux WebSocket, les seuils 1h sont évalués sur l'historique des polls
+    if not (price_stream_task and not price_stream_task.done()):
+        for symbol in ("BTC", "ETH"):
+            change_1h = timeseries.change_pct(f"{symbol.lower()}_price", 3600)
+            if change_1h is not None:
+                await evaluate_price_thresholds(symbol, prices[f"{symbol.lower()}_price"], change_1h)
+            process_user_alerts(symbol, prices[f"{symbol.lower()}_price"])
+            push_hub.publish("tick", {"symbol": symbol, "price": prices[f"{symbol.lower()}_price"], "change_1h": change_1h, "source": "poll"}, key=symbol)
     
     channel_id = CHANNELS.get("flash_news", 0)
     if channel_id == 0:
@@ -1363,44 +2841,175 @@ async def check_and_send_price_alerts(prices, global_data, fg):
     alerts = []
     
     # Pas d'alerte au premier check
-    if last_fear_greed is not None:
-        fg_change = fg['value'] - last_fear_greed
+    if prev_fear_greed is not None:
+        prev_fear_greed = int(prev_fear_greed)
+        fg_change = fg['value'] - prev_fear_greed
         if abs(fg_change) >= ALERT_THRESHOLDS['fear_greed_change']:
             direction = "↗️ HAUSSE" if fg_change > 0 else "↘️ BAISSE"
             alerts.append({
+                "kind": "sentiment",
                 "type": f"🎭 SENTIMENT {direction}",
-                "message": f"F&G: **{last_fear_greed}** → **{fg['value']}** ({fg_change:+d})\n{fg['sentiment']}",
+                "message": f"F&G: **{prev_fear_greed}** → **{fg['value']}** ({fg_change:+d})\n{fg['sentiment']}",
                 "color": 0x00ff00 if fg_change > 0 else 0xff6600
             })
     
-    if last_btc_dominance is not None:
-        dom_change = global_data['btc_dominance'] - last_btc_dominance
+    if prev_btc_dominance is not None:
+        dom_change = global_data['btc_dominance'] - prev_btc_dominance
         if abs(dom_change) >= ALERT_THRESHOLDS['dominance_change']:
             direction = "↗️" if dom_change > 0 else "↘️"
             alerts.append({
+                "kind": "dominance",
                 "type": f"📊 BTC.D {direction}",
-                "message": f"**{last_btc_dominance:.1f}%** → **{global_data['btc_dominance']:.1f}%**\n{'Flux BTC' if dom_change > 0 else 'Alt Season?'}",
+                "message": f"**{prev_btc_dominance:.1f}%** → **{global_data['btc_dominance']:.1f}%**\n{'Flux BTC' if dom_change > 0 else 'Alt Season?'}",
                 "color": 0xf7931a
             })
     
-    last_btc_price = prices['btc_price']
-    last_eth_price = prices['eth_price']
-    last_fear_greed = fg['value']
-    last_btc_dominance = global_data['btc_dominance']
-    
     for alert in alerts:
         embed = discord.Embed(title=alert["type"], description=alert["message"], color=alert["color"], timestamp=datetime.now(TIMEZONE))
         embed.set_footer(text="⚡ ALERTE")
+        push_hub.publish("alert", {"kind": alert["kind"], "title": alert["type"], "message": alert["message"]})
         try:
-            await channel.send(embed=embed)
+            await timed_send(channel, "flash_news", embed=embed)
             print(f"[ALERT] {alert['type']}")
         except:
             pass
 
+# ============================================================
+#     ⚡ FLUX PRIX TEMPS RÉEL (WebSocket Binance)
+# ============================================================
+PRICE_STREAM_ENABLED = os.getenv("PRICE_STREAM_ENABLED", "1") == "1"
+# Surcharge possible vers un serveur local (scripts/mock-binance-ws.py) pour les tests
+PRICE_STREAM_URL = os.getenv("PRICE_STREAM_URL", "wss://stream.binance.com:9443/stream")
+PRICE_STREAM_SYMBOLS = ["BTC", "ETH"]
+PRICE_ALERT_COOLDOWN_MINUTES = int(os.getenv("PRICE_ALERT_COOLDOWN_MINUTES", "60"))
+
+stream_prices = {}  # {"BTC": {"price": 97000.0, "change_1h": -1.2, "ts": epoch}}
+price_alert_keys = DedupStore("price_alerts", max_items=200, ttl=PRICE_ALERT_COOLDOWN_MINUTES * 60)
+price_push_keys = DedupStore("price_push", max_items=200, ttl=PRICE_ALERT_COOLDOWN_MINUTES * 60)
+price_stream_task = None
+price_stream_ws = None
+
+def build_stream_url(symbols):
+    """URL du flux combiné Binance (ticker glissant 1h par symbole)"""
+    streams = "/".join(f"{s.lower()}usdt@ticker_1h" for s in symbols)
+    return f"{PRICE_STREAM_URL}?streams={streams}"
+
+def parse_ticker_message(raw):
+    """Extrait (symbole, prix, variation 1h %) d'un message ticker Binance"""
+    try:
+        msg = json.loads(raw)
+        ticker = msg.get("data", msg)
+        pair = ticker["s"]
+        if not pair.endswith("USDT"):
+            return None
+        return pair[:-4], float(ticker["c"]), float(ticker["P"])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+async def evaluate_price_thresholds(symbol, price, change_1h):
+    """Compare la variation 1h aux seuils ALERT_THRESHOLDS, 1 alerte par sens et par cooldown"""
+    threshold = ALERT_THRESHOLDS.get(f"{symbol.lower()}_change_1h")
+    if threshold is None or abs(change_1h) < threshold:
+        return
+    
+    direction = "up" if change_1h > 0 else "down"
+    alert_key = f"{symbol}:{direction}"
+    # Push web sur toutes les instances, Discord sur le leader seulement:
+    # deux cooldowns distincts, celui de Discord n'est posé qu'après un envoi réussi
+    if alert_key not in price_push_keys:
+        price_push_keys.add(alert_key)
+        push_hub.publish("alert", {
+            "kind": "price", "symbol": symbol, "price": price,
+            "change_1h": round(change_1h, 3), "threshold": threshold,
+        })
+    
+    if not is_leader or alert_key in price_alert_keys:
+        return
+    channel_id = CHANNELS.get("flash_news", 0)
+    channel = bot.get_channel(channel_id) if channel_id else None
+    if not channel:
+        return
+    
+    arrow = "🚀 PUMP" if change_1h > 0 else "💥 DUMP"
+    embed = discord.Embed(
+        title=f"{arrow} {symbol} {change_1h:+.2f}% en 1h",
+        description=f"**{symbol}: ${price:,.2f}**\nSeuil: ±{threshold}% / 1h",
+        color=0x00ff00 if change_1h > 0 else 0xff0000,
+        timestamp=datetime.now(TIMEZONE)
+    )
+    embed.add_field(name="📊 Chart", value=f"[TradingView]({get_tradingview_link(symbol)})", inline=False)
+    embed.set_footer(text="⚡ ALERTE TEMPS RÉEL • Binance")
+    try:
+        await timed_send(channel, "flash_news", embed=embed)
+        price_alert_keys.add(alert_key)
+        print(f"[STREAM] 🚨 {symbol} {change_1h:+.2f}% 1h")
+    except Exception as e:
+        print(f"[STREAM] Erreur envoi: {e}")
+
+async def run_price_stream():
+    """Consomme le flux ticker en continu, reconnexion automatique avec backoff"""
+    global price_stream_ws
+    await bot.wait_until_ready()
+    backoff = 1
+    
+    while not bot.is_closed():
+        # Symboles de base + ceux des alertes perso
+        url = build_stream_url(sorted(set(PRICE_STREAM_SYMBOLS) | user_alerts.symbols()))
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.ws_connect(url, heartbeat=30) as ws:
+                    price_stream_ws = ws
+                    print(f"[STREAM] ✅ Connecté: {url}")
+                    backoff = 1
+                    async for msg in ws:
+                        if msg.type != aiohttp.WSMsgType.TEXT:
+                            if msg.type in (aiohttp.WSMsgType.ERROR, aiohttp.WSMsgType.CLOSED):
+                                break
+                            continue
+                        tick = parse_ticker_message(msg.data)
+                        if not tick:
+                            continue
+                        symbol, price, change_1h = tick
+                        now = systime.time()
+                        stream_prices[symbol] = {"price": price, "change_1h": change_1h, "ts": now}
+                        timeseries.record(f"{symbol.lower()}_price", price, now)
+                        push_hub.publish("tick", {"symbol": symbol, "price": price, "change_1h": change_1h, "source": "stream"}, key=symbol)
+                        await evaluate_price_thresholds(symbol, price, change_1h)
+                        process_user_alerts(symbol, price, change_1h)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[STREAM] Erreur: {e}")
+        finally:
+            price_stream_ws = None
+        
+        print(f"[STREAM] 🔌 Déconnecté, reconnexion dans {backoff}s")
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, 60)
+
+async def subscribe_stream_symbol(symbol):
+    """Ajoute un symbole au flux en cours (sinon il sera inclus à la reconnexion)"""
+    ws = price_stream_ws
+    if ws is None or ws.closed:
+        return
+    try:
+        await ws.send_json({"method": "SUBSCRIBE", "params": [f"{symbol.lower()}usdt@ticker_1h"], "id": int(systime.time())})
+        print(f"[STREAM] ➕ {symbol}")
+    except Exception as e:
+        print(f"[STREAM] Erreur abonnement {symbol}: {e}")
+
+def start_price_stream():
+    global price_stream_task
+    if not PRICE_STREAM_ENABLED:
+        return
+    if price_stream_task is None or price_stream_task.done():
+        price_stream_task = asyncio.create_task(run_price_stream())
+
 # ============================================================
 #     🔄 TÂCHES TEMPS RÉEL
 # ============================================================
 @tasks.loop(minutes=45)
+@track_loop
 async def realtime_news_check():
     print(f"[REALTIME] 📰 News - {datetime.now(TIMEZONE).strftime('%H:%M')}")
     try:
@@ -1411,9 +3020,11 @@ async def realtime_news_check():
             if sent > 0:
                 print(f"[REALTIME] ✅ {sent} news")
     except Exception as e:
+        record_loop_failure()
         print(f"[REALTIME] Erreur: {e}")
 
 @tasks.loop(minutes=15)
+@track_loop
 async def realtime_price_check():
     print(f"[REALTIME] 💰 Prix - {datetime.now(TIMEZONE).strftime('%H:%M')}")
     try:
@@ -1423,20 +3034,58 @@ async def realtime_price_check():
         if prices and global_data and fg:
             await check_and_send_price_alerts(prices, global_data, fg)
     except Exception as e:
+        record_loop_failure()
         print(f"[REALTIME] Erreur: {e}")
 
+OPPORTUNITY_PROBE_MAX_AGE_MINUTES = 20
+
+def opportunity_triggered(fg_value, market_change):
+    return fg_value < 25 or fg_value > 75 or abs(market_change) > 5
+
+def probe_opportunity_conditions():
+    """Étape 1 (légère): F&G + variation market cap, depuis le cache si récent.
+
+    Ordre: snapshot complet récent > historique des polls prix > 2 appels API légers.
+    Renvoie (fg_value, market_change, source) ou None.
+    """
+    max_age = OPPORTUNITY_PROBE_MAX_AGE_MINUTES * 60
+    now = systime.time()
+    
+    data = market_snapshot["data"]
+    if data and now - market_snapshot["fetched_at"] < max_age:
+        return data['fear_greed']['value'], data['global']['market_cap_change_24h'], "snapshot"
+    
+    fg_age = timeseries.age("fear_greed", now)
+    mc_age = timeseries.age("market_cap_change_24h", now)
+    if fg_age is not None and mc_age is not None and max(fg_age, mc_age) < max_age:
+        return int(timeseries.latest("fear_greed")), timeseries.latest("market_cap_change_24h"), "historique"
+    
+    fg = get_fear_greed()
+    global_data = get_global_data()
+    if not fg or not global_data:
+        return None
+    return fg['value'], global_data['market_cap_change_24h'], "api"
+
 @tasks.loop(hours=2)
+@track_loop
 async def realtime_opportunities_check():
     print(f"[REALTIME] 💎 Opportunities - {datetime.now(TIMEZONE).strftime('%H:%M')}")
     try:
+        probe = probe_opportunity_conditions()
+        if not probe:
+            return
+        fg_value, market_change, probe_source = probe
+        if not opportunity_triggered(fg_value, market_change):
+            print(f"[REALTIME] 💎 Pas de signal (F&G {fg_value}, MCap {market_change:+.1f}%, {probe_source})")
+            return
+        
+        # Étape 2 (lourde): fetch complet + Grok uniquement si un déclencheur est actif
+        print(f"[REALTIME] 💎 Conditions spéciales! ({probe_source})")
         data = fetch_all_market_data()
         if data:
-            fg_value = data['fear_greed']['value']
-            market_change = data['global']['market_cap_change_24h']
-            if fg_value < 25 or fg_value > 75 or abs(market_change) > 5:
-                print("[REALTIME] 💎 Conditions spéciales!")
-                await send_vip_opportunities(data)
+            await send_vip_opportunities(data)
     except Exception as e:
+        record_loop_failure()
         print(f"[REALTIME] Erreur: {e}")
 
 @realtime_news_check.before_loop
@@ -1448,69 +3097,126 @@ async def before_realtime():
 # ============================================================
 #     🔄 MISE À JOUR GLOBALE
 # ============================================================
-async def run_global_update(source="scheduled", force_fg=False):
-    print(f"\n{'='*60}")
-    print(f"🔄 MISE À JOUR - {source}")
-    print(f"⏰ {datetime.now(TIMEZONE).strftime('%d/%m/%Y %H:%M:%S')}")
-    print(f"{'='*60}")
-    
-    data = fetch_all_market_data()
-    if not data:
-        print("❌ Échec données")
-        return False
-    
-    # Vérifie si c'est le matin (8h) pour envoyer Fear & Greed
-    current_hour = datetime.now(TIMEZONE).hour
-    is_morning = (current_hour == 8) or force_fg or ("startup" in source) or ("manual" in source)
-    
-    print("\n[PHASE 1] SOLO...")
-    # Solo Prix et Alertes toujours, F&G seulement le matin
-    solo_funcs = [send_solo_prix, send_solo_alertes]
-    if is_morning:
-        solo_funcs.insert(1, send_solo_fear_greed)  # Ajoute F&G si matin
-        print("   📊 Fear & Greed SOLO: ✅ (matin)")
-    else:
-        print("   📊 Fear & Greed SOLO: ⏭️ (pas le matin)")
-    
-    for func in solo_funcs:
+async def run_global_update(source="scheduled", force_fg=False, trimmed=False):
+    """Cycle complet SOLO + VIP + actus + opportunities.
+
+    trimmed=True (warm restart): uniquement la phase SOLO, sans appel Grok.
+    """
+    with span("run_global_update", root=True, kind="update", source=source, trimmed=trimmed):
+        print(f"\n{'='*60}")
+        print(f"🔄 MISE À JOUR - {source}")
+        print(f"⏰ {datetime.now(TIMEZONE).strftime('%d/%m/%Y %H:%M:%S')}")
+        print(f"{'='*60}")
+        
+        with update_stage("fetch_all_market_data") as sp:
+            data = fetch_all_market_data()
+            if sp and data:
+                sp.set(coins=len(data["movers"]), news=len(data["news"]), defi_pools=len(data["defi"]))
+        if not data:
+            record_loop_failure()
+            print("❌ Échec données")
+            return False
+        
+        # Vérifie si c'est le matin (8h) pour envoyer Fear & Greed
+        current_hour = datetime.now(TIMEZONE).hour
+        is_morning = (current_hour == 8) or force_fg or ("startup" in source) or ("manual" in source)
+        
+        print("\n[PHASE 1] SOLO...")
+        # Solo Prix et Alertes toujours, F&G seulement le matin
+        solo_funcs = [send_solo_prix, send_solo_alertes]
+        if is_morning:
+            solo_funcs.insert(1, send_solo_fear_greed)  # Ajoute F&G si matin
+            print("   📊 Fear & Greed SOLO: ✅ (matin)")
+        else:
+            print("   📊 Fear & Greed SOLO: ⏭️ (pas le matin)")
+        
+        for func in solo_funcs:
+            try:
+                with update_stage(func.__name__):
+                    await func(data)
+                await asyncio.sleep(2)
+            except Exception as e:
+                record_loop_failure()
+                print(f"Erreur: {e}")
+        
+        if trimmed:
+            # Pas de mark_global_update: le VIP n'a pas tourné, un redémarrage
+            # suivant ne doit pas le croire récent
+            print("\n⏭️ VIP / ACTUS / OPPORTUNITIES ignorés (warm restart)")
+            return True
+        
+        print("\n[PHASE 2] VIP...")
+        # VIP: F&G seulement le matin, le reste toujours
+        vip_funcs = [send_vip_setup, send_vip_marche, send_vip_watchlist, send_vip_sentiment]
+        if is_morning:
+            vip_funcs.insert(0, send_vip_fear_greed)  # Ajoute F&G VIP si matin
+            print("   📊 Fear & Greed VIP: ✅ (matin)")
+        else:
+            print("   📊 Fear & Greed VIP: ⏭️ (pas le matin)")
+        
+        for func in vip_funcs:
+            try:
+                with update_stage(func.__name__):
+                    await func(data)
+                await asyncio.sleep(4)
+            except Exception as e:
+                record_loop_failure()
+                print(f"Erreur: {e}")
+        
+        print("\n[PHASE 3] ACTUS...")
         try:
-            await func(data)
-            await asyncio.sleep(2)
+            with update_stage("send_actus_crypto"):
+                await send_actus_crypto(data, max_news=3, force=True)
         except Exception as e:
+            record_loop_failure()
             print(f"Erreur: {e}")
-    
-    print("\n[PHASE 2] VIP...")
-    # VIP: F&G seulement le matin, le reste toujours
-    vip_funcs = [send_vip_setup, send_vip_marche, send_vip_watchlist, send_vip_sentiment]
-    if is_morning:
-        vip_funcs.insert(0, send_vip_fear_greed)  # Ajoute F&G VIP si matin
-        print("   📊 Fear & Greed VIP: ✅ (matin)")
-    else:
-        print("   📊 Fear & Greed VIP: ⏭️ (pas le matin)")
-    
-    for func in vip_funcs:
+        
+        print("\n[PHASE 4] OPPORTUNITIES...")
         try:
-            await func(data)
-            await asyncio.sleep(4)
+            with update_stage("send_vip_opportunities"):
+                await send_vip_opportunities(data)
         except Exception as e:
+            record_loop_failure()
             print(f"Erreur: {e}")
-    
-    print("\n[PHASE 3] ACTUS...")
-    try:
-        await send_actus_crypto(data, max_news=3, force=True)
-    except Exception as e:
-        print(f"Erreur: {e}")
-    
-    print("\n[PHASE 4] OPPORTUNITIES...")
-    try:
-        await send_vip_opportunities(data)
-    except Exception as e:
-        print(f"Erreur: {e}")
-    
-    print(f"\n{'='*60}")
-    print("✅ TERMINÉ")
-    print(f"{'='*60}\n")
-    return True
+        
+        mark_global_update(source)
+        print(f"\n{'='*60}")
+        print("✅ TERMINÉ")
+        print(f"{'='*60}\n")
+        return True
+
+def mark_global_update(source):
+    state_store.set("meta", "last_global_update", {"ts": systime.time(), "source": source})
+
+# ============================================================
+#     ♻️ WARM RESTART
+# ============================================================
+WARM_START_ENABLED = os.getenv("WARM_START_ENABLED", "1") == "1"
+WARM_START_SKIP_MINUTES = int(os.getenv("WARM_START_SKIP_MINUTES", "120"))  # Broadcast récent: rien à renvoyer
+WARM_START_TRIM_MINUTES = int(os.getenv("WARM_START_TRIM_MINUTES", "360"))  # Assez récent: SOLO seulement
+
+def startup_plan():
+    """'skip', 'trim' ou 'full' selon l'âge de la dernière mise à jour publiée"""
+    last = state_store.get("meta", "last_global_update")
+    if not WARM_START_ENABLED or not last:
+        return "full", None
+    age_min = (systime.time() - last["ts"]) / 60
+    if age_min < WARM_START_SKIP_MINUTES:
+        return "skip", age_min
+    if age_min < WARM_START_TRIM_MINUTES:
+        return "trim", age_min
+    return "full", age_min
+
+async def run_startup_update():
+    plan, age_min = startup_plan()
+    if plan == "skip":
+        print(f"\n♻️ Warm restart: dernière MAJ il y a {age_min:.0f} min → broadcast ignoré")
+    elif plan == "trim":
+        print(f"\n♻️ Warm restart: dernière MAJ il y a {age_min:.0f} min → SOLO uniquement")
+        await run_global_update(source="startup_trim", trimmed=True)
+    else:
+        print("\n🚀 Démarrage à froid → mise à jour complète")
+        await run_global_update(source="startup")
 
 # ============================================================
 #     ⏰ TÂCHES PLANIFIÉES
@@ -1520,6 +3226,7 @@ async def run_global_update(source="scheduled", force_fg=False):
     time(hour=12, minute=0, tzinfo=TIMEZONE),
     time(hour=18, minute=0, tzinfo=TIMEZONE)
 ])
+@track_loop
 async def scheduled_update():
     await run_global_update(source=f"scheduled_{datetime.now(TIMEZONE).strftime('%H:%M')}")
 
@@ -1527,9 +3234,278 @@ async def scheduled_update():
 async def before_scheduled():
     await bot.wait_until_ready()
 
+# ============================================================
+#     👑 LEADER ELECTION (plusieurs réplicas)
+# ============================================================
+# Seul le leader publie (planifié + temps réel). Le bail est renouvelé par un
+# thread dédié: une mise à jour qui bloque la boucle Discord ne le laisse pas
+# expirer. Chaque envoi broadcast revérifie le bail (timed_send) pour qu'un
+# ancien leader ne publie jamais en même temps que son successeur.
+# Avec SHARD_ID/SHARD_COUNT, seule une réplica dont le shard porte le serveur
+# des salons configurés peut devenir leader (les autres n'y ont pas accès):
+# un seul serveur = un seul candidat, donc pas de failover.
+LEADER_BACKEND = os.getenv("LEADER_BACKEND", "sqlite")  # sqlite | file
+LEADER_LEASE_PATH = os.getenv("LEADER_LEASE_PATH", os.path.join(STATE_DIR, "leader.db"))
+LEADER_LEASE_SECONDS = int(os.getenv("LEADER_LEASE_SECONDS", "30"))
+LEADER_RENEW_SECONDS = 10
+LEADER_STARTUP_GRACE_SECONDS = 120
+INSTANCE_ID = os.getenv("INSTANCE_ID") or f"{socket.gethostname()}-{os.getpid()}"
+
+class LeaderLease(ABC):
+    """Interface d'un bail de leadership (remplaçable par Redis, Postgres...)"""
+
+    @abstractmethod
+    def acquire(self, holder, ttl):
+        """Prend ou renouvelle le bail. True si `holder` est leader."""
+
+    @abstractmethod
+    def release(self, holder):
+        """Libère le bail s'il est détenu par `holder`"""
+
+class SqliteLease(LeaderLease):
+    """Bail stocké dans une ligne SQLite, expirant après `ttl` secondes sans renouvellement"""
+
+    def __init__(self, path, name="publisher"):
+        self.name = name
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS lease (name TEXT PRIMARY KEY, holder TEXT NOT NULL, expires_at REAL NOT NULL)")
+
+    def acquire(self, holder, ttl):
+        now = systime.time()
+        try:
+            # BEGIN IMMEDIATE: verrou d'écriture, lecture + mise à jour atomiques entre processus
+            self._conn.execute("BEGIN IMMEDIATE")
+            row = self._conn.execute("SELECT holder, expires_at FROM lease WHERE name = ?", (self.name,)).fetchone()
+            if row and row[0] != holder and row[1] > now:
+                self._conn.execute("COMMIT")
+                return False
+            self._conn.execute(
+                "INSERT INTO lease (name, holder, expires_at) VALUES (?, ?, ?)"
+                " ON CONFLICT(name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at",
+                (self.name, holder, now + ttl)
+            )
+            self._conn.execute("COMMIT")
+            return True
+        except sqlite3.Error as e:
+            print(f"[LEADER] Erreur bail: {e}")
+            if self._conn.in_transaction:
+                self._conn.execute("ROLLBACK")
+            return False
+
+    def release(self, holder):
+        try:
+            self._conn.execute("DELETE FROM lease WHERE name = ? AND holder = ?", (self.name, holder))
+        except sqlite3.Error as e:
+            print(f"[LEADER] Erreur libération: {e}")
+
+class FileLockLease(LeaderLease):
+    """Verrou fcntl exclusif: libéré par l'OS si le processus meurt (même hôte uniquement)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+
+    def acquire(self, holder, ttl):
+        if self._fd is not None:
+            return True
+        import fcntl
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, holder.encode())
+        self._fd = fd
+        return True
+
+    def release(self, holder):
+        if self._fd is None:
+            return
+        import fcntl
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
+
+def build_leader_lease():
+    if LEADER_BACKEND == "file":
+        return FileLockLease(LEADER_LEASE_PATH.replace(".db", ".lock"))
+    return SqliteLease(LEADER_LEASE_PATH)
+
+class LeaderElector:
+    """Renouvelle le bail dans son propre thread, indépendamment de la boucle Discord.
+
+    `valid_until` (monotonic) borne le bail côté local avec une marge d'un
+    renouvellement: au-delà, un suiveur peut l'avoir pris et plus rien ne
+    doit être publié. `generation` augmente à chaque prise du bail.
+    """
+
+    def __init__(self, lease, holder, ttl=LEADER_LEASE_SECONDS, renew_every=LEADER_RENEW_SECONDS):
+        self.lease = lease
+        self.holder = holder
+        self.ttl = ttl
+        self.renew_every = renew_every
+        self.eligible = False  # Mis à jour depuis la boucle (shard qui porte le serveur)
+        self.valid_until = 0.0
+        self.generation = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def holds(self):
+        return systime.monotonic() < self.valid_until
+
+    def _renew(self):
+        if not self.eligible:
+            if self.holds():
+                self.valid_until = 0.0
+                self.lease.release(self.holder)
+            return
+        start = systime.monotonic()
+        if self.lease.acquire(self.holder, self.ttl):
+            if not self.holds():
+                self.generation += 1
+            self.valid_until = start + self.ttl - self.renew_every
+        else:
+            self.valid_until = 0.0
+
+    def _run(self):
+        while True:
+            try:
+                self._renew()
+            except Exception as e:
+                print(f"[LEADER] Erreur renouvellement: {e}")
+            if self._stop.wait(self.renew_every):
+                break
+        if self.holds():
+            self.valid_until = 0.0
+            self.lease.release(self.holder)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="leader-lease", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+leader_lease = None  # Créé par init_runtime (connexion SQLite ou fichier verrou)
+leader_elector = None
+is_leader = False
+ready_at = None
+startup_update_task = None  # Référence forte: sinon la tâche peut être collectée en cours
+
+class LeadershipLost(Exception):
+    """Envoi broadcast refusé: le bail n'est plus détenu par cette instance"""
+
+def holds_leadership():
+    return is_leader and leader_elector is not None and leader_elector.holds()
+
+def leader_eligible():
+    """Le shard de cette réplica porte-t-il un des salons configurés ?"""
+    return any(bot.get_channel(cid) for cid in CHANNELS.values() if cid)
+
+LEADER_TASKS = [scheduled_update, realtime_news_check, realtime_price_check, realtime_opportunities_check]
+
+def reload_shared_state():
+    """Relit l'état publié par l'ancien leader (dédup, dernières publications, alertes perso)"""
+    global last_news_sent_time
+    state_store.reload("meta", "price_alerts", sent_news_ids.namespace, sent_alert_ids.namespace)
+    sent_news_ids.reload()
+    sent_alert_ids.reload()
+    last_news_iso = state_store.get("meta", "last_news_sent_time")
+    last_news_sent_time = datetime.fromisoformat(last_news_iso) if last_news_iso else None
+
+def log_task_failure(task):
+    if not task.cancelled() and task.exception():
+        print(f"[TASK] {task.get_name()} en échec:")
+        traceback.print_exception(task.exception())
+
+async def become_leader():
+    global is_leader, startup_done, startup_update_task
+    # Avant la première publication: ne pas renvoyer ce que l'ancien leader a déjà posté
+    await asyncio.to_thread(reload_shared_state)
+    if not leader_elector.holds():
+        return
+    load_user_alerts()
+    is_leader = True
+    print(f"[LEADER] 👑 {INSTANCE_ID} devient leader (génération {leader_elector.generation})")
+    for task in LEADER_TASKS:
+        if not task.is_running():
+            task.start()
+    # Broadcast de démarrage seulement si le leadership est pris au boot, pas lors d'un failover
+    if not startup_done:
+        startup_done = True
+        if ready_at and systime.time() - ready_at < LEADER_STARTUP_GRACE_SECONDS:
+            startup_update_task = asyncio.create_task(run_startup_update(), name="startup_update")
+            startup_update_task.add_done_callback(log_task_failure)
+
+def step_down():
+    global is_leader
+    is_leader = False
+    # Les alertes déclenchées restent marquées en base: le nouveau leader les livre
+    pending_alert_notifications.clear()
+    print(f"[LEADER] ⬇️ {INSTANCE_ID} perd le leadership")
+    for task in LEADER_TASKS:
+        if task.is_running():
+            task.cancel()
+
+@tasks.loop(seconds=1)
+@track_loop
+async def leadership_check():
+    """Applique sur la boucle l'état du bail tenu par le thread leader-lease"""
+    leader_elector.eligible = leader_eligible()
+    held = leader_elector.holds()
+    if held and not is_leader:
+        await become_leader()
+    elif not held and is_leader:
+        step_down()
+
+@leadership_check.before_loop
+async def before_leadership_check():
+    await bot.wait_until_ready()
+    leader_elector.eligible = leader_eligible()
+    if not leader_elector.eligible:
+        print(f"[LEADER] {INSTANCE_ID} non éligible: aucun salon configuré sur ce shard")
+    leader_elector.start()
+
+@leadership_check.after_loop
+async def after_leadership_check():
+    await asyncio.to_thread(leader_elector.stop)
+
 # ============================================================
 #     🎮 COMMANDES
 # ============================================================
+class CommandClaimed(commands.CheckFailure):
+    """Commande déjà prise en charge par une autre réplica"""
+
+@bot.check
+async def claim_command(ctx):
+    """Une seule réplica traite chaque commande: la première à réserver l'id du message"""
+    if await asyncio.to_thread(state_store.claim, "command", str(ctx.message.id), INSTANCE_ID):
+        return True
+    raise CommandClaimed(f"Commande {ctx.message.id} servie par une autre réplica")
+
+@bot.event
+async def on_command_error(ctx, error):
+    if isinstance(error, CommandClaimed):
+        return
+    await commands.Bot.on_command_error(bot, ctx, error)
+
+@bot.before_invoke
+async def tag_command_feature(ctx):
+    # Les appels Grok de la commande sont attribués à cmd_<nom> dans le registre LLM
+    current_feature.set(f"cmd_{ctx.command.name}")
+
 @bot.command(name="testall")
 async def cmd_testall(ctx):
     if not ctx.author.guild_permissions.administrator:
@@ -1549,7 +3525,7 @@ async def cmd_flash(ctx):
         return
     prices = data['prices']
     fg = data['fear_greed']
-    analysis = ask_grok_mini(f"BTC ${prices['btc_price']:,.0f}, F&G {fg['value']}. Situation 2 lignes.")
+    analysis = ask_grok_mini(f"BTC ${prices['btc_price']:,.0f}, F&G {fg['value']}. Situation 2 lignes.", call_site="cmd_flash")
     embed = discord.Embed(title="⚡ FLASH", description=analysis, color=0xf1c40f)
     embed.add_field(name="BTC", value=f"${prices['btc_price']:,.0f}", inline=True)
     embed.add_field(name="F&G", value=f"{fg['value']}", inline=True)
@@ -1585,17 +3561,63 @@ async def cmd_status(ctx):
     if not ctx.author.guild_permissions.administrator:
         return
     embed = discord.Embed(title="🤖 Status Horizon Elite V4", color=0x3498db)
-    embed.add_field(name="Grok", value="✅" if client_xai else "❌", inline=True)
+    embed.add_field(name="Grok", value="✅" if get_xai_client() else "❌", inline=True)
     embed.add_field(name="LunarCrush", value="✅" if LUNARCRUSH_API_KEY else "❌", inline=True)
-    embed.add_field(name="Social Posts", value="✅" if client_xai else "❌", inline=True)
+    embed.add_field(name="Social Posts", value="✅" if get_xai_client() else "❌", inline=True)
     embed.add_field(name="Scheduled", value="✅" if scheduled_update.is_running() else "❌", inline=True)
     embed.add_field(name="News", value="✅" if realtime_news_check.is_running() else "❌", inline=True)
     embed.add_field(name="Prix", value="✅" if realtime_price_check.is_running() else "❌", inline=True)
     embed.add_field(name="Opport", value="✅" if realtime_opportunities_check.is_running() else "❌", inline=True)
+    embed.add_field(name="Flux prix", value="✅" if price_stream_task and not price_stream_task.done() else "❌", inline=True)
+    embed.add_field(name="Leader", value=f"{'👑' if is_leader else '💤'} {INSTANCE_ID}", inline=True)
     embed.add_field(name="Ebook Link", value="✅" if EBOOK_CONFIG['link'] != "https://ton-lien-ebook.com" else "⚠️ Non configuré", inline=True)
     embed.add_field(name="Heure", value=datetime.now(TIMEZONE).strftime("%H:%M"), inline=True)
     await ctx.send(embed=embed)
 
+@bot.command(name="llmusage")
+async def cmd_llmusage(ctx, days: int = 7):
+    """Registre Grok: appels, tokens, latence et coût estimé par fonctionnalité"""
+    if not ctx.author.guild_permissions.administrator:
+        return
+    days = max(1, min(days, 365))
+    since = (datetime.now(TIMEZONE) - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+    await asyncio.to_thread(llm_ledger.flush)
+    features = await asyncio.to_thread(llm_ledger.by_feature, since)
+    daily = await asyncio.to_thread(llm_ledger.by_day, since)
+    models = await asyncio.to_thread(llm_ledger.by_model, since)
+    
+    if not features:
+        await ctx.send(f"📭 Aucun appel Grok enregistré sur {days} jour(s).")
+        return
+    
+    total_cost = sum(llm_cost(f[3], f[4]) for f in features)
+    total_calls = sum(f[1] for f in features)
+    embed = discord.Embed(
+        title=f"🧾 Usage Grok — {days} jour(s)",
+        description=f"**{total_calls}** appels · **~${total_cost:.2f}** (${LLM_PRICE_INPUT_PER_M:g}/${LLM_PRICE_OUTPUT_PER_M:g} par M tokens)",
+        color=0x9b59b6
+    )
+    lines = []
+    for feature, calls, errors, prompt, completion, latency_total, latency_max in features[:12]:
+        err = f" · ❌{errors}" if errors else ""
+        lines.append(
+            f"`{feature}` {calls}× · {prompt / 1000:.1f}k→{completion / 1000:.1f}k tok · "
+            f"{latency_total / calls / 1000:.1f}s (max {latency_max / 1000:.0f}s) · ${llm_cost(prompt, completion):.2f}{err}"
+        )
+    embed.add_field(name="📊 Par fonctionnalité", value="\n".join(lines)[:1024], inline=False)
+    day_lines = [
+        f"{day[8:10]}/{day[5:7]} — {calls} appels · {(prompt + completion) / 1000:.0f}k tok · "
+        f"{latency_total / calls / 1000:.1f}s moy · ${llm_cost(prompt, completion):.2f}" + (f" · ❌{errors}" if errors else "")
+        for day, calls, errors, prompt, completion, latency_total in daily[:10]
+    ]
+    embed.add_field(name="📅 Par jour", value="\n".join(day_lines)[:1024], inline=False)
+    embed.add_field(
+        name="🤖 Modèles",
+        value="\n".join(f"`{model}` {calls}× · {(prompt + completion) / 1000:.0f}k tok" for model, calls, prompt, completion in models)[:1024],
+        inline=False
+    )
+    await ctx.send(embed=embed)
+
 @bot.command(name="prix")
 async def cmd_prix(ctx):
     prices = get_btc_price()
@@ -1783,15 +3805,16 @@ async def cmd_postnoimg(ctx):
 #     Limite: 5 questions par jour par utilisateur
 # ============================================================
 
-# Cache pour les limites quotidiennes (reset à minuit)
-ask_daily_limits = {}  # {user_id: {"count": X, "date": "YYYY-MM-DD"}}
+# Compteurs quotidiens en SQL (state_store.increment, table counters), période =
+# jour de Paris (reset à minuit): atomiques même si plusieurs réplicas écrivent
 ASK_DAILY_LIMIT = 5  # Nombre max de questions par jour
 
 def get_gold_price():
     """Récupère le prix de l'or via API gratuite"""
     try:
         # API gratuite pour les métaux précieux
-        r = requests.get(
+        r = http_get(
+            "metalpriceapi",
             "https://api.metalpriceapi.com/v1/latest?api_key=demo&base=USD&currencies=XAU",
             timeout=10
         )
@@ -1805,7 +3828,7 @@ def get_gold_price():
                     return {"price": gold_price, "unit": "USD/oz"}
         
         # Alternative: API Gold API (backup)
-        r2 = requests.get("https://www.goldapi.io/api/XAU/USD", 
+        r2 = http_get("goldapi", "https://www.goldapi.io/api/XAU/USD", 
                           headers={"x-access-token": "goldapi-demo"}, 
                           timeout=10)
         if r2.status_code == 200:
@@ -1817,35 +3840,31 @@ def get_gold_price():
     
     return None
 
+def ask_day():
+    return datetime.now(TIMEZONE).strftime("%Y-%m-%d")
+
 def check_ask_limit(user_id):
     """Vérifie si l'utilisateur peut encore poser une question aujourd'hui"""
-    today = datetime.now(TIMEZONE).strftime("%Y-%m-%d")
-    
-    if user_id not in ask_daily_limits:
-        ask_daily_limits[user_id] = {"count": 0, "date": today}
-    
-    user_data = ask_daily_limits[user_id]
-    
-    # Reset si nouveau jour
-    if user_data["date"] != today:
-        ask_daily_limits[user_id] = {"count": 0, "date": today}
-        user_data = ask_daily_limits[user_id]
-    
-    remaining = ASK_DAILY_LIMIT - user_data["count"]
+    remaining = ASK_DAILY_LIMIT - state_store.counter("ask_limits", str(user_id), period=ask_day())
     return remaining > 0, remaining
 
-def increment_ask_count(user_id):
-    """Incrémente le compteur de questions pour un utilisateur"""
-    today = datetime.now(TIMEZONE).strftime("%Y-%m-%d")
-    
-    if user_id not in ask_daily_limits:
-        ask_daily_limits[user_id] = {"count": 0, "date": today}
-    
-    if ask_daily_limits[user_id]["date"] != today:
-        ask_daily_limits[user_id] = {"count": 0, "date": today}
-    
-    ask_daily_limits[user_id]["count"] += 1
-    return ASK_DAILY_LIMIT - ask_daily_limits[user_id]["count"]
+def take_ask_credit(user_id, day):
+    """Consomme un crédit en une requête SQL: crédits restants, None si limite atteinte"""
+    count = state_store.increment("ask_limits", str(user_id), period=day, limit=ASK_DAILY_LIMIT)
+    return None if count is None else ASK_DAILY_LIMIT - count
+
+def refund_ask_credit(user_id, day):
+    """Rend le crédit d'une question sans réponse"""
+    state_store.decrement("ask_limits", str(user_id), period=day)
+
+def ask_limit_embed():
+    embed = discord.Embed(
+        title="⏰ Limite atteinte",
+        description=f"Tu as utilisé tes **{ASK_DAILY_LIMIT} questions** aujourd'hui.\n\nReviendras demain ! 🌅",
+        color=0xff6600
+    )
+    embed.set_footer(text="💡 La limite se réinitialise à minuit (heure de Paris)")
+    return embed
 
 @bot.command(name="ask")
 async def cmd_ask(ctx, *, question: str = None):
@@ -1868,22 +3887,15 @@ async def cmd_ask(ctx, *, question: str = None):
     
     # Vérifier la limite quotidienne (admins exemptés)
     if not is_admin:
-        can_ask, remaining = check_ask_limit(ctx.author.id)
+        can_ask, remaining = await asyncio.to_thread(check_ask_limit, ctx.author.id)
         if not can_ask:
-            embed = discord.Embed(
-                title="⏰ Limite atteinte",
-                description=f"Tu as utilisé tes **{ASK_DAILY_LIMIT} questions** aujourd'hui.\n\nReviendras demain ! 🌅",
-                color=0xff6600
-            )
-            embed.set_footer(text="💡 La limite se réinitialise à minuit (heure de Paris)")
-            await ctx.send(embed=embed, delete_after=15)
+            await ctx.send(embed=ask_limit_embed(), delete_after=15)
             return
     
     # Vérifier qu'une question a été posée
     if not question:
         # Afficher les crédits restants
         if not is_admin:
-            _, remaining = check_ask_limit(ctx.author.id)
             credits_text = f"\n\n📊 **Crédits restants aujourd'hui:** {remaining}/{ASK_DAILY_LIMIT}"
         else:
             credits_text = "\n\n👑 **Admin:** Questions illimitées"
@@ -1907,6 +3919,14 @@ async def cmd_ask(ctx, *, question: str = None):
         await ctx.send(embed=embed)
         return
     
+    # Réserver le crédit avant l'appel Grok (rendu si pas de réponse)
+    if not is_admin:
+        day = ask_day()
+        remaining = await asyncio.to_thread(take_ask_credit, ctx.author.id, day)
+        if remaining is None:
+            await ctx.send(embed=ask_limit_embed(), delete_after=15)
+            return
+    
     # Message de chargement
     msg = await ctx.send("🤔 **Analyse en cours...**\n_Grok réfléchit à ta question..._")
     
@@ -1962,15 +3982,15 @@ Réponds en tant qu'expert Horizon Elite:
     
     # Appeler Grok
     try:
-        response = ask_grok(prompt, max_tokens=600)
+        response = ask_grok(prompt, max_tokens=600, call_site="cmd_ask")
         
         if not response:
+            if not is_admin:
+                await asyncio.to_thread(refund_ask_credit, ctx.author.id, day)
             await msg.edit(content="❌ **Erreur:** Impossible de contacter l'IA. Réessaie dans quelques instants.")
             return
         
-        # Incrémenter le compteur (sauf admin)
         if not is_admin:
-            remaining = increment_ask_count(ctx.author.id)
             credits_footer = f" • 📊 {remaining}/{ASK_DAILY_LIMIT} crédits restants"
         else:
             credits_footer = " • 👑 Admin"
@@ -2000,14 +4020,1105 @@ Réponds en tant qu'expert Horizon Elite:
         
     except Exception as e:
         print(f"[ASK] Erreur: {e}")
+        if not is_admin:
+            await asyncio.to_thread(refund_ask_credit, ctx.author.id, day)
         await msg.edit(content=f"❌ **Erreur:** {str(e)[:100]}")
         
+# ============================================================
+#     🔔 ALERTES PERSONNELLES (!alert)
+# ============================================================
+USER_ALERTS_MAX_PER_USER = int(os.getenv("USER_ALERTS_MAX_PER_USER", "10"))
+USER_ALERT_WINDOWS = {"1h": 3600, "4h": 4 * 3600, "24h": 24 * 3600}
+USER_ALERT_SEND_ATTEMPTS = 5  # Envois ratés avant abandon d'une alerte déclenchée
+
+ALERT_PRICE_RE = re.compile(r"^([a-z0-9]{2,10})\s*([<>])\s*\$?([\d.,]+)$", re.IGNORECASE)
+ALERT_PCT_RE = re.compile(r"^([a-z0-9]{2,10})\s*([+-])\s*([\d.,]+)\s*%\s*(1h|4h|24h)?$", re.IGNORECASE)
+# Même règle pour les prix et les %: virgule = milliers si groupes de 3 (1,000),
+# sinon séparateur décimal (2,5)
+ALERT_THOUSANDS_RE = re.compile(r"^\d{1,3}(?:,\d{3})+(?:\.\d+)?$")
+ALERT_DECIMAL_RE = re.compile(r"^\d+(?:[.,]\d+)?$")
+
+def parse_alert_number(text):
+    if ALERT_THOUSANDS_RE.match(text):
+        return float(text.replace(",", ""))
+    if ALERT_DECIMAL_RE.match(text):
+        return float(text.replace(",", "."))
+    return None
+
+def parse_alert_expression(expression):
+    """`BTC > 70000` / `ETH -5% 1h` -> dict d'abonnement (sans id), None si invalide"""
+    expression = expression.strip()
+    match = ALERT_PRICE_RE.match(expression)
+    if match:
+        symbol, op, value = match.groups()
+        threshold = parse_alert_number(value)
+        if threshold is None:
+            return None
+        return {
+            "symbol": symbol.upper(),
+            "kind": "above" if op == ">" else "below",
+            "threshold": threshold,
+        }
+    match = ALERT_PCT_RE.match(expression)
+    if match:
+        symbol, sign, value, window = match.groups()
+        threshold = parse_alert_number(value)
+        if threshold is None:
+            return None
+        return {
+            "symbol": symbol.upper(),
+            "kind": "pct_up" if sign == "+" else "pct_down",
+            "threshold": threshold,
+            "window": (window or "1h").lower(),
+        }
+    return None
+
+def alert_value(kind, price, change):
+    """Grandeur comparée au seuil: prix, variation, ou -variation pour pct_down"""
+    if kind in ("above", "below"):
+        return price
+    if change is None:
+        return None
+    return change if kind == "pct_up" else -change
+
+def alert_armed(kind, threshold, value):
+    """Armée si la valeur de référence est du côté opposé au seuil (inconnue: pas armée)"""
+    if value is None:
+        return False
+    return value > threshold if kind == "below" else value < threshold
+
+def describe_alert(sub):
+    if sub["kind"] == "above":
+        return f"{sub['symbol']} > ${sub['threshold']:,.2f}"
+    if sub["kind"] == "below":
+        return f"{sub['symbol']} < ${sub['threshold']:,.2f}"
+    sign = "+" if sub["kind"] == "pct_up" else "-"
+    return f"{sub['symbol']} {sign}{sub['threshold']:g}% {sub['window']}"
+
+class AlertIndex:
+    """Index des abonnements par symbole: listes triées de (seuil, id).
+
+    Pour un tick, les abonnements déclenchés forment un préfixe (ou suffixe)
+    de chaque liste: bisect + slice = O(log n + k).
+    - above: seuil <= prix            -> préfixe
+    - below: seuil >= prix            -> suffixe
+    - pct_up: seuil <= variation      -> préfixe (par fenêtre)
+    - pct_down: seuil <= -variation   -> préfixe (par fenêtre)
+
+    Une alerte ne se déclenche que sur un franchissement: créée déjà du mauvais
+    côté (ou sans prix connu), elle attend dans une liste "arm:<kind>" que la
+    valeur repasse de l'autre côté du seuil avant de rejoindre la liste active.
+    """
+
+    def __init__(self):
+        self.subs = {}
+        self.next_id = 1
+        self._lists = {}  # (symbol, kind, window) -> [(threshold, id), ...]
+
+    def __len__(self):
+        return len(self.subs)
+
+    def symbols(self):
+        return {sub["symbol"] for sub in self.subs.values()}
+
+    def _key(self, sub):
+        kind = sub["kind"] if sub.get("armed", True) else "arm:" + sub["kind"]
+        return sub["symbol"], kind, sub.get("window")
+
+    def add(self, sub):
+        if "id" not in sub:
+            sub["id"] = self.next_id
+        self.next_id = max(self.next_id, sub["id"] + 1)
+        self.subs[sub["id"]] = sub
+        bisect.insort(self._lists.setdefault(self._key(sub), []), (sub["threshold"], sub["id"]))
+        return sub
+
+    def clear(self):
+        self.subs.clear()
+        self._lists.clear()
+
+    def remove(self, sub_id):
+        sub = self.subs.pop(sub_id, None)
+        if not sub:
+            return None
+        entries = self._lists.get(self._key(sub), [])
+        i = bisect.bisect_left(entries, (sub["threshold"], sub_id))
+        if i < len(entries) and entries[i] == (sub["threshold"], sub_id):
+            del entries[i]
+        return sub
+
+    def for_user(self, user_id):
+        return [sub for sub in self.subs.values() if sub["user_id"] == user_id]
+
+    def _pop_prefix(self, key, bound):
+        entries = self._lists.get(key)
+        if not entries:
+            return []
+        end = bisect.bisect_right(entries, (bound, float("inf")))
+        hits, entries[:end] = entries[:end], []
+        return hits
+
+    def _pop_suffix(self, key, bound):
+        entries = self._lists.get(key)
+        if not entries:
+            return []
+        start = bisect.bisect_left(entries, (bound, -1))
+        hits, entries[start:] = entries[start:], []
+        return hits
+
+    def _pop_below(self, key, bound):
+        """Seuils strictement inférieurs à bound"""
+        entries = self._lists.get(key)
+        if not entries:
+            return []
+        end = bisect.bisect_left(entries, (bound, -1))
+        hits, entries[:end] = entries[:end], []
+        return hits
+
+    def _pop_above(self, key, bound):
+        """Seuils strictement supérieurs à bound"""
+        entries = self._lists.get(key)
+        if not entries:
+            return []
+        start = bisect.bisect_right(entries, (bound, float("inf")))
+        hits, entries[start:] = entries[start:], []
+        return hits
+
+    def match(self, symbol, price, changes):
+        """Arme puis retire les abonnements franchis par ce tick: (déclenchés, armés)"""
+        values = {("above", None): price, ("below", None): price}
+        for window, change in changes.items():
+            if change is not None:
+                values[("pct_up", window)] = alert_value("pct_up", price, change)
+                values[("pct_down", window)] = alert_value("pct_down", price, change)
+
+        armed = []
+        for (kind, window), value in values.items():
+            arm_key = (symbol, "arm:" + kind, window)
+            pop = self._pop_below if kind == "below" else self._pop_above
+            for threshold, sub_id in pop(arm_key, value):
+                sub = self.subs.get(sub_id)
+                if sub:
+                    sub["armed"] = True
+                    bisect.insort(self._lists.setdefault(self._key(sub), []), (threshold, sub_id))
+                    armed.append(sub)
+
+        hits = []
+        for (kind, window), value in values.items():
+            pop = self._pop_suffix if kind == "below" else self._pop_prefix
+            hits += pop((symbol, kind, window), value)
+        return [self.subs.pop(sub_id) for _, sub_id in hits if sub_id in self.subs], armed
+
+
+user_alerts = AlertIndex()
+pending_alert_notifications = []  # [(sub, price, change, tentatives)]
+
+# Source de vérité: state_store["price_alerts"], partagé entre réplicas. Seul le
+# leader évalue et livre; les commandes (servies par n'importe quelle réplica)
+# écrivent dans la base, le leader s'y réaligne à chaque passage de flush_user_alerts.
+
+def load_user_alerts():
+    """Reconstruit l'index depuis price_alerts (boot et prise de leadership).
+
+    Les alertes déclenchées mais jamais livrées (ancien leader tombé entre
+    les deux) repartent directement dans la file d'envoi.
+    """
+    user_alerts.clear()
+    pending_alert_notifications.clear()
+    for sub in state_store.items("price_alerts").values():
+        fired = sub.get("fired")
+        if fired:
+            pending_alert_notifications.append((sub, fired["price"], fired["change"], 0))
+        else:
+            user_alerts.add(sub)
+    if user_alerts.subs or pending_alert_notifications:
+        print(f"[ALERTS] {len(user_alerts)} alertes perso restaurées, {len(pending_alert_notifications)} à livrer")
+
+def sync_user_alerts():
+    """Aligne l'index sur price_alerts (créations/suppressions d'une autre réplica).
+
+    Renvoie les nouveaux symboles à ajouter au flux de prix.
+    """
+    stored = state_store.items("price_alerts")
+    for sub_id in list(user_alerts.subs):
+        sub = stored.get(str(sub_id))
+        if sub is None or sub.get("fired"):
+            user_alerts.remove(sub_id)
+    known = user_alerts.symbols()
+    added = set()
+    for sub in stored.values():
+        if sub["id"] not in user_alerts.subs and not sub.get("fired"):
+            user_alerts.add(sub)
+            if sub["symbol"] not in known:
+                added.add(sub["symbol"])
+    return added - set(PRICE_STREAM_SYMBOLS)
+
+async def refresh_user_alerts():
+    """Relit price_alerts depuis la base partagée puis réaligne l'index"""
+    await asyncio.to_thread(state_store.reload, "price_alerts")
+    return sync_user_alerts()
+
+def process_user_alerts(symbol, price, change_1h=None):
+    """Appelé à chaque tick: met en file les alertes perso déclenchées (leader uniquement)"""
+    if not user_alerts.subs or not holds_leadership():
+        return
+    metric = f"{symbol.lower()}_price"
+    changes = {
+        "1h": change_1h if change_1h is not None else timeseries.change_pct(metric, USER_ALERT_WINDOWS["1h"]),
+        "4h": timeseries.change_pct(metric, USER_ALERT_WINDOWS["4h"]),
+        "24h": timeseries.change_pct(metric, USER_ALERT_WINDOWS["24h"]),
+    }
+    fired, armed = user_alerts.match(symbol, price, changes)
+    for sub in armed:
+        state_store.set("price_alerts", str(sub["id"]), sub)
+    # Marquée déclenchée dans le StateStore (un nouveau leader la livrera si
+    # celui-ci tombe avant l'envoi), supprimée une fois livrée (flush_user_alerts)
+    for sub in fired:
+        change = changes.get(sub.get("window"))
+        sub["fired"] = {"price": price, "change": change}
+        state_store.set("price_alerts", str(sub["id"]), sub)
+        pending_alert_notifications.append((sub, price, change, 0))
+
+@tasks.loop(seconds=5)
+@track_loop
+async def flush_user_alerts():
+    """Leader: se réaligne sur price_alerts puis envoie les alertes déclenchées par lots (un message par salon)"""
+    if not holds_leadership():
+        return
+    for symbol in await refresh_user_alerts():
+        await subscribe_stream_symbol(symbol)
+    
+    if pending_alert_notifications:
+        batch = pending_alert_notifications[:]
+        pending_alert_notifications.clear()
+        
+        by_channel = {}
+        for entry in batch:
+            by_channel.setdefault(entry[0]["channel_id"], []).append(entry)
+        
+        for channel_id, entries in by_channel.items():
+            channel = bot.get_channel(channel_id)
+            if not channel:
+                print(f"[ALERTS] Salon {channel_id} introuvable ({len(entries)} alertes en attente)")
+                retry_user_alerts(entries)
+                continue
+            # Un message par lot de lignes; chaque lot livré supprime ses alertes
+            chunks = [("", [])]
+            for entry in entries:
+                sub, price, change, _ = entry
+                line = f"🔔 <@{sub['user_id']}> **{describe_alert(sub)}** atteint → ${price:,.4f}"
+                if change is not None:
+                    line += f" ({change:+.2f}% {sub['window']})"
+                if len(chunks[-1][0]) + len(line) > 1900:
+                    chunks.append(("", []))
+                text, chunk_entries = chunks[-1]
+                chunks[-1] = (text + line + "\n", chunk_entries + [entry])
+            for i, (text, chunk_entries) in enumerate(chunks):
+                try:
+                    await timed_send(channel, channel_label(channel_id), content=text, allowed_mentions=discord.AllowedMentions(users=True))
+                except LeadershipLost:
+                    # Restent marquées déclenchées en base: le nouveau leader les livre
+                    print(f"[ALERTS] Leadership perdu, {len(pending_alert_notifications)} alertes laissées au nouveau leader")
+                    return
+                except Exception as e:
+                    record_loop_failure()
+                    print(f"[ALERTS] Erreur envoi: {e}")
+                    retry_user_alerts([pending for _, rest in chunks[i:] for pending in rest])
+                    break
+                for sub, *_ in chunk_entries:
+                    state_store.delete("price_alerts", str(sub["id"]))
+                print(f"[ALERTS] ✅ {len(chunk_entries)} alertes perso → {channel_id}")
+
+def retry_user_alerts(entries):
+    for sub, price, change, attempts in entries:
+        if attempts + 1 < USER_ALERT_SEND_ATTEMPTS:
+            pending_alert_notifications.append((sub, price, change, attempts + 1))
+        else:
+            print(f"[ALERTS] Alerte #{sub['id']} abandonnée après {USER_ALERT_SEND_ATTEMPTS} envois ratés")
+            state_store.delete("price_alerts", str(sub["id"]))
+
+@flush_user_alerts.before_loop
+async def before_flush_user_alerts():
+    await bot.wait_until_ready()
+
+@bot.command(name="alert")
+async def cmd_alert(ctx, *, expression: str = None):
+    """Crée une alerte perso: `!alert BTC > 70000` ou `!alert ETH -5% 1h`"""
+    if not expression:
+        embed = discord.Embed(title="🔔 Alertes personnelles", color=0x9b59b6)
+        embed.add_field(
+            name="📝 Usage",
+            value="`!alert BTC > 70000` - prix au-dessus\n`!alert BTC < 60000` - prix en-dessous\n`!alert ETH -5% 1h` - variation (1h, 4h, 24h)\n`!alerts` - mes alertes\n`!alertdel <id>` - supprimer",
+            inline=False
+        )
+        embed.set_footer(text=f"Max {USER_ALERTS_MAX_PER_USER} alertes actives • Déclenchement unique")
+        await ctx.send(embed=embed)
+        return
+    
+    sub = parse_alert_expression(expression)
+    if not sub:
+        await ctx.send("❌ Format invalide. Exemples: `!alert BTC > 70000`, `!alert ETH -5% 1h`")
+        return
+    
+    is_admin = ctx.guild is not None and ctx.author.guild_permissions.administrator
+    await refresh_user_alerts()
+    if not is_admin and len(user_alerts.for_user(ctx.author.id)) >= USER_ALERTS_MAX_PER_USER:
+        await ctx.send(f"❌ Limite de {USER_ALERTS_MAX_PER_USER} alertes actives atteinte. Supprime-en une avec `!alertdel <id>`.")
+        return
+    
+    is_new_symbol = sub["symbol"] not in user_alerts.symbols() and sub["symbol"] not in PRICE_STREAM_SYMBOLS
+    current = stream_prices.get(sub["symbol"])
+    if sub["kind"] in ("above", "below"):
+        change = None
+    elif sub["window"] == "1h" and current and current.get("change_1h") is not None:
+        change = current["change_1h"]
+    else:
+        change = timeseries.change_pct(f"{sub['symbol'].lower()}_price", USER_ALERT_WINDOWS[sub["window"]])
+    # Valeur à la création: l'alerte ne part qu'au franchissement du seuil depuis celle-ci
+    ref = alert_value(sub["kind"], current["price"] if current else None, change)
+    sub.update({"user_id": ctx.author.id, "channel_id": ctx.channel.id, "created": systime.time(),
+                "ref": ref, "armed": alert_armed(sub["kind"], sub["threshold"], ref)})
+    # Id alloué en SQL: unique même si deux réplicas créent une alerte en même temps
+    sub["id"] = await asyncio.to_thread(
+        state_store.increment, "price_alerts", "next_id",
+        start=max(user_alerts.next_id, state_store.get("meta", "price_alerts_next_id", 1))
+    )
+    user_alerts.add(sub)
+    state_store.set("price_alerts", str(sub["id"]), sub)
+    # Écrite tout de suite: le leader la voit à son prochain passage
+    await asyncio.to_thread(state_store.flush)
+    if is_new_symbol:
+        await subscribe_stream_symbol(sub["symbol"])
+    
+    price_text = f"Prix actuel: ${current['price']:,.4f}" if current else "En attente du premier prix"
+    if not sub["armed"] and ref is not None:
+        price_text += "\n⏳ Seuil déjà franchi: l'alerte partira au prochain franchissement"
+    await ctx.send(f"✅ Alerte **#{sub['id']}** créée: **{describe_alert(sub)}**\n{price_text}")
+
+@bot.command(name="alerts")
+async def cmd_alerts(ctx):
+    """Liste les alertes perso actives"""
+    await refresh_user_alerts()
+    subs = user_alerts.for_user(ctx.author.id)
+    if not subs:
+        await ctx.send("📭 Aucune alerte active. Crée-en une avec `!alert BTC > 70000`")
+        return
+    lines = [f"`#{sub['id']}` {describe_alert(sub)}" for sub in sorted(subs, key=lambda x: x["id"])]
+    embed = discord.Embed(title="🔔 Tes alertes", description="\n".join(lines), color=0x9b59b6)
+    embed.set_footer(text=f"{len(subs)}/{USER_ALERTS_MAX_PER_USER} • !alertdel <id> pour supprimer")
+    await ctx.send(embed=embed)
+
+@bot.command(name="alertdel")
+async def cmd_alertdel(ctx, alert_id: int = None):
+    """Supprime une alerte perso"""
+    await refresh_user_alerts()
+    sub = user_alerts.subs.get(alert_id)
+    is_admin = ctx.guild is not None and ctx.author.guild_permissions.administrator
+    if not sub or (sub["user_id"] != ctx.author.id and not is_admin):
+        await ctx.send("❌ Alerte introuvable.")
+        return
+    user_alerts.remove(alert_id)
+    state_store.delete("price_alerts", str(alert_id))
+    await asyncio.to_thread(state_store.flush)
+    await ctx.send(f"🗑️ Alerte **#{alert_id}** supprimée.")
+
+# ============================================================
+#     🧠 PROFIL MÉMOIRE (tracemalloc, admin)
+# ============================================================
+# Tracer dès le lancement (allocations de démarrage incluses): PYTHONTRACEMALLOC=25
+MEMPROFILE_FRAMES = int(os.getenv("MEMPROFILE_FRAMES", "25"))
+MEMPROFILE_MAX_SNAPSHOTS = int(os.getenv("MEMPROFILE_MAX_SNAPSHOTS", "6"))
+MEMPROFILE_TOP = 10
+MEMPROFILE_TYPES = 15
+MEMPROFILE_TOKEN = os.getenv("MEMPROFILE_TOKEN")  # Absent: endpoint web désactivé (404)
+MEMPROFILE_GROUPINGS = ("lineno", "filename", "traceback")
+
+def process_rss():
+    """RSS courant en octets (/proc), sinon pic via getrusage"""
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def format_bytes(size):
+    sign = "-" if size < 0 else ""
+    size = abs(size)
+    for unit in ("o", "Ko", "Mo"):
+        if size < 1024:
+            return f"{sign}{size:.0f} {unit}" if unit == "o" else f"{sign}{size:.1f} {unit}"
+        size /= 1024
+    return f"{sign}{size:.2f} Go"
+
+def tracked_structures():
+    """Tailles des structures longue durée du bot (ce qui grossit avec l'uptime)"""
+    counts = {
+        "sent_news_ids": len(sent_news_ids),
+        "sent_alert_ids": len(sent_alert_ids),
+        "price_alert_keys": len(price_alert_keys),
+        "price_push_keys": len(price_push_keys),
+        "news_clusters": len(news_clusterer.clusters),
+        "news_cluster_buckets": len(news_clusterer.buckets),
+        "news_cluster_articles": len(news_clusterer.article_cluster),
+        "timeseries_series": len(timeseries.series),
+        "timeseries_points": sum(len(buf) for buf in list(timeseries.series.values())),
+        "user_alerts": len(user_alerts),
+        "pending_alert_notifications": len(pending_alert_notifications),
+        "stream_prices": len(stream_prices),
+        "push_subscribers": len(push_hub.subscribers),
+        "api_cache": len(api_cache),
+        "http_cassette_urls": sum(len(urls) for urls in list(cassettes._cassettes.values())),
+        "llm_ledger_pending": len(llm_ledger._pending),
+        "state_pending": len(state_store._pending),
+    }
+    for namespace, size in state_store.counts().items():
+        counts[f"state:{namespace}"] = size
+    return counts
+
+def gc_type_counts():
+    """Objets vivants suivis par le GC, par type (parcours complet: quelques centaines de ms)"""
+    import gc
+    counts = {}
+    for obj in gc.get_objects():
+        name = type(obj).__qualname__
+        counts[name] = counts.get(name, 0) + 1
+    return counts
+
+def count_deltas(before, after, limit=None):
+    deltas = [(name, after.get(name, 0) - before.get(name, 0), after.get(name, 0))
+              for name in before.keys() | after.keys()]
+    deltas = sorted((d for d in deltas if d[1]), key=lambda d: -abs(d[1]))
+    return [{"name": name, "delta": delta, "count": count} for name, delta, count in deltas[:limit]]
+
+class MemoryProfiler:
+    """Snapshots tracemalloc + compteurs de nos structures, comparés dans le temps.
+
+    Le premier snapshot sert de référence et n'est jamais évincé: `diff` sans
+    argument mesure ce qui a grossi depuis. Les snapshots sont filtrés (frames
+    de tracemalloc et de l'import exclues) et gardés en mémoire, au plus
+    `max_snapshots`. Tout est sérialisable en JSON: la commande Discord et
+    l'endpoint web partagent les mêmes rapports.
+    """
+
+    FILTERS = (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    )
+
+    def __init__(self, max_snapshots=MEMPROFILE_MAX_SNAPSHOTS):
+        self.max_snapshots = max(2, max_snapshots)
+        self.snapshots = []  # [{"id", "label", "ts", "rss", "traced", "structures", "types", "snapshot"}]
+        self.next_id = 1
+        self._lock = threading.Lock()  # Appelé depuis la boucle Discord et la boucle web (via to_thread)
+
+    def start(self, frames=MEMPROFILE_FRAMES):
+        with self._lock:
+            if tracemalloc.is_tracing():
+                return self.status()
+            tracemalloc.start(max(1, min(frames, 100)))
+            print(f"[MEMPROFILE] tracemalloc démarré ({tracemalloc.get_traceback_limit()} frames)")
+            return self.status()
+
+    def stop(self):
+        with self._lock:
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+                print("[MEMPROFILE] tracemalloc arrêté")
+            self.snapshots.clear()
+            return self.status()
+
+    def status(self):
+        traced, peak = tracemalloc.get_traced_memory()
+        return {
+            "tracing": tracemalloc.is_tracing(),
+            "frames": tracemalloc.get_traceback_limit() if tracemalloc.is_tracing() else None,
+            "rss": process_rss(),
+            "traced": traced,
+            "traced_peak": peak,
+            "tracemalloc_overhead": tracemalloc.get_tracemalloc_memory(),
+            "snapshots": [self.describe(s) for s in self.snapshots],
+        }
+
+    @staticmethod
+    def describe(record):
+        return {key: record[key] for key in ("id", "label", "ts", "rss", "traced")} | {"tracemalloc": record["snapshot"] is not None}
+
+    def take(self, label=None):
+        """Snapshot tracemalloc (si actif) + RSS + compteurs; renvoie le diff avec le précédent"""
+        with self._lock:
+            snapshot = tracemalloc.take_snapshot().filter_traces(self.FILTERS) if tracemalloc.is_tracing() else None
+            record = {
+                "id": self.next_id,
+                "label": label or datetime.now(TIMEZONE).strftime("%d/%m %H:%M"),
+                "ts": systime.time(),
+                "rss": process_rss(),
+                "traced": tracemalloc.get_traced_memory()[0],
+                "structures": tracked_structures(),
+                "types": gc_type_counts(),
+                "snapshot": snapshot,
+            }
+            self.next_id += 1
+            self.snapshots.append(record)
+            if len(self.snapshots) > self.max_snapshots:
+                del self.snapshots[1]  # Garde la référence (premier snapshot)
+            previous = self.snapshots[-2] if len(self.snapshots) > 1 else None
+            print(f"[MEMPROFILE] Snapshot #{record['id']} ({format_bytes(record['rss'])} RSS)")
+        return {"snapshot": self.describe(record), "diff": self._diff(previous, record) if previous else None}
+
+    def find(self, snapshot_id):
+        for record in self.snapshots:
+            if record["id"] == snapshot_id:
+                return record
+        raise KeyError(f"snapshot #{snapshot_id} inconnu")
+
+    def top(self, limit=MEMPROFILE_TOP, group_by="lineno", snapshot_id=None):
+        """Principaux sites d'allocation encore vivants dans un snapshot (le dernier par défaut)"""
+        with self._lock:
+            if not self.snapshots:
+                raise KeyError("aucun snapshot")
+            record = self.find(snapshot_id) if snapshot_id is not None else self.snapshots[-1]
+            if record["snapshot"] is None:
+                raise KeyError(f"snapshot #{record['id']} pris sans tracemalloc")
+            stats = record["snapshot"].statistics(group_by)
+            return {
+                "snapshot": self.describe(record),
+                "group_by": group_by,
+                "total": sum(stat.size for stat in stats),
+                "sites": [self.site(stat, stat.size, stat.count) for stat in stats[:limit]],
+            }
+
+    def diff(self, from_id=None, to_id=None, limit=MEMPROFILE_TOP, group_by="lineno"):
+        """Croissance entre deux snapshots (par défaut: référence -> dernier)"""
+        with self._lock:
+            if len(self.snapshots) < 2:
+                raise KeyError("il faut au moins deux snapshots")
+            before = self.find(from_id) if from_id is not None else self.snapshots[0]
+            after = self.find(to_id) if to_id is not None else self.snapshots[-1]
+            return self._diff(before, after, limit, group_by)
+
+    def _diff(self, before, after, limit=MEMPROFILE_TOP, group_by="lineno"):
+        report = {
+            "from": self.describe(before),
+            "to": self.describe(after),
+            "elapsed_s": round(after["ts"] - before["ts"]),
+            "rss_delta": after["rss"] - before["rss"],
+            "traced_delta": after["traced"] - before["traced"],
+            "structures": count_deltas(before["structures"], after["structures"]),
+            "types": count_deltas(before["types"], after["types"], MEMPROFILE_TYPES),
+            "sites": [],
+        }
+        if before["snapshot"] is not None and after["snapshot"] is not None:
+            stats = after["snapshot"].compare_to(before["snapshot"], group_by)
+            report["sites"] = [self.site(stat, stat.size_diff, stat.count_diff, stat.size)
+                               for stat in stats[:limit] if stat.size_diff]
+        return report
+
+    @staticmethod
+    def site(stat, size, count, total=None):
+        # lineno 0: regroupement par fichier
+        frames = [frame.filename.removeprefix(os.getcwd() + os.sep) + (f":{frame.lineno}" if frame.lineno else "")
+                  for frame in stat.traceback]
+        site = {"where": frames[0], "size": size, "count": count}
+        if total is not None:
+            site["total"] = total
+        if len(frames) > 1:
+            site["traceback"] = frames
+        return site
+
+    def objects(self):
+        types = gc_type_counts()
+        return {
+            "rss": process_rss(),
+            "structures": tracked_structures(),
+            "types": [{"name": name, "count": count}
+                      for name, count in sorted(types.items(), key=lambda item: -item[1])[:MEMPROFILE_TYPES]],
+        }
+
+memory_profiler = MemoryProfiler()
+
+def memprofile_action(action, args, from_id=None, to_id=None):
+    """Dispatch commun !memprofile / /admin/memory/<action> (exécuté hors boucle).
+
+    `diff`: ids positionnels depuis Discord (`#a #b`), nommés depuis le web.
+    """
+    if action == "start":
+        return memory_profiler.start(int(args[0]) if args else MEMPROFILE_FRAMES)
+    if action == "stop":
+        return memory_profiler.stop()
+    if action in ("snap", "snapshot"):
+        return memory_profiler.take(" ".join(args) or None)
+    if action == "top":
+        limit = int(args[0]) if args else MEMPROFILE_TOP
+        group_by = args[1] if len(args) > 1 and args[1] in MEMPROFILE_GROUPINGS else "lineno"
+        return memory_profiler.top(limit, group_by)
+    if action == "diff":
+        ids = [int(a.lstrip("#")) for a in args[:2]]
+        if ids:
+            from_id = ids[0]
+        if len(ids) > 1:
+            to_id = ids[1]
+        return memory_profiler.diff(from_id=from_id, to_id=to_id)
+    if action == "objects":
+        return memory_profiler.objects()
+    return memory_profiler.status()
+
+def memprofile_site_lines(sites, signed=False):
+    lines = []
+    for site in sites:
+        size = f"{'+' if signed and site['size'] > 0 else ''}{format_bytes(site['size'])}"
+        count = f"{site['count']:+d}" if signed else str(site["count"])
+        lines.append(f"`{site['where'][-60:]}` {size} ({count} blocs)")
+    return "\n".join(lines)[:1024] or "—"
+
+def memprofile_delta_lines(deltas, limit=12):
+    return "\n".join(f"`{d['name']}` {d['delta']:+d} → {d['count']}" for d in deltas[:limit])[:1024] or "—"
+
+def memprofile_embed(action, report):
+    embed = discord.Embed(title=f"🧠 Mémoire — {action}", color=0x1abc9c)
+    if "diff" in report:  # snapshot
+        snap = report["snapshot"]
+        embed.description = f"Snapshot **#{snap['id']}** `{snap['label']}` · RSS {format_bytes(snap['rss'])}"
+        if not snap["tracemalloc"]:
+            embed.description += "\n⚠️ tracemalloc inactif: compteurs seulement (`!memprofile start`)"
+        report = report["diff"]
+        if not report:
+            return embed
+    if "rss_delta" in report:  # diff
+        embed.add_field(name="Période", value=f"#{report['from']['id']} → #{report['to']['id']} ({report['elapsed_s'] // 60} min)", inline=True)
+        embed.add_field(name="RSS", value=f"{'+' if report['rss_delta'] >= 0 else ''}{format_bytes(report['rss_delta'])}", inline=True)
+        embed.add_field(name="Tracé", value=f"{'+' if report['traced_delta'] >= 0 else ''}{format_bytes(report['traced_delta'])}", inline=True)
+        embed.add_field(name="📈 Sites d'allocation", value=memprofile_site_lines(report["sites"], signed=True), inline=False)
+        embed.add_field(name="🗂️ Structures", value=memprofile_delta_lines(report["structures"]), inline=False)
+        embed.add_field(name="🧬 Types (GC)", value=memprofile_delta_lines(report["types"]), inline=False)
+    elif "sites" in report:  # top
+        snap = report["snapshot"]
+        embed.description = f"Snapshot **#{snap['id']}** `{snap['label']}` · {format_bytes(report['total'])} tracés ({report['group_by']})"
+        embed.add_field(name="🔝 Sites d'allocation", value=memprofile_site_lines(report["sites"]), inline=False)
+    elif "structures" in report:  # objects
+        embed.description = f"RSS {format_bytes(report['rss'])}"
+        embed.add_field(name="🗂️ Structures", value="\n".join(f"`{k}` {v}" for k, v in report["structures"].items())[:1024], inline=False)
+        embed.add_field(name="🧬 Types (GC)", value="\n".join(f"`{t['name']}` {t['count']}" for t in report["types"])[:1024], inline=False)
+    else:  # status
+        state = f"✅ {report['frames']} frames" if report["tracing"] else "❌ arrêté"
+        embed.add_field(name="tracemalloc", value=state, inline=True)
+        embed.add_field(name="RSS", value=format_bytes(report["rss"]), inline=True)
+        if report["tracing"]:
+            embed.add_field(name="Tracé", value=f"{format_bytes(report['traced'])} (pic {format_bytes(report['traced_peak'])})", inline=True)
+        snaps = "\n".join(f"#{s['id']} `{s['label']}` · {format_bytes(s['rss'])}" for s in report["snapshots"])
+        embed.add_field(name="Snapshots", value=snaps or "—", inline=False)
+        embed.set_footer(text="!memprofile start|snap [label]|top [n] [lineno|filename|traceback]|diff [#a] [#b]|objects|stop")
+    return embed
+
+@bot.command(name="memprofile")
+async def cmd_memprofile(ctx, action: str = "status", *args):
+    """Profil mémoire (tracemalloc): snapshots, diff dans le temps, sites d'allocation"""
+    if not ctx.author.guild_permissions.administrator:
+        return
+    action = action.lower()
+    try:
+        report = await asyncio.to_thread(memprofile_action, action, args)
+    except (KeyError, ValueError) as e:
+        await ctx.send(f"❌ {e.args[0] if e.args else e}")
+        return
+    await ctx.send(embed=memprofile_embed(action, report))
+
+# ============================================================
+#     🌐 SERVEUR WEB (health)
+# ============================================================
+# aiohttp dans un thread dédié avec sa propre boucle: les requêtes HTTP ne
+# passent jamais par la boucle Discord. /health lit uniquement l'état en
+# mémoire (attributs du client, snapshot, tâches), sans await côté bot.
+WEB_HOST = os.getenv("WEB_HOST", "0.0.0.0")
+WEB_PORT = int(os.getenv("PORT", "8080"))
+HEALTH_GATEWAY_GRACE_SECONDS = int(os.getenv("HEALTH_GATEWAY_GRACE_SECONDS", "300"))
+
+web_loop = None
+web_started_at = None
+gateway_disconnected_at = None  # Début de la coupure gateway en cours
+
+HEALTH_TASKS = {
+    "scheduled_update": scheduled_update,
+    "realtime_news_check": realtime_news_check,
+    "realtime_price_check": realtime_price_check,
+    "realtime_opportunities_check": realtime_opportunities_check,
+    "leadership_check": leadership_check,
+    "flush_user_alerts": flush_user_alerts,
+}
+
+def seconds_since(ts, now=None):
+    if not ts:
+        return None
+    return round((now or systime.time()) - ts, 1)
+
+def task_loop_state(loop):
+    if loop.failed():
+        state = "failed"
+    elif loop.is_being_cancelled():
+        state = "stopping"
+    elif loop.is_running():
+        state = "running"
+    else:
+        state = "stopped"
+    next_run = loop.next_iteration
+    return {
+        "state": state,
+        "iterations": loop.current_loop,
+        "next_run": next_run.isoformat() if next_run else None,
+    }
+
+def gateway_latency_ms():
+    latency = bot.latency
+    if not math.isfinite(latency):
+        return None
+    return round(latency * 1000, 1)
+
+def health_report():
+    now = systime.time()
+    last_update = state_store.get("meta", "last_global_update") or {}
+    connected = bot.is_ready() and not bot.is_closed() and gateway_disconnected_at is None
+    loops = {name: task_loop_state(loop) for name, loop in HEALTH_TASKS.items()}
+
+    problems = []
+    if not connected:
+        problems.append("gateway")
+    failed = [name for name, loop in loops.items() if loop["state"] == "failed"]
+    if failed:
+        problems.append("tasks")
+
+    # Coupure gateway prolongée (ou jamais connecté après le délai): instance à redémarrer
+    down_since = gateway_disconnected_at or (None if ready_at else web_started_at)
+    healthy = not (down_since and now - down_since > HEALTH_GATEWAY_GRACE_SECONDS)
+
+    return healthy, {
+        "status": "ok" if not problems else "degraded",
+        "problems": problems,
+        "time": datetime.now(TIMEZONE).isoformat(),
+        "instance": INSTANCE_ID,
+        "leader": is_leader,
+        "uptime_s": seconds_since(web_started_at, now),
+        "gateway": {
+            "connected": connected,
+            "latency_ms": gateway_latency_ms(),
+            "guilds": len(bot.guilds),
+            "disconnected_for_s": seconds_since(gateway_disconnected_at, now),
+        },
+        "last_update": {
+            "source": last_update.get("source"),
+            "age_s": seconds_since(last_update.get("ts"), now),
+        },
+        "market_snapshot_age_s": seconds_since(market_snapshot["fetched_at"], now),
+        "price_stream": {
+            "running": price_stream_task is not None and not price_stream_task.done(),
+            "symbols": len(stream_prices),
+        },
+        "push": {
+            "clients": len(push_hub.subscribers),
+            "published": push_hub.published,
+            "dropped_ticks": push_hub.dropped,
+            "lagging_disconnects": push_hub.disconnected,
+        },
+        "event_loop": loop_monitor.report(),
+        "tasks": loops,
+        "boot": boot_report,
+    }
+
+# --- API JSON (lecture seule, depuis le snapshot en mémoire) ---
+# Chaque endpoint est sérialisé une seule fois par snapshot: les requêtes
+# suivantes renvoient les mêmes octets et le même ETag, sans appel upstream.
+API_CACHE_MAX_AGE = int(os.getenv("API_CACHE_MAX_AGE", "60"))
+API_CORS_ORIGIN = os.getenv("API_CORS_ORIGIN", "*")
+API_MOVERS_LIMIT = 20
+
+def api_market(data):
+    return {
+        "prices": data.get("prices"),
+        "global": data.get("global"),
+        "trending": [
+            {"symbol": c["item"].get("symbol"), "name": c["item"].get("name"), "rank": c["item"].get("market_cap_rank")}
+            for c in data.get("trending") or [] if "item" in c
+        ],
+        "defi": [
+            {"project": p.get("project"), "symbol": p.get("symbol"), "chain": p.get("chain"),
+             "apy": p.get("apy"), "tvl_usd": p.get("tvlUsd")}
+            for p in data.get("defi") or []
+        ],
+    }
+
+def api_movers(data):
+    scan = market_scan_of(data)
+    return {
+        "scanned": len(scan),
+        "movers": scan.details(scan.top_movers(API_MOVERS_LIMIT)),
+        "volume_anomalies": scan.details(scan.volume_anomalies(10)),
+    }
+
+def api_fear_greed(data):
+    return {"fear_greed": data.get("fear_greed")}
+
+def api_news(data):
+    return {"news": [{k: n.get(k) for k in ("id", "title", "url", "source")} for n in data.get("news") or []]}
+
+API_ENDPOINTS = {
+    "/api/market": api_market,
+    "/api/movers": api_movers,
+    "/api/fear-greed": api_fear_greed,
+    "/api/news": api_news,
+}
+api_cache = {}  # path -> (fetched_at, corps JSON, etag)
+
+def api_payload(path):
+    # fetched_at lu avant data: au pire on resérialise une fois de trop, jamais de données périmées figées
+    fetched_at = market_snapshot["fetched_at"]
+    data = market_snapshot["data"]
+    if not data:
+        return None
+    cached = api_cache.get(path)
+    if cached and cached[0] == fetched_at:
+        return cached
+    payload = {
+        "updated_at": datetime.fromtimestamp(fetched_at, TIMEZONE).isoformat(),
+        **API_ENDPOINTS[path](data),
+    }
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    etag = '"%s"' % hashlib.blake2b(body, digest_size=12).hexdigest()
+    api_cache[path] = cached = (fetched_at, body, etag)
+    return cached
+
+async def web_api(request):
+    headers = {"Access-Control-Allow-Origin": API_CORS_ORIGIN}
+    cached = api_payload(request.path)
+    if not cached:
+        headers["Retry-After"] = "60"
+        return web.json_response({"error": "snapshot indisponible"}, status=503, headers=headers)
+    fetched_at, body, etag = cached
+    headers.update({
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={API_CACHE_MAX_AGE}, stale-while-revalidate={API_CACHE_MAX_AGE * 5}",
+        "Last-Modified": email.utils.formatdate(fetched_at, usegmt=True),
+    })
+    if etag in request.headers.get("If-None-Match", ""):
+        return web.Response(status=304, headers=headers)
+    return web.Response(body=body, content_type="application/json", charset="utf-8", headers=headers)
+
+# --- Push temps réel (Server-Sent Events) ---
+PUSH_QUEUE_SIZE = int(os.getenv("PUSH_QUEUE_SIZE", "64"))
+PUSH_MAX_CLIENTS = int(os.getenv("PUSH_MAX_CLIENTS", "2000"))
+PUSH_KEEPALIVE_SECONDS = 15
+PUSH_WRITE_TIMEOUT = 30
+
+class PushSubscriber:
+    """File d'un client SSE: événements en FIFO bornée, ticks fusionnés par symbole"""
+    __slots__ = ("events", "ticks", "wakeup", "dropped", "lagging")
+
+    def __init__(self):
+        self.events = deque()
+        self.ticks = {}  # symbole -> dernière trame (un tick remplace le précédent)
+        self.wakeup = asyncio.Event()
+        self.dropped = 0
+        self.lagging = False
+
+    def offer(self, frame, key=None, limit=PUSH_QUEUE_SIZE):
+        if key is not None:
+            if key in self.ticks:
+                self.dropped += 1
+            self.ticks[key] = frame
+        elif len(self.events) >= limit:
+            self.lagging = True
+        else:
+            self.events.append(frame)
+        self.wakeup.set()
+
+    def take(self):
+        frames = list(self.events)
+        frames.extend(self.ticks.values())
+        self.events.clear()
+        self.ticks.clear()
+        self.wakeup.clear()
+        return b"".join(frames)
+
+class PushHub:
+    """Diffusion SSE vers N abonnés.
+
+    Chaque événement est encodé une seule fois (trame SSE en octets), puis la
+    même trame est déposée chez chaque abonné sur la boucle web. Contre-pression:
+    les ticks d'un même symbole sont fusionnés (seul le dernier prix part), et
+    un client qui accumule plus de PUSH_QUEUE_SIZE alertes/snapshots en retard
+    est déconnecté; il reprend au retry avec le dernier snapshot.
+    """
+
+    def __init__(self, queue_size=PUSH_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.seq = 0
+        self.last_snapshot = None
+        self.published = 0
+        self.disconnected = 0
+        self.dropped_total = 0
+
+    @property
+    def dropped(self):
+        return self.dropped_total + sum(sub.dropped for sub in self.subscribers)
+
+    def encode(self, event, data):
+        self.seq += 1
+        body = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+        return f"id: {self.seq}\nevent: {event}\ndata: {body}\n\n".encode("utf-8")
+
+    def publish(self, event, data, key=None):
+        """Appelable depuis la boucle Discord ou un thread: ne bloque jamais.
+
+        key: clé de fusion (symbole pour les ticks), None pour un événement à livrer.
+        """
+        if web_loop is None or (event != "snapshot" and not self.subscribers):
+            return
+        frame = self.encode(event, data)
+        web_loop.call_soon_threadsafe(self._broadcast, event, frame, key)
+
+    def _broadcast(self, event, frame, key):
+        self.published += 1
+        if event == "snapshot":
+            self.last_snapshot = frame
+        for sub in self.subscribers:
+            sub.offer(frame, key, self.queue_size)
+
+    def subscribe(self):
+        sub = PushSubscriber()
+        self.subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        self.subscribers.discard(sub)
+        self.dropped_total += sub.dropped
+        if sub.lagging:
+            self.disconnected += 1
+
+push_hub = PushHub()
+
+async def web_stream(request):
+    if len(push_hub.subscribers) >= PUSH_MAX_CLIENTS:
+        return web.Response(status=503, headers={"Retry-After": "30"})
+    resp = web.StreamResponse(headers={
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+        "Access-Control-Allow-Origin": API_CORS_ORIGIN,
+    })
+    await resp.prepare(request)
+    sub = push_hub.subscribe()
+    try:
+        await resp.write(b"retry: 5000\n\n")
+        if push_hub.last_snapshot:
+            await resp.write(push_hub.last_snapshot)
+        while True:
+            try:
+                await asyncio.wait_for(sub.wakeup.wait(), PUSH_KEEPALIVE_SECONDS)
+                if sub.lagging:
+                    break
+                payload = sub.take()
+            except asyncio.TimeoutError:
+                payload = b": ping\n\n"
+            # write() attend le drain du socket: un client lent n'accumule que sa propre file
+            await asyncio.wait_for(resp.write(payload), PUSH_WRITE_TIMEOUT)
+    except asyncio.TimeoutError:
+        sub.lagging = True
+    except ConnectionResetError:
+        pass
+    finally:
+        push_hub.unsubscribe(sub)
+    return resp
+
+# --- /metrics (Prometheus) ---
+# Jauges calculées au scrape, depuis l'état en mémoire
+Gauge("horizon_gateway_latency_seconds", "Latence heartbeat gateway Discord").set_function(
+    lambda: bot.latency if math.isfinite(bot.latency) else -1)
+Gauge("horizon_market_snapshot_age_seconds", "Âge du snapshot marché").set_function(
+    lambda: systime.time() - market_snapshot["fetched_at"] if market_snapshot["fetched_at"] else -1)
+Gauge("horizon_is_leader", "1 si l'instance publie (leader)").set_function(lambda: 1 if is_leader else 0)
+Gauge("horizon_push_clients", "Clients SSE connectés").set_function(lambda: len(push_hub.subscribers))
+
+async def web_metrics(request):
+    return web.Response(body=generate_latest(), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
+# --- Profil mémoire (admin: Authorization: Bearer $MEMPROFILE_TOKEN) ---
+MEMPROFILE_READ_ACTIONS = ("status", "objects", "top", "diff")
+MEMPROFILE_WRITE_ACTIONS = ("start", "stop", "snapshot")
+
+async def web_memory(request):
+    if not MEMPROFILE_TOKEN:
+        raise web.HTTPNotFound()
+    supplied = request.headers.get("Authorization", "").removeprefix("Bearer ")
+    if not hmac.compare_digest(supplied.encode(), MEMPROFILE_TOKEN.encode()):
+        return web.json_response({"error": "non autorisé"}, status=401,
+                                 headers={"WWW-Authenticate": "Bearer"})
+    action = request.match_info["action"]
+    allowed = MEMPROFILE_WRITE_ACTIONS if request.method == "POST" else MEMPROFILE_READ_ACTIONS
+    if action not in allowed:
+        raise web.HTTPNotFound()
+    query = request.query
+    if action == "top":
+        args = (query.get("limit", str(MEMPROFILE_TOP)), query.get("group_by", "lineno"))
+    elif action == "diff":
+        args = ()
+    elif action == "start":
+        args = (query["frames"],) if "frames" in query else ()
+    elif action == "snapshot":
+        args = (query["label"],) if "label" in query else ()
+    else:
+        args = ()
+    try:
+        ids = {f"{k}_id": int(query[k]) for k in ("from", "to") if k in query}
+        report = await asyncio.to_thread(memprofile_action, action, args, **ids)
+    except (KeyError, ValueError) as e:
+        return web.json_response({"error": e.args[0] if e.args else str(e)}, status=409 if isinstance(e, KeyError) else 400)
+    return web.json_response(report, headers={"Cache-Control": "no-store"})
+
+async def web_home(request):
+    return web.Response(text="Horizon Elite 2026 : Système Opérationnel ✅")
+
+async def web_health(request):
+    healthy, report = health_report()
+    return web.json_response(report, status=200 if healthy else 503,
+                             headers={"Cache-Control": "no-store"})
+
+def build_web_app():
+    web_app = web.Application()
+    web_app.router.add_get("/", web_home)
+    web_app.router.add_get("/health", web_health)
+    for path in API_ENDPOINTS:
+        web_app.router.add_get(path, web_api)
+    web_app.router.add_get("/api/stream", web_stream)
+    web_app.router.add_get("/metrics", web_metrics)
+    web_app.router.add_get("/admin/memory/{action}", web_memory)
+    web_app.router.add_post("/admin/memory/{action}", web_memory)
+    return web_app
+
+def run_web():
+    global web_loop
+    web_loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(web_loop)
+    runner = web.AppRunner(build_web_app(), access_log=None)
+    web_loop.run_until_complete(runner.setup())
+    web_loop.run_until_complete(web.TCPSite(runner, WEB_HOST, WEB_PORT).start())
+    web_loop.run_forever()
+
+def keep_alive():
+    global web_started_at
+    web_started_at = systime.time()
+    threading.Thread(target=run_web, name="web", daemon=True).start()
+    print(f"[WEB] Serveur aiohttp démarré sur le port {WEB_PORT}")
+
 # ============================================================
 #     🚀 ÉVÉNEMENTS
 # ============================================================
 @bot.event
 async def on_ready():
-    global startup_done
+    global ready_at
     
     print("\n" + "=" * 60)
     print(f"🤖 BOT CONNECTÉ: {bot.user}")
@@ -2020,28 +5131,47 @@ async def on_ready():
         ch = bot.get_channel(cid) if cid else None
         print(f"   {'✅' if ch else '❌'} {name}")
     
-    if not scheduled_update.is_running():
-        scheduled_update.start()
-    if not realtime_news_check.is_running():
-        realtime_news_check.start()
-    if not realtime_price_check.is_running():
-        realtime_price_check.start()
-    if not realtime_opportunities_check.is_running():
-        realtime_opportunities_check.start()
-    
-    print("\n✅ Tâches:")
+    # Tâches de publication: démarrées par leadership_check sur le leader uniquement
+    first_ready = ready_at is None
+    if first_ready:
+        ready_at = systime.time()
+        boot_report["ready_ms"] = round((systime.perf_counter() - BOOT_STARTED) * 1000)
+    if not leadership_check.is_running():
+        leadership_check.start()
+    start_price_stream()
+    if not flush_user_alerts.is_running():
+        flush_user_alerts.start()
+    loop_monitor.start()
+    
+    print(f"\n👑 Instance: {INSTANCE_ID} (bail {LEADER_BACKEND})")
+    print("\n✅ Tâches (leader):")
     print("   • Planifié: 8h, 12h, 18h")
     print("   • News: 45 min (délai 1h)")
     print("   • Prix: 15 min")
+    print(f"   • Flux prix: {'✅ ' + ', '.join(PRICE_STREAM_SYMBOLS) if PRICE_STREAM_ENABLED else '❌'}")
     print("   • Opportunities: 2h")
     
-    if not startup_done:
-        startup_done = True
-        print("\n🚀 Démarrage...")
-        await asyncio.sleep(5)
-        await run_global_update(source="startup")
-    
     print("\n🎯 HORIZON ELITE V4 OPÉRATIONNEL\n")
+    if first_ready:
+        print(f"[BOOT] Prêt en {boot_report['ready_ms']} ms depuis le lancement")
+        # Hors boucle et après la connexion: le premier appel Grok ne paie pas l'import
+        await asyncio.to_thread(warm_lazy_imports)
+
+@bot.event
+async def on_disconnect():
+    global gateway_disconnected_at
+    if gateway_disconnected_at is None:
+        gateway_disconnected_at = systime.time()
+
+@bot.event
+async def on_connect():
+    global gateway_disconnected_at
+    gateway_disconnected_at = None
+
+@bot.event
+async def on_resumed():
+    global gateway_disconnected_at
+    gateway_disconnected_at = None
 
 @bot.event
 async def on_error(event, *args, **kwargs):
@@ -2051,8 +5181,80 @@ async def on_error(event, *args, **kwargs):
 # ============================================================
 #     🚀 LANCEMENT
 # ============================================================
+IMPORT_DURATION = systime.perf_counter() - BOOT_STARTED
+boot_report = {"import_ms": round(IMPORT_DURATION * 1000), "init_ms": None, "stages_ms": {}, "ready_ms": None}
+
+@contextmanager
+def boot_stage(name):
+    start = systime.perf_counter()
+    try:
+        yield
+    finally:
+        boot_report["stages_ms"][name] = round((systime.perf_counter() - start) * 1000, 1)
+
+def warm_lazy_imports():
+    for name, module in LAZY_MODULES.items():
+        if module.loaded:
+            continue
+        start = systime.perf_counter()
+        try:
+            module.load()
+        except ImportError as e:
+            print(f"[BOOT] {name} indisponible: {e}")
+            continue
+        boot_report["stages_ms"][f"lazy_{name}"] = round((systime.perf_counter() - start) * 1000, 1)
+
+def init_runtime():
+    """Point d'entrée explicite de tout ce qui touche disque, threads ou logging.
+
+    L'import de bot.py se limite aux définitions (config, classes, commandes):
+    un script ou un redémarrage ne paie que ce dont il se sert. Idempotent.
+    """
+    global last_news_sent_time, leader_lease, leader_elector
+    if boot_report["init_ms"] is not None:
+        return boot_report
+    start = systime.perf_counter()
+
+    print("=" * 60)
+    print("🚀 HORIZON ELITE BOT V4 - CONFIGURATION")
+    print("=" * 60)
+    print(f"[CONFIG] DISCORD_TOKEN: {'✅' if DISCORD_TOKEN else '❌'}")
+    print(f"[CONFIG] XAI_API_KEY: {'✅' if XAI_API_KEY else '❌'}")
+    print(f"[CONFIG] LUNARCRUSH_API_KEY: {'✅' if LUNARCRUSH_API_KEY else '❌ (optionnel)'}")
+    print("=" * 60)
+    if HTTP_MODE != "live":
+        print(f"[HTTP] Mode {HTTP_MODE} ({HTTP_CASSETTE_DIR})")
+
+    with boot_stage("state"):
+        state_store.open()
+        state_store.start()
+    with boot_stage("llm_ledger"):
+        llm_ledger.open()
+        state_store.add_flush_hook(llm_ledger.flush)
+    with boot_stage("restore"):
+        sent_news_ids.load()
+        sent_alert_ids.load()
+        last_news_iso = state_store.get("meta", "last_news_sent_time")
+        last_news_sent_time = datetime.fromisoformat(last_news_iso) if last_news_iso else None
+        timeseries.load()
+        load_market_snapshot()
+        load_user_alerts()
+    with boot_stage("leader_lease"):
+        leader_lease = build_leader_lease()
+        leader_elector = LeaderElector(leader_lease, INSTANCE_ID)
+    logging.getLogger("discord.http").addHandler(rate_limit_log_handler)
+
+    boot_report["init_ms"] = round((systime.perf_counter() - start) * 1000)
+    stages = ", ".join(f"{name} {ms:g}" for name, ms in boot_report["stages_ms"].items())
+    print(f"[BOOT] Import {boot_report['import_ms']} ms | init {boot_report['init_ms']} ms ({stages})")
+    deferred = [name for name, module in LAZY_MODULES.items() if not module.loaded]
+    if deferred:
+        print(f"[BOOT] Différés au premier usage: {', '.join(deferred)}")
+    return boot_report
+
 if __name__ == "__main__":
     print("\n🚀 Démarrage Horizon Elite V4...")
+    init_runtime()
     keep_alive()
     if not DISCORD_TOKEN:
         print("❌ DISCORD_TOKEN manquant!")
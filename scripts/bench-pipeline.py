@@ -0,0 +1,496 @@
+"""
+Benchmarks du pipeline data -> digest -> publication du bot.
+
+Les appels HTTP sont servis depuis des fixtures (enregistrées avec --record,
+sinon générées de façon déterministe au format des vraies API), Discord et
+Grok sont remplacés par des puits factices. Aucun appel réseau.
+
+Usage:
+    python scripts/bench-pipeline.py                          # tous les benchs
+    python scripts/bench-pipeline.py --quick -o bench.json    # tailles réduites, résultats JSON
+    python scripts/bench-pipeline.py --only movers,news       # filtre par nom
+    python scripts/bench-pipeline.py --compare base.json bench.json
+    python scripts/bench-pipeline.py --record scripts/bench-fixtures   # capture les vraies réponses
+    python scripts/bench-pipeline.py --cassettes cassettes    # fetchers rejoués depuis les cassettes HTTP du bot
+
+Avec --cassettes, les étapes qui font des appels HTTP passent par le mode
+HTTP_MODE=replay du bot. HTTP_REPLAY_LATENCY et HTTP_REPLAY_ERROR_RATE sont
+lus dans l'environnement. Ces étapes sont mesurées à la taille enregistrée.
+
+Les entrées sont mises à l'échelle (50 -> 5000 coins, 15 -> 1000 news) pour
+montrer la croissance de chaque étape; check_and_send_urgent_news varie le
+nombre de news urgentes (0 -> 10) parmi les 10 qu'il traite.
+"""
+import argparse
+import asyncio
+import contextlib
+import copy
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COIN_SIZES = (50, 500, 5000)
+NEWS_SIZES = (15, 100, 1000)
+POOL_SIZES = (1000, 5000, 20000)
+POST_SIZES = (1, 10, 100)  # Multiplicateur de longueur de la réponse Grok
+# check_and_send_urgent_news ne lit que les 10 premières news: ce qui varie,
+# c'est le nombre d'entre elles qui sont urgentes (Grok + envoi chacune)
+URGENT_SIZES = (0, 3, 10)
+QUICK_COIN_SIZES = (50, 500)
+QUICK_NEWS_SIZES = (15, 100)
+QUICK_POOL_SIZES = (1000,)
+QUICK_POST_SIZES = (1, 10)
+
+# Fixtures: nom de fichier -> URL réelle (pour --record)
+FIXTURE_URLS = {
+    "price.json": "https://api.coingecko.com/api/v3/simple/price?ids=bitcoin,ethereum&vs_currencies=usd&include_24hr_change=true",
+    "global.json": "https://api.coingecko.com/api/v3/global",
+    "fng.json": "https://api.alternative.me/fng/?limit=7",
+    "news.json": "https://min-api.cryptocompare.com/data/v2/news/?lang=EN&sortOrder=latest",
+    "markets.json": "https://api.coingecko.com/api/v3/coins/markets?vs_currency=usd&order=market_cap_desc&per_page=250&page=1&sparkline=false&price_change_percentage=1h,24h,7d",
+    "trending.json": "https://api.coingecko.com/api/v3/search/trending",
+    "pools.json": "https://yields.llama.fi/pools",
+}
+
+NEWS_TITLES = [
+    "Bitcoin ETF approved by regulators as inflows surge",
+    "Ethereum developers schedule next network upgrade",
+    "Exchange hack: hackers drain hot wallet, million stolen",
+    "SEC sues major crypto platform over unregistered securities",
+    "Solana DeFi volume hits record high",
+    "Stablecoin supply grows for the third straight month",
+    "Bridge hack drains liquidity from cross-chain protocol",
+    "Analysts see bitcoin consolidating before next move",
+]
+
+
+# ============================================================
+#                    FIXTURES
+# ============================================================
+def synthetic_fixtures(rng):
+    coins = []
+    for i in range(250):
+        price = 10 ** rng.uniform(-3, 4.5)
+        mcap = 10 ** rng.uniform(7, 12)
+        coins.append({
+            "id": f"coin-{i}",
+            "symbol": f"c{i}",
+            "name": f"Coin {i}",
+            "current_price": price,
+            "market_cap": mcap,
+            "total_volume": mcap * 10 ** rng.uniform(-3, 0),
+            "price_change_percentage_24h": rng.gauss(0, 6),
+            "price_change_percentage_1h_in_currency": rng.gauss(0, 1),
+            "price_change_percentage_7d_in_currency": rng.gauss(0, 12),
+        })
+    news = [{
+        "id": 1000 + i,
+        "title": NEWS_TITLES[i % len(NEWS_TITLES)] + f" ({i})",
+        "body": "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 10,
+        "url": f"https://example.com/news/{i}",
+        "source": f"source{i % 6}",
+    } for i in range(50)]
+    pools = [{
+        "pool": f"pool-{i}",
+        "project": f"project{i % 40}",
+        "chain": ("Ethereum", "Arbitrum", "Solana", "Base")[i % 4],
+        "symbol": f"TOK{i}-USDC",
+        "apy": 10 ** rng.uniform(-1, 2.5),
+        "tvlUsd": 10 ** rng.uniform(4, 9.5),
+    } for i in range(1000)]
+    return {
+        "price.json": {"bitcoin": {"usd": 97000.0, "usd_24h_change": 1.8}, "ethereum": {"usd": 3500.0, "usd_24h_change": -0.7}},
+        "global.json": {"data": {
+            "total_market_cap": {"usd": 3.4e12},
+            "market_cap_percentage": {"btc": 56.2, "eth": 12.1},
+            "market_cap_change_percentage_24h_usd": 1.2,
+        }},
+        "fng.json": {"data": [{"value": str(40 + i), "value_classification": "Fear"} for i in range(7)]},
+        "news.json": {"Data": news},
+        "markets.json": coins,
+        "trending.json": {"coins": [{"item": {"symbol": f"T{i}", "name": f"Trend {i}", "market_cap_rank": i + 1}} for i in range(7)]},
+        "pools.json": {"data": pools},
+    }
+
+
+def load_fixtures(directory, rng):
+    fixtures = synthetic_fixtures(rng)
+    if directory:
+        for name in FIXTURE_URLS:
+            path = os.path.join(directory, name)
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    fixtures[name] = json.load(f)
+    return fixtures
+
+
+def record_fixtures(directory):
+    import requests
+    os.makedirs(directory, exist_ok=True)
+    for name, url in FIXTURE_URLS.items():
+        r = requests.get(url, timeout=30)
+        r.raise_for_status()
+        with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+            json.dump(r.json(), f)
+        print(f"[BENCH] {name}: {len(r.content) // 1024} KB")
+
+
+def scale_items(items, n, rng, key_fields):
+    """Répète les items de base jusqu'à n, avec des identifiants uniques et du bruit sur les valeurs"""
+    out = []
+    for i in range(n):
+        item = copy.copy(items[i % len(items)])
+        for field in key_fields:
+            item[field] = f"{item.get(field, '')}-{i}"
+        for field, value in item.items():
+            if isinstance(value, float):
+                item[field] = value * rng.uniform(0.9, 1.1)
+        out.append(item)
+    return out
+
+
+class Fixtures:
+    """Sert les réponses HTTP encodées (le décodage JSON fait partie de la mesure)"""
+
+    def __init__(self, base, rng):
+        self.base = base
+        self.rng = rng
+        self.payloads = {name: json.dumps(value).encode() for name, value in base.items()}
+        self.coins = []
+        self.pages = {}
+
+    def set_coins(self, n):
+        self.coins = scale_items(self.base["markets.json"], n, self.rng, ("id", "symbol"))
+        self.pages = {}
+
+    def set_pools(self, n):
+        pools = scale_items(self.base["pools.json"]["data"], n, self.rng, ("pool",))
+        self.payloads["pools.json"] = json.dumps({"data": pools}).encode()
+
+    def news(self, n):
+        return [{
+            "id": str(item["id"]), "title": item["title"], "body": item.get("body", "")[:400],
+            "url": item.get("url", ""), "source": item.get("source", ""),
+        } for item in scale_items(self.base["news.json"]["Data"], n, self.rng, ("id", "title"))]
+
+    def body_for(self, url):
+        if "coins/markets" in url:
+            query = dict(p.split("=", 1) for p in url.split("?", 1)[1].split("&"))
+            key = int(query.get("per_page", 250)), int(query.get("page", 1))
+            if key not in self.pages:
+                per_page, page = key
+                self.pages[key] = json.dumps(self.coins[(page - 1) * per_page:page * per_page]).encode()
+            return self.pages[key]
+        for name, real_url in FIXTURE_URLS.items():
+            if url.split("?")[0] == real_url.split("?")[0]:
+                return self.payloads[name]
+        return None
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self.content = body or b"{}"
+        self.status_code = 200 if body is not None else 404
+
+    def json(self):
+        return json.loads(self.content)
+
+
+# ============================================================
+#                    PUITS DISCORD / GROK
+# ============================================================
+class FakeChannel:
+    def __init__(self, channel_id):
+        self.id = channel_id
+        self.sent = 0
+
+    async def send(self, content=None, **kwargs):
+        self.sent += 1
+        return None
+
+
+SOCIAL_REPLY = (
+    "Voici les posts.\n===TWITTER===\n" + "Le marché respire, toi aussi. #Crypto #Bitcoin https://example.com " * 3 +
+    "\n===INSTAGRAM===\n" + "Il y a un an, j'avais peur d'acheter mon premier bitcoin... " * 12 +
+    "\n===LINKEDIN===\n" + "La volatilité n'est pas le risque, l'improvisation l'est.\n\n" * 10
+)
+
+
+class FakeUsage:
+    prompt_tokens = 400
+    completion_tokens = 120
+
+
+class FakeCompletions:
+    def __init__(self):
+        self.calls = 0
+
+    def create(self, messages=None, max_tokens=0, **kwargs):
+        self.calls += 1
+        text = SOCIAL_REPLY if max_tokens >= 1200 else "🟢 Analyse factice: momentum neutre, surveiller les supports. NFA-DYOR"
+        message = type("Message", (), {"content": text})()
+        choice = type("Choice", (), {"message": message})()
+        return type("Response", (), {"choices": [choice], "usage": FakeUsage()})()
+
+
+class FakeXAI:
+    def __init__(self):
+        self.chat = type("Chat", (), {"completions": FakeCompletions()})()
+
+
+# ============================================================
+#                    MESURE
+# ============================================================
+def measure(fn, repeat, min_time):
+    """Comme timeit.autorange: calibre le nombre d'appels par mesure, puis répète"""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1000:
+            break
+        number *= 2 if elapsed == 0 else max(2, min(10, int(min_time / elapsed) + 1))
+    samples = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number)
+    return number, samples
+
+
+class Bench:
+    def __init__(self, args):
+        self.args = args
+        self.results = []
+        self.loop = asyncio.new_event_loop()
+
+    def run(self, name, size, fn, setup=None):
+        if self.args.only and not any(key in name for key in self.args.only):
+            return
+        if setup:
+            setup()
+        with contextlib.redirect_stdout(io.StringIO()):
+            number, samples = measure(fn, self.args.repeat, self.args.min_time)
+        result = {
+            "name": name,
+            "size": size,
+            "number": number,
+            "repeat": len(samples),
+            "min_s": min(samples),
+            "median_s": statistics.median(samples),
+            "mean_s": statistics.fmean(samples),
+            "stdev_s": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        }
+        self.results.append(result)
+        print(f"{name:<28} {size:>7}  median {format_seconds(result['median_s']):>10}  min {format_seconds(result['min_s']):>10}  (x{number})", flush=True)
+
+    def run_async(self, name, size, coro_fn, setup=None):
+        self.run(name, size, lambda: self.loop.run_until_complete(coro_fn()), setup)
+
+
+def format_seconds(seconds):
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f} µs"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds:.3f} s"
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+# ============================================================
+#                    BENCHMARKS
+# ============================================================
+def import_bot(state_dir):
+    os.environ["STATE_DIR"] = state_dir
+    os.environ.setdefault("STATE_FLUSH_SECONDS", "3600")
+    sys.path.insert(0, ROOT)
+    with contextlib.redirect_stdout(io.StringIO()):
+        import bot
+        bot.init_runtime()
+    return bot
+
+
+def install_sinks(bot, fixtures, replay=False):
+    if not replay:
+        bot.requests.get = lambda url, **kwargs: FakeResponse(fixtures.body_for(url))
+    bot.client_xai = FakeXAI()
+    # Broadcasts autorisés: l'instance du bench tient le bail indéfiniment
+    bot.is_leader = True
+    bot.leader_elector.valid_until = float("inf")
+    channels = {}
+    for i, name in enumerate(bot.CHANNELS):
+        bot.CHANNELS[name] = 1000 + i
+        channels[1000 + i] = FakeChannel(1000 + i)
+    bot.bot.get_channel = channels.get
+
+    real_sleep = asyncio.sleep
+
+    async def no_sleep(delay, result=None):
+        await real_sleep(0)
+        return result
+    asyncio.sleep = no_sleep
+
+
+def urgent_news(bot, news, urgent_count):
+    """Les `urgent_count` premières news contiennent un mot-clé urgent, les autres aucun"""
+    news = copy.deepcopy(news)
+    for i, article in enumerate(news):
+        if i < urgent_count:
+            article["title"] = f"{bot.URGENT_KEYWORDS[i % len(bot.URGENT_KEYWORDS)]}: {article['title']}"
+        elif bot.is_urgent_article(article):
+            article["title"] = f"Market recap {article['id']}"
+    return news
+
+
+def run_benchmarks(bot, fixtures, bench, sizes, replay=False):
+    coin_sizes, news_sizes, pool_sizes, post_sizes = sizes
+    bot.MARKET_SCAN_ENABLED = True
+    # En replay, la taille des réponses HTTP est celle des cassettes
+    fetch_sizes = ("replay",) if replay else coin_sizes
+
+    for n in fetch_sizes:
+        def setup(n=n):
+            if not replay:
+                fixtures.set_coins(n)
+                bot.MARKET_SCAN_SIZE = n
+        bench.run("fetch_all_market_data", n, bot.fetch_all_market_data, setup)
+
+    for n in ("replay",) if replay else pool_sizes:
+        bench.run("get_defi_yields", n, bot.get_defi_yields, None if replay else lambda n=n: fixtures.set_pools(n))
+
+    for n in coin_sizes:
+        fixtures.set_coins(n)
+        coins = fixtures.coins
+        bench.run("get_movers_details", n, lambda coins=coins: bot.get_movers_details(coins, 8))
+
+    for n in news_sizes:
+        news = bot.news_clusterer.group(fixtures.news(n))
+        bench.run("urgent_keyword_match", n, lambda news=news: [a for a in news if bot.is_urgent_article(a)])
+
+    for n in news_sizes:
+        news = fixtures.news(n)
+        bench.run("news_clustering", n, lambda news=news: bot.NewsClusterer().group(news))
+
+    for n in URGENT_SIZES:
+        news = urgent_news(bot, fixtures.news(10), n)
+
+        def setup_urgent():
+            bot.news_clusterer = bot.NewsClusterer()
+
+        async def urgent(news=news):
+            bot.sent_alert_ids = bot.DedupStore("bench_alerts")
+            await bot.check_and_send_urgent_news(news)
+        bench.run_async("check_and_send_urgent_news", n, urgent, setup_urgent)
+
+    linkedin = SOCIAL_REPLY.split("===LINKEDIN===")[1]
+    for n in post_sizes:
+        posts = SOCIAL_REPLY + linkedin * (n - 1)
+        bench.run("parse_social_sections", len(posts), lambda posts=posts: bot.parse_social_sections(posts, bot.SOCIAL_POST_MARKERS))
+
+    for n in fetch_sizes:
+        def setup_update(n=n):
+            if not replay:
+                fixtures.set_coins(n)
+                fixtures.set_pools(len(fixtures.base["pools.json"]["data"]))
+                bot.MARKET_SCAN_SIZE = n
+
+        async def update():
+            bot.sent_news_ids = bot.DedupStore("bench_news")
+            bot.sent_alert_ids = bot.DedupStore("bench_alerts")
+            bot.news_clusterer = bot.NewsClusterer()
+            await bot.run_global_update("bench")
+        bench.run_async("run_global_update", n, update, setup_update)
+
+
+def compare(base_path, new_path):
+    with open(base_path, encoding="utf-8") as f:
+        base = {(r["name"], r["size"]): r for r in json.load(f)["results"]}
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)["results"]
+    print(f"{'bench':<28} {'taille':>7}  {'base':>10}  {'nouveau':>10}  ratio")
+    for r in new:
+        old = base.get((r["name"], r["size"]))
+        if not old:
+            continue
+        ratio = r["median_s"] / old["median_s"] if old["median_s"] else float("inf")
+        flag = "  ⚠️" if ratio > 1.1 else ("  ✅" if ratio < 0.9 else "")
+        print(f"{r['name']:<28} {r['size']:>7}  {format_seconds(old['median_s']):>10}  {format_seconds(r['median_s']):>10}  x{ratio:.2f}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks du pipeline Horizon Elite")
+    parser.add_argument("-o", "--output", help="Écrit les résultats en JSON")
+    parser.add_argument("--fixtures", default=os.path.join(ROOT, "scripts", "bench-fixtures"),
+                        help="Dossier de fixtures enregistrées (sinon générées)")
+    parser.add_argument("--record", metavar="DIR", help="Enregistre les vraies réponses API dans DIR et quitte")
+    parser.add_argument("--cassettes", metavar="DIR", help="Rejoue les appels HTTP depuis les cassettes du bot (HTTP_MODE=replay)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="Compare deux fichiers de résultats")
+    parser.add_argument("--quick", action="store_true", help="Tailles réduites")
+    parser.add_argument("--only", type=lambda s: s.split(","), help="Benchs dont le nom contient l'un de ces mots")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="Durée minimale d'une mesure (s)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.record:
+        record_fixtures(args.record)
+        return
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    rng = random.Random(args.seed)
+    fixtures = Fixtures(load_fixtures(args.fixtures if os.path.isdir(args.fixtures) else None, rng), rng)
+    sizes = (QUICK_COIN_SIZES, QUICK_NEWS_SIZES, QUICK_POOL_SIZES, QUICK_POST_SIZES) if args.quick else \
+        (COIN_SIZES, NEWS_SIZES, POOL_SIZES, POST_SIZES)
+
+    if args.cassettes:
+        os.environ["HTTP_MODE"] = "replay"
+        os.environ["HTTP_CASSETTE_DIR"] = args.cassettes
+
+    with tempfile.TemporaryDirectory() as state_dir:
+        bot = import_bot(state_dir)
+        install_sinks(bot, fixtures, replay=bool(args.cassettes))
+        bench = Bench(args)
+        run_benchmarks(bot, fixtures, bench, sizes, replay=bool(args.cassettes))
+
+    if args.output:
+        report = {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "revision": git_revision(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "seed": args.seed,
+                "quick": args.quick,
+                "cassettes": args.cassettes,
+                "replay_latency": os.getenv("HTTP_REPLAY_LATENCY") if args.cassettes else None,
+                "replay_error_rate": os.getenv("HTTP_REPLAY_ERROR_RATE") if args.cassettes else None,
+            },
+            "results": bench.results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"[BENCH] Résultats: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
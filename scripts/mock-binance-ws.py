@@ -0,0 +1,82 @@
+"""
+Faux serveur WebSocket Binance pour tester le flux prix du bot en local.
+
+Usage:
+    python scripts/mock-binance-ws.py --port 8765 --crash-after 20
+    PRICE_STREAM_URL=ws://localhost:8765/stream python bot.py
+
+Émet un message ticker_1h par symbole et par seconde (format flux combiné),
+avec une marche aléatoire. --crash-after N simule un flash crash de -6%
+sur BTC après N secondes pour vérifier le déclenchement des alertes.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from aiohttp import web
+
+BASE_PRICES = {"BTC": 97000.0, "ETH": 3500.0, "SOL": 190.0}
+
+
+def ticker_payload(symbol, price, open_price):
+    change_pct = (price - open_price) / open_price * 100
+    return json.dumps({
+        "stream": f"{symbol.lower()}usdt@ticker_1h",
+        "data": {
+            "e": "1hTicker",
+            "E": int(time.time() * 1000),
+            "s": f"{symbol}USDT",
+            "o": f"{open_price:.2f}",
+            "c": f"{price:.2f}",
+            "P": f"{change_pct:.3f}",
+        },
+    })
+
+
+async def stream_handler(request):
+    ws = web.WebSocketResponse(heartbeat=30)
+    await ws.prepare(request)
+
+    streams = request.query.get("streams", "btcusdt@ticker_1h")
+    symbols = [s.split("usdt@")[0].upper() for s in streams.split("/") if "usdt@" in s]
+    prices = {s: BASE_PRICES.get(s, 100.0) for s in symbols}
+    opens = dict(prices)
+    crash_after = request.app["crash_after"]
+    started = time.monotonic()
+    crashed = False
+    print(f"[MOCK] Client connecté: {symbols}")
+
+    try:
+        while not ws.closed:
+            if crash_after and not crashed and time.monotonic() - started >= crash_after and "BTC" in prices:
+                prices["BTC"] *= 0.94
+                crashed = True
+                print("[MOCK] 💥 Flash crash BTC -6%")
+            for symbol in symbols:
+                prices[symbol] *= 1 + random.uniform(-0.0005, 0.0005)
+                await ws.send_str(ticker_payload(symbol, prices[symbol], opens[symbol]))
+            await asyncio.sleep(request.app["interval"])
+    except ConnectionResetError:
+        pass
+    print("[MOCK] Client déconnecté")
+    return ws
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Faux flux ticker Binance")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--interval", type=float, default=1.0)
+    parser.add_argument("--crash-after", type=float, default=0)
+    args = parser.parse_args()
+
+    app = web.Application()
+    app["interval"] = args.interval
+    app["crash_after"] = args.crash_after
+    app.router.add_get("/stream", stream_handler)
+    web.run_app(app, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
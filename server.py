@@ -1,20 +1,479 @@
 import http.server
-import socketserver
 import os
+import sys
+import gzip
+import hashlib
+import threading
+import time
+import email.utils
+import urllib.parse
+import uuid
+from collections import OrderedDict
+
+try:
+    import brotli  # Optionnel: pip install brotli
+except ImportError:
+    brotli = None
 
 PORT = 3000
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Cache mémoire: les pages (index.html ~90 KB) ne sont relues que si elles changent
+CACHE_MAX_FILE_SIZE = 2 * 1024 * 1024
+CACHE_MAX_TOTAL_SIZE = 64 * 1024 * 1024
+
+
+# Compression: variantes .br/.gz générées par `python server.py --precompress`,
+# sinon compressées à la volée une seule fois par version de fichier
+COMPRESSIBLE_EXTENSIONS = (".html", ".css", ".js", ".json", ".svg", ".xml", ".txt", ".webmanifest")
+PRECOMPRESS_DIRS = (".", "css", "js")
+MIN_COMPRESS_SIZE = 1024
+
+
+def compress(content, encoding):
+    if encoding == "br":
+        return brotli.compress(content, quality=11)
+    return gzip.compress(content, compresslevel=9, mtime=0)
+
+
+def supported_encodings():
+    return ("br", "gzip") if brotli else ("gzip",)
+
+
+def negotiate_encoding(accept_encoding):
+    """Meilleur encodage accepté (br > gzip), None pour identity"""
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    for encoding in supported_encodings():
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+class CacheEntry:
+    __slots__ = ("content", "etag", "mtime", "size", "last_modified", "content_type", "compressible", "variants", "_lock")
+
+    def __init__(self, path, content, st, content_type):
+        self.content = content
+        self.mtime = st.st_mtime_ns
+        self.size = st.st_size
+        self.etag = '"%s"' % hashlib.blake2b(content, digest_size=16).hexdigest()
+        self.last_modified = email.utils.formatdate(st.st_mtime, usegmt=True)
+        self.content_type = content_type
+        self.compressible = path.endswith(COMPRESSIBLE_EXTENSIONS) and st.st_size >= MIN_COMPRESS_SIZE
+        self.variants = {}
+        self._lock = threading.Lock()
+        if self.compressible:
+            self.load_precompressed(path)
+
+    def load_precompressed(self, path):
+        for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+            try:
+                st = os.stat(path + suffix)
+                if st.st_mtime_ns < self.mtime:
+                    continue  # Variante périmée: recompressée à la volée
+                with open(path + suffix, "rb") as f:
+                    self.variants[encoding] = f.read()
+            except OSError:
+                continue
+
+    def variant(self, encoding):
+        """Corps compressé pour `encoding` (précompressé ou calculé puis mis en cache)"""
+        body = self.variants.get(encoding)
+        if body is None:
+            with self._lock:
+                body = self.variants.get(encoding)
+                if body is None:
+                    body = self.variants[encoding] = compress(self.content, encoding)
+        return body
+
+    def variant_etag(self, encoding):
+        return self.etag if encoding is None else f'{self.etag[:-1]}-{encoding}"'
+
+
+class FileCache:
+    """Cache LRU des fichiers statiques, invalidé par (mtime, taille)"""
+
+    def __init__(self, max_file_size=CACHE_MAX_FILE_SIZE, max_total_size=CACHE_MAX_TOTAL_SIZE):
+        self.max_file_size = max_file_size
+        self.max_total_size = max_total_size
+        self._entries = OrderedDict()
+        self._total_size = 0
+        self._lock = threading.Lock()
+
+    def get(self, path, st, content_type):
+        """Entrée à jour pour `path`, None si le fichier est trop gros pour le cache"""
+        if st.st_size > self.max_file_size:
+            return None
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry and entry.mtime == st.st_mtime_ns and entry.size == st.st_size:
+                self._entries.move_to_end(path)
+                return entry
+
+        with open(path, "rb") as f:
+            content = f.read()
+        entry = CacheEntry(path, content, st, content_type)
+
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old:
+                self._total_size -= len(old.content)
+            self._entries[path] = entry
+            self._total_size += len(content)
+            while self._total_size > self.max_total_size and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._total_size -= len(evicted.content)
+        return entry
+
+
+file_cache = FileCache()
+
+
+class DiskEntry:
+    """Fichier trop gros pour le cache: métadonnées seulement, corps envoyé par sendfile"""
+    __slots__ = ("path", "content", "etag", "mtime", "size", "last_modified", "content_type", "compressible")
+
+    def __init__(self, path, st, content_type):
+        self.path = path
+        self.content = None
+        self.mtime = st.st_mtime_ns
+        self.size = st.st_size
+        self.etag = '"%x-%x"' % (st.st_mtime_ns, st.st_size)
+        self.last_modified = email.utils.formatdate(st.st_mtime, usegmt=True)
+        self.content_type = content_type
+        self.compressible = False
+
+    def variant_etag(self, encoding):
+        return self.etag
+
+
+MAX_RANGES = 16
+
+
+def parse_range(header, size):
+    """Plages (début, fin incluse) d'un header Range.
+
+    None: header absent/invalide (réponse 200 complète), []: non satisfiable (416).
+    """
+    if not header or not header.startswith("bytes="):
+        return None
+    ranges = []
+    for spec in header[6:].split(","):
+        start, sep, end = spec.strip().partition("-")
+        if not sep:
+            return None
+        try:
+            if not start:
+                length = int(end)
+                # Fichier vide: aucune plage suffixe satisfiable (416 bytes */0)
+                if length <= 0 or size == 0:
+                    continue
+                ranges.append((max(size - length, 0), size - 1))
+                continue
+            first = int(start)
+            last = int(end) if end else None
+        except ValueError:
+            return None
+        if last is not None and first > last:
+            return None
+        if first < size:
+            ranges.append((first, size - 1 if last is None else min(last, size - 1)))
+    if len(ranges) > MAX_RANGES:
+        return None
+    return ranges
+
+
+ROUTE_REFRESH_SECONDS = 2
+ROUTE_SKIP_DIRS = {"node_modules", "__pycache__"}
+
+
+class RouteTable:
+    """Table des URLs propres (/offres -> /offres.html) construite au démarrage.
+
+    Un thread surveille le mtime des dossiers scannés (ajout, suppression,
+    renommage de page) et reconstruit la table; le lookup reste un accès dict.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.routes = {}
+        self._dir_mtimes = {}
+        self.rebuild()
+
+    def rebuild(self):
+        routes, dir_mtimes = {}, {}
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".") and d not in ROUTE_SKIP_DIRS]
+            dir_mtimes[dirpath] = os.stat(dirpath).st_mtime_ns
+            rel_dir = os.path.relpath(dirpath, self.root).replace(os.sep, "/")
+            prefix = "/" if rel_dir == "." else f"/{rel_dir}/"
+            for name in filenames:
+                if not name.endswith(".html"):
+                    continue
+                target = prefix + name
+                routes[prefix + name[:-5]] = target
+                if name == "index.html":
+                    routes[prefix] = target
+        self.routes = routes
+        self._dir_mtimes = dir_mtimes
+
+    def changed(self):
+        for dirpath, mtime in self._dir_mtimes.items():
+            try:
+                if os.stat(dirpath).st_mtime_ns != mtime:
+                    return True
+            except OSError:
+                return True
+        return False
+
+    def watch(self):
+        def loop():
+            while True:
+                time.sleep(ROUTE_REFRESH_SECONDS)
+                if self.changed():
+                    self.rebuild()
+                    print(f"[ROUTES] Table reconstruite ({len(self.routes)} routes)")
+        threading.Thread(target=loop, name="route-watch", daemon=True).start()
+
+    def lookup(self, path):
+        return self.routes.get(path)
+
+
+route_table = RouteTable(ROOT)
+
 
 class CleanUrlHandler(http.server.SimpleHTTPRequestHandler):
+    # Keep-alive: les assets d'une page passent par la même connexion
+    protocol_version = "HTTP/1.1"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, directory=ROOT, **kwargs)
+
     def do_GET(self):
-        # If the path doesn't have an extension and isn't a directory, try adding .html
-        if '.' not in self.path and not self.path.endswith('/'):
-            if os.path.exists(self.path[1:] + '.html'):
-                self.path += '.html'
-        return http.server.SimpleHTTPRequestHandler.do_GET(self)
+        self.serve(head_only=False)
+
+    def do_HEAD(self):
+        self.serve(head_only=True)
+
+    def resolve_clean_url(self):
+        # /offres, /offres?x=1 -> /offres.html via la table précalculée (aucun appel disque)
+        url = urllib.parse.urlsplit(self.path)
+        target = route_table.lookup(urllib.parse.unquote(url.path))
+        if target:
+            self.path = target + ("?" + url.query if url.query else "")
+
+    def serve(self, head_only):
+        self.resolve_clean_url()
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            index = os.path.join(path, "index.html")
+            if not self.path.split("?", 1)[0].endswith("/") or not os.path.isfile(index):
+                # Redirection / listing gérés par SimpleHTTPRequestHandler
+                return super().do_HEAD() if head_only else super().do_GET()
+            path = index
+
+        try:
+            st = os.stat(path)
+            content_type = self.guess_type(path)
+            entry = file_cache.get(path, st, content_type) or DiskEntry(path, st, content_type)
+        except OSError:
+            self.send_error(404, "File not found")
+            return
+
+        encoding = negotiate_encoding(self.headers.get("Accept-Encoding")) if entry.compressible else None
+
+        if self.not_modified(entry, encoding):
+            self.send_response(304)
+            self.send_validators(entry, encoding)
+            self.end_headers()
+            return
+
+        # Range: toujours sur la représentation non compressée
+        ranges = self.requested_ranges(entry)
+        if ranges == []:
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{entry.size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if ranges:
+            self.send_partial(entry, ranges, head_only)
+            return
+
+        body = entry.variant(encoding) if encoding else entry.content
+        self.send_response(200)
+        self.send_header("Content-Type", entry.content_type)
+        self.send_header("Content-Length", str(len(body) if body is not None else entry.size))
+        self.send_header("Accept-Ranges", "bytes")
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        self.send_validators(entry, encoding)
+        self.end_headers()
+        if head_only:
+            return
+        if body is not None:
+            self.wfile.write(body)
+        else:
+            self.write_file_range(entry, 0, entry.size)
+
+    def requested_ranges(self, entry):
+        ranges = parse_range(self.headers.get("Range"), entry.size)
+        if ranges is None:
+            return None
+        # If-Range: la plage n'est valable que si la ressource n'a pas changé
+        if_range = self.headers.get("If-Range")
+        if if_range and if_range.strip() not in (entry.etag, entry.last_modified):
+            return None
+        return ranges
+
+    def send_partial(self, entry, ranges, head_only):
+        self.send_response(206)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_validators(entry)
+
+        if len(ranges) == 1:
+            start, end = ranges[0]
+            self.send_header("Content-Type", entry.content_type)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{entry.size}")
+            self.send_header("Content-Length", str(end - start + 1))
+            self.end_headers()
+            if not head_only:
+                self.write_range(entry, start, end - start + 1)
+            return
+
+        boundary = uuid.uuid4().hex
+        part_headers = [
+            (f"--{boundary}\r\nContent-Type: {entry.content_type}\r\n"
+             f"Content-Range: bytes {start}-{end}/{entry.size}\r\n\r\n").encode("latin-1")
+            for start, end in ranges
+        ]
+        closing = f"\r\n--{boundary}--\r\n".encode("latin-1")
+        length = sum(len(h) for h in part_headers) + sum(end - start + 1 for start, end in ranges)
+        length += 2 * (len(ranges) - 1) + len(closing)
+        self.send_header("Content-Type", f"multipart/byteranges; boundary={boundary}")
+        self.send_header("Content-Length", str(length))
+        self.end_headers()
+        if head_only:
+            return
+        for i, ((start, end), header) in enumerate(zip(ranges, part_headers)):
+            if i:
+                self.wfile.write(b"\r\n")
+            self.wfile.write(header)
+            self.write_range(entry, start, end - start + 1)
+        self.wfile.write(closing)
+
+    def write_range(self, entry, start, length):
+        if entry.content is not None:
+            self.wfile.write(memoryview(entry.content)[start:start + length])
+        else:
+            self.write_file_range(entry, start, length)
+
+    def write_file_range(self, entry, offset, length):
+        """Copie zéro-copie noyau -> socket (os.sendfile), repli sur read/write sinon"""
+        with open(entry.path, "rb") as f:
+            if hasattr(os, "sendfile"):
+                try:
+                    out_fd = self.connection.fileno()
+                    while length > 0:
+                        sent = os.sendfile(out_fd, f.fileno(), offset, length)
+                        if sent == 0:
+                            break
+                        offset += sent
+                        length -= sent
+                    return
+                except (OSError, ValueError, AttributeError):
+                    pass  # Socket non compatible (TLS...): repli ci-dessous
+            f.seek(offset)
+            while length > 0:
+                chunk = f.read(min(length, 64 * 1024))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                length -= len(chunk)
+
+    def send_validators(self, entry, encoding=None):
+        self.send_header("ETag", entry.variant_etag(encoding))
+        self.send_header("Last-Modified", entry.last_modified)
+        if entry.compressible:
+            self.send_header("Vary", "Accept-Encoding")
+        # HTML: revalidation systématique (304 bon marché), assets: cache navigateur 1 jour
+        if entry.content_type.startswith("text/html"):
+            self.send_header("Cache-Control", "no-cache")
+        else:
+            self.send_header("Cache-Control", "public, max-age=86400")
+
+    def not_modified(self, entry, encoding=None):
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            etag = entry.variant_etag(encoding)
+            tags = [t.strip() for t in if_none_match.split(",")]
+            return "*" in tags or etag in tags or f"W/{etag}" in tags
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(entry.mtime // 1_000_000_000) <= since
+        return False
+
 
 Handler = CleanUrlHandler
 
-socketserver.TCPServer.allow_reuse_address = True
-with socketserver.TCPServer(("", PORT), Handler) as httpd:
-    print(f"Serving at port {PORT} with Clean URLs support (auto .html)")
-    httpd.serve_forever()
+
+def precompress(root=ROOT):
+    """Build: écrit les variantes .gz (et .br si brotli est installé) des assets texte"""
+    written = 0
+    for rel_dir in PRECOMPRESS_DIRS:
+        directory = os.path.join(root, rel_dir)
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if not name.endswith(COMPRESSIBLE_EXTENSIONS) or not os.path.isfile(path):
+                continue
+            st = os.stat(path)
+            if st.st_size < MIN_COMPRESS_SIZE:
+                continue
+            with open(path, "rb") as f:
+                content = f.read()
+            for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+                if encoding not in supported_encodings():
+                    continue
+                target = path + suffix
+                if os.path.exists(target) and os.stat(target).st_mtime_ns >= st.st_mtime_ns:
+                    continue
+                body = compress(content, encoding)
+                with open(target, "wb") as f:
+                    f.write(body)
+                written += 1
+                print(f"[PRECOMPRESS] {os.path.relpath(target, root)}: {len(content)} -> {len(body)} octets")
+    if not brotli:
+        print("[PRECOMPRESS] brotli non installé: variantes .gz uniquement (pip install brotli)")
+    print(f"[PRECOMPRESS] {written} fichiers écrits")
+
+
+class StaticServer(http.server.ThreadingHTTPServer):
+    # Un thread par connexion: un client lent ne bloque plus les autres
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if __name__ == "__main__":
+    if "--precompress" in sys.argv:
+        precompress()
+        sys.exit(0)
+    route_table.watch()
+    with StaticServer(("", PORT), Handler) as httpd:
+        print(f"Serving at port {PORT} with Clean URLs support (auto .html), threaded + in-memory cache")
+        httpd.serve_forever()